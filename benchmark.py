@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the State-Tool hot paths.
+
+Runs against generated desktops from the synthetic backend, so it works on any platform:
+
+    python benchmark.py --sizes 1000 10000 100000 --shapes app dom --output benchmark_results.json
+    python benchmark.py --sizes 1000 --compare benchmark_results.json
+    python benchmark.py --snapshots outlook.json.gz edge.json.gz
+
+Recorded desktops (see `python -m src.backend.snapshot record`) are replayed offline
+with `--snapshots` and reported under their file name as the shape.
+
+Every case reports wall time and the number of backend calls (property reads, pattern
+reads and navigation) per node of the walked subtree. Results are written as JSON so
+runs can be compared.
+"""
+from src.backend.synthetic import SyntheticBackend, SyntheticControl
+from src.backend.snapshot import ReplayBackend
+from src.backend.views import SyntheticConfig
+from src.desktop.service import Desktop
+from src.desktop.encoding import ScreenshotEncoder
+from src.desktop.tiles import FrameDiff
+from src.tree.views import CacheStats
+from src.tree.boxes import BoxBatch
+from src.tree.annotate import get_boxes
+from typing import Callable
+from datetime import datetime, timezone
+from statistics import median
+from platform import platform
+import argparse
+import json
+import os
+import time
+import sys
+
+SHAPES=['app','dom']
+
+def count_nodes(control:SyntheticControl)->int:
+    count,stack=0,[control]
+    while stack:
+        node=stack.pop()
+        count+=1
+        stack.extend(node._children)
+    return count
+
+def estimate_dom_nodes(breadth:int,depth:int,level:int=0)->float:
+    # Mirrors the expected branching of SyntheticBackend._build_dom
+    leaf=1.25
+    if level>=depth-1:
+        return breadth*leaf
+    section=1+estimate_dom_nodes(breadth,depth,level+1)
+    listing=1+2*breadth
+    return breadth*(0.5*leaf+0.25*section+0.25*listing)
+
+def synthetic_config(nodes:int,shape:str,latency:float=0.0)->SyntheticConfig:
+    '''Size a synthetic desktop so its foreground app holds roughly `nodes` elements.'''
+    if shape=='app':
+        candidates=[(breadth,depth) for depth in range(3,9) for breadth in range(2,64)]
+        breadth,depth=min(candidates,key=lambda pair:abs(pair[0]**pair[1]-nodes))
+        return SyntheticConfig(apps=3,browser_apps=0,breadth=breadth,depth=depth,call_latency=latency)
+    elif shape=='dom':
+        candidates=[(breadth,depth) for depth in range(3,8) for breadth in range(2,64)]
+        breadth,depth=min(candidates,key=lambda pair:abs(estimate_dom_nodes(*pair)-nodes))
+        return SyntheticConfig(apps=3,browser_apps=1,dom_breadth=breadth,dom_depth=depth,call_latency=latency)
+    raise ValueError(f'Unknown shape {shape!r}')
+
+class Context:
+    '''A generated or replayed desktop plus the objects the benchmark cases operate on.'''
+    def __init__(self,backend:SyntheticBackend,shape:str):
+        self.shape=shape
+        self.backend=backend
+        self.desktop=Desktop(backend=self.backend)
+        self.tree=self.desktop.tree
+        self.tree.settle_delay=0
+        self.tree.seed=getattr(backend,'seed',None)
+        # Cases time full walks unless they opt into the window cache
+        self.tree.incremental=False
+        self.root=self.backend.get_root_control()
+        self.app=self.backend.control_from_handle(self.backend.get_foreground_window())
+        self.app_nodes=count_nodes(self.app)
+        self.walked_nodes=self.app_nodes+sum(count_nodes(window) for window in self.root._children
+                                             if window._properties['ClassName'] in ('Shell_TrayWnd','Progman'))
+        self.is_browser=self.desktop.is_app_browser(self.app)
+        self.backend.reset_calls()
+        self._tree_state=None
+
+    @classmethod
+    def synthetic(cls,nodes:int,shape:str,latency:float=0.0)->'Context':
+        return cls(SyntheticBackend(synthetic_config(nodes,shape,latency)),shape)
+
+    @classmethod
+    def snapshot(cls,path:str)->'Context':
+        return cls(ReplayBackend.load(path),os.path.basename(path))
+
+    @property
+    def tree_state(self):
+        if self._tree_state is None:
+            self._tree_state=self.tree.get_state(root=self.root)
+            self.backend.reset_calls()
+        return self._tree_state
+
+# A case prepares its inputs from the context and returns the callable to time and the
+# number of nodes that callable visits (used for the per-node call count).
+CASES:dict[str,Callable[[Context],tuple[Callable[[],object],int]]]={}
+
+def case(name:str):
+    def register(function):
+        CASES[name]=function
+        return function
+    return register
+
+@case('get_nodes')
+def bench_get_nodes(ctx:Context):
+    xpath=f"{ctx.root.ControlTypeName}/{ctx.app.ControlTypeName}[1]"
+    return (lambda:ctx.tree.get_nodes(ctx.app,xpath,is_browser=ctx.is_browser)),ctx.app_nodes
+
+@case('get_appwise_nodes')
+def bench_get_appwise_nodes(ctx:Context):
+    return (lambda:ctx.tree.get_appwise_nodes(node=ctx.root)),ctx.walked_nodes
+
+@case('get_appwise_nodes_incremental')
+def bench_get_appwise_nodes_incremental(ctx:Context):
+    # Repeated capture of an unchanged desktop, served from the window cache
+    def run():
+        ctx.tree.incremental=True
+        try:
+            return ctx.tree.get_appwise_nodes(node=ctx.root)
+        finally:
+            ctx.tree.incremental=False
+    run()
+    return run,ctx.walked_nodes
+
+@case('get_nodes_prefetch')
+def bench_get_nodes_prefetch(ctx:Context):
+    xpath=f"{ctx.root.ControlTypeName}/{ctx.app.ControlTypeName}[1]"
+    return (lambda:ctx.tree.get_nodes(ctx.app,xpath,is_browser=ctx.is_browser,engine='prefetch')),ctx.app_nodes
+
+@case('get_appwise_nodes_prefetch')
+def bench_get_appwise_nodes_prefetch(ctx:Context):
+    return (lambda:ctx.tree.get_appwise_nodes(node=ctx.root,engine='prefetch')),ctx.walked_nodes
+
+def app_boxes(ctx:Context)->BoxBatch:
+    # The rectangle of every element of the foreground app, clipped to the app window
+    boxes,stack=BoxBatch(),[ctx.app]
+    window_box=ctx.app._properties['BoundingRectangle']
+    while stack:
+        node=stack.pop()
+        boxes.add(node._properties['BoundingRectangle'],window_box)
+        stack.extend(node._children)
+    return boxes
+
+@case('clip_boxes')
+def bench_clip_boxes(ctx:Context):
+    boxes=app_boxes(ctx)
+    return (lambda:boxes.clip_boxes(ctx.tree.screen_box,vectorized=True)),len(boxes)
+
+@case('clip_boxes_scalar')
+def bench_clip_boxes_scalar(ctx:Context):
+    boxes=app_boxes(ctx)
+    return (lambda:boxes.clip_boxes(ctx.tree.screen_box,vectorized=False)),len(boxes)
+
+@case('interactive_elements_to_string')
+def bench_interactive_to_string(ctx:Context):
+    tree_state=ctx.tree_state
+    return tree_state.interactive_elements_to_string,len(tree_state.interactive_nodes)
+
+@case('informative_elements_to_string')
+def bench_informative_to_string(ctx:Context):
+    tree_state=ctx.tree_state
+    return tree_state.informative_elements_to_string,len(tree_state.informative_nodes)
+
+@case('scrollable_elements_to_string')
+def bench_scrollable_to_string(ctx:Context):
+    tree_state=ctx.tree_state
+    return tree_state.scrollable_elements_to_string,len(tree_state.scrollable_nodes)
+
+def with_format(ctx:Context,format:str,cached:bool):
+    # Cold runs drop the strings rendered by the previous run
+    tree_state=ctx.tree_state
+    nodes=tree_state.interactive_nodes
+    def run():
+        if not cached:
+            nodes.strings.clear()
+        return tree_state.interactive_elements_to_string(format)
+    run()
+    return run,len(nodes)
+
+@case('interactive_to_compact')
+def bench_interactive_to_compact(ctx:Context):
+    return with_format(ctx,'compact',cached=False)
+
+@case('interactive_to_compact_cached')
+def bench_interactive_to_compact_cached(ctx:Context):
+    return with_format(ctx,'compact',cached=True)
+
+@case('interactive_to_json')
+def bench_interactive_to_json(ctx:Context):
+    return with_format(ctx,'json',cached=False)
+
+@case('interactive_to_outline')
+def bench_interactive_to_outline(ctx:Context):
+    return with_format(ctx,'outline',cached=False)
+
+@case('annotated_screenshot')
+def bench_annotated_screenshot(ctx:Context):
+    nodes=ctx.tree_state.interactive_nodes
+    return (lambda:ctx.tree.annotated_screenshot(nodes,scale=1.0)),len(nodes)
+
+@case('annotated_screenshot_cached')
+def bench_annotated_screenshot_cached(ctx:Context):
+    # The screen and the elements are unchanged since the last screenshot sent
+    nodes=ctx.tree_state.interactive_nodes
+    def function():
+        encoding,_=ctx.desktop.encode_annotated_screenshot(ctx.tree_state,visual_diff=False)
+        return encoding.result()
+    function()
+    return function,len(nodes)
+
+@case('annotate_boxes')
+def bench_annotate_boxes(ctx:Context):
+    # Drawing only, into the reused buffer, on the first 1000 interactive elements
+    screenshot=ctx.desktop.get_screenshot(scale=1.0)
+    boxes=list(get_boxes(ctx.tree_state.interactive_nodes))[:1000]
+    return (lambda:ctx.tree.annotator.annotate(screenshot,boxes,reuse=True)),len(boxes)
+
+@case('screenshot_scaled')
+def bench_screenshot_scaled(ctx:Context):
+    return (lambda:ctx.desktop.get_screenshot(scale=0.7)),0
+
+@case('screenshot_region')
+def bench_screenshot_region(ctx:Context):
+    # The top left quarter of the screen, unscaled
+    width,height=ctx.backend.get_screen_size()
+    return (lambda:ctx.desktop.get_screenshot(scale=1.0,region=(0,0,width//2,height//2))),0
+
+@case('screenshot_in_base64')
+def bench_screenshot_in_base64(ctx:Context):
+    screenshot=ctx.desktop.get_screenshot(scale=1.0)
+    return (lambda:ctx.desktop.screenshot_in_base64(screenshot)),0
+
+def with_encoder(ctx:Context,format:str):
+    encoder=ScreenshotEncoder(format=format)
+    screenshot=ctx.desktop.get_screenshot(scale=1.0)
+    return (lambda:encoder.encode(screenshot)),0
+
+@case('screenshot_in_palette')
+def bench_screenshot_in_palette(ctx:Context):
+    return with_encoder(ctx,'palette')
+
+@case('screenshot_in_jpeg')
+def bench_screenshot_in_jpeg(ctx:Context):
+    return with_encoder(ctx,'jpeg')
+
+@case('frame_diff')
+def bench_frame_diff(ctx:Context):
+    # Alternates between two frames that differ in one small area
+    frames=[ctx.desktop.get_screenshot(scale=1.0) for _ in range(2)]
+    frames[1].paste((255,0,0),(300,300,420,340))
+    frame_diff=FrameDiff()
+    frame_diff.update(frames[1])
+    return (lambda:[frame_diff.update(frame) for frame in frames]),0
+
+def measure(ctx:Context,name:str,repeat:int)->dict:
+    function,nodes=CASES[name](ctx)
+    timings,calls=[],[]
+    for _ in range(repeat):
+        ctx.backend.reset_calls()
+        ctx.tree.cache_stats=CacheStats()
+        start=time.perf_counter()
+        function()
+        timings.append((time.perf_counter()-start)*1000)
+        calls.append(ctx.backend.call_count)
+    backend_calls=calls[-1]
+    cache_stats=ctx.tree.cache_stats
+    return {
+        'case':name,
+        'shape':ctx.shape,
+        'nodes':nodes,
+        'repeat':repeat,
+        'wall_ms_min':round(min(timings),3),
+        'wall_ms_median':round(median(timings),3),
+        'backend_calls':backend_calls,
+        'calls_per_node':round(backend_calls/nodes,3) if nodes else 0.0,
+        'saved_calls_per_node':round(cache_stats.saved_per_node(),3),
+        'calls_by_name':dict(sorted(ctx.backend.calls.items()))
+    }
+
+def compare(results:list[dict],baseline_path:str)->None:
+    with open(baseline_path) as file:
+        baseline={(row['case'],row['shape'],row['size']):row for row in json.load(file)['results']}
+    print(f'\nComparison against {baseline_path}:')
+    print(f"{'case':<34}{'shape':<6}{'size':>8}{'base ms':>12}{'ms':>12}{'ratio':>8}{'calls/node':>20}")
+    for row in results:
+        base=baseline.get((row['case'],row['shape'],row['size']))
+        if base is None:
+            continue
+        ratio=row['wall_ms_median']/base['wall_ms_median'] if base['wall_ms_median'] else 0.0
+        calls=f"{base['calls_per_node']} -> {row['calls_per_node']}"
+        print(f"{row['case']:<34}{row['shape']:<6}{row['size']:>8}{base['wall_ms_median']:>12.2f}{row['wall_ms_median']:>12.2f}{ratio:>8.2f}{calls:>20}")
+
+def main():
+    parser=argparse.ArgumentParser(description=__doc__,formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes',type=int,nargs='+',default=[1000,10000,100000],help='Target element counts of the foreground app')
+    parser.add_argument('--shapes',nargs='+',choices=SHAPES,default=SHAPES,help='app: nested native controls, dom: browser DOM-heavy page')
+    parser.add_argument('--cases',nargs='+',choices=list(CASES),default=list(CASES))
+    parser.add_argument('--repeat',type=int,default=3)
+    parser.add_argument('--latency',type=float,default=0.0,help='Simulated microseconds per backend call')
+    parser.add_argument('--snapshots',nargs='+',default=[],help='Recorded desktop snapshots to replay instead of generated desktops')
+    parser.add_argument('--output',default='benchmark_results.json')
+    parser.add_argument('--compare',help='Previous results file to compare against')
+    args=parser.parse_args()
+
+    if args.snapshots:
+        contexts=((ctx.app_nodes,ctx) for ctx in map(Context.snapshot,args.snapshots))
+    else:
+        contexts=((size,Context.synthetic(size,shape,latency=args.latency/1e6)) for size in args.sizes for shape in args.shapes)
+
+    results=[]
+    print(f"{'case':<34}{'shape':<6}{'size':>8}{'nodes':>8}{'median ms':>12}{'min ms':>12}{'calls/node':>12}{'saved/node':>12}")
+    for size,ctx in contexts:
+        for name in args.cases:
+            row={'size':size,**measure(ctx,name,args.repeat)}
+            results.append(row)
+            print(f"{name:<34}{ctx.shape:<6}{size:>8}{row['nodes']:>8}{row['wall_ms_median']:>12.2f}{row['wall_ms_min']:>12.2f}{row['calls_per_node']:>12}{row['saved_calls_per_node']:>12}")
+            sys.stdout.flush()
+
+    report={
+        'meta':{
+            'timestamp':datetime.now(timezone.utc).isoformat(),
+            'platform':platform(),
+            'python':sys.version.split()[0],
+            'latency_us':args.latency,
+            'repeat':args.repeat
+        },
+        'results':results
+    }
+    with open(args.output,'w') as file:
+        json.dump(report,file,indent=2)
+    print(f'\nResults written to {args.output}')
+    if args.compare:
+        compare(results,args.compare)
+
+if __name__ == "__main__":
+    main()
@@ -3,10 +3,13 @@ from fastmcp.utilities.types import Image
 from platform import system, release
 from markdownify import markdownify
 from textwrap import dedent
-from fastmcp import FastMCP
+from fastmcp import FastMCP, Context
 from typing import Literal, List, Tuple, Optional
+from time import sleep
 import requests
 import asyncio
+import json
+import os
 
 # Platform detection
 os_name = system()
@@ -14,26 +17,25 @@ version = release()
 
 # Check if running on Windows
 WINDOWS_AVAILABLE = False
-if os_name != 'Windows':
+# Accessibility backend (uia on Windows, synthetic for profiling on any platform)
+BACKEND = os.environ.get('DARBOT_BACKEND', 'uia' if os_name == 'Windows' else '').lower()
+if os_name != 'Windows' and BACKEND != 'synthetic':
     print(f"⚠️  Warning: Darbot-Windows-MCP is designed for Windows. Running on {os_name} may have limited functionality.")
     print("Some features may not work correctly. For full functionality, please use Windows.")
 
 # Import Windows-specific modules with proper error handling
 try:
-    if os_name == 'Windows':
+    if BACKEND == 'synthetic':
+        # Generated desktop, lets every tool run without Windows (e.g. for profiling)
+        from src.desktop import Desktop
+        WINDOWS_AVAILABLE = False
+    elif os_name == 'Windows':
         # Only attempt Windows-specific imports on Windows
         from live_inspect.watch_cursor import WatchCursor
         from humancursor import SystemCursor
         from src.desktop import Desktop
-        import uiautomation as ua
-        import pyautogui as pg
-        import pyperclip as pc
         import ctypes
         
-        # Configure pyautogui
-        pg.FAILSAFE = False
-        pg.PAUSE = 1.0
-        
         # Set DPI awareness
         ctypes.windll.user32.SetProcessDPIAware()
         WINDOWS_AVAILABLE = True
@@ -52,6 +54,12 @@ except ImportError as e:
             return None
         def get_element_under_cursor(self):
             return MockControl()
+        def get_element_at(self, loc):
+            return MockControl.Name, MockControl.ControlTypeName
+        def invalidate_state(self):
+            pass
+        def close(self):
+            pass
         def execute_command(self, command):
             return "Not available on non-Windows systems", 1
         def launch_app(self, name):
@@ -63,41 +71,8 @@ except ImportError as e:
         Name = "Mock Control"
         ControlTypeName = "Mock"
     
-    class MockCursor:
-        def start(self): pass
-        def stop(self): pass
-        def move_to(self, loc): pass
-        def click_on(self, loc): pass
-        def drag_and_drop(self, from_loc, to_loc): pass
-    
-    class MockPyAutoGUI:
-        def mouseDown(self): pass
-        def click(self, button='left', clicks=1): pass
-        def mouseUp(self): pass
-        def hotkey(self, *keys): pass
-        def press(self, key): pass
-        def typewrite(self, text, interval=0.1): pass
-        def keyDown(self, key): pass
-        def keyUp(self, key): pass
-        def sleep(self, duration): 
-            import time
-            time.sleep(duration)
-    
-    class MockPyperclip:
-        def copy(self, text): pass
-        def paste(self): return ""
-    
-    class MockUA:
-        def WheelUp(self, times): pass
-        def WheelDown(self, times): pass
-    
     # Set mock instances
     Desktop = MockDesktop
-    WatchCursor = MockCursor
-    SystemCursor = MockCursor
-    pg = MockPyAutoGUI()
-    pc = MockPyperclip()
-    ua = MockUA()
 
 instructions = dedent(f'''
 Windows MCP server provides tools to interact directly with the {os_name} {version} desktop, 
@@ -107,8 +82,28 @@ Note: This server is optimized for Windows systems.
 Running on {os_name} may have limited functionality.
 ''')
 
+class MockCursor:
+    def start(self): pass
+    def stop(self): pass
+    def move_to(self, loc): pass
+    def click_on(self, loc): pass
+    def drag_and_drop(self, from_loc, to_loc): pass
+
+class BackendCursor(MockCursor):
+    """Cursor that moves through the desktop's accessibility backend instead of humancursor."""
+    def __init__(self, backend):
+        self.backend = backend
+    def move_to(self, loc):
+        self.backend.move_cursor(loc)
+    def click_on(self, loc):
+        self.backend.click(loc)
+    def drag_and_drop(self, from_loc, to_loc):
+        self.backend.move_cursor(from_loc)
+        self.backend.drag_to(to_loc)
+
 # Initialize desktop and cursor with error handling
 desktop = Desktop()
+DESKTOP_AVAILABLE = WINDOWS_AVAILABLE or BACKEND == 'synthetic'
 
 if WINDOWS_AVAILABLE:
     try:
@@ -116,8 +111,11 @@ if WINDOWS_AVAILABLE:
         watch_cursor = WatchCursor()
     except Exception as e:
         print(f"⚠️  Warning: Could not initialize cursor controls: {e}")
-        cursor = MockCursor()
+        cursor = BackendCursor(desktop.backend)
         watch_cursor = MockCursor()
+elif DESKTOP_AVAILABLE:
+    cursor = BackendCursor(desktop.backend)
+    watch_cursor = MockCursor()
 else:
     cursor = MockCursor()
     watch_cursor = MockCursor()
@@ -139,16 +137,32 @@ async def lifespan(app: FastMCP):
                 watch_cursor.stop()
             except Exception as e:
                 print(f"⚠️  Error stopping watch cursor: {e}")
+        try:
+            desktop.close()
+        except Exception as e:
+            print(f"⚠️  Error closing the desktop: {e}")
 
 mcp = FastMCP(name='darbot-windows-mcp', instructions=instructions, lifespan=lifespan)
 
 def ensure_windows_available(func):
-    """Decorator to ensure Windows functionality is available."""
+    """Decorator to ensure Windows functionality (or the synthetic backend) is available."""
     from functools import wraps
+    from inspect import iscoroutinefunction
     
+    if iscoroutinefunction(func):
+        @wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            if not DESKTOP_AVAILABLE:
+                return f"This tool requires Windows. Currently running on {os_name}."
+            try:
+                return await func(*args, **kwargs)
+            except Exception as e:
+                return f"Error executing {func.__name__}: {str(e)}"
+        return async_wrapper
+
     @wraps(func)
     def wrapper(*args, **kwargs):
-        if not WINDOWS_AVAILABLE:
+        if not DESKTOP_AVAILABLE:
             return f"This tool requires Windows. Currently running on {os_name}."
         try:
             return func(*args, **kwargs)
@@ -165,6 +179,7 @@ def launch_tool(name: str) -> str:
     
     try:
         _, status = desktop.launch_app(name.strip())
+        desktop.invalidate_state()
         if status != 0:
             return f'Failed to launch {name.title()}. Make sure the application exists and you have permission to run it.'
         else:
@@ -188,46 +203,124 @@ def powershell_tool(command: str) -> str:
     except Exception as e:
         return f'Error executing PowerShell command: {str(e)}'
 
-@mcp.tool(name='State-Tool', description='Capture comprehensive desktop state including focused/opened applications, interactive UI elements (buttons, text fields, menus), informative content (text, labels, status), and scrollable areas. Optionally includes visual screenshot when use_vision=True. Essential for understanding current desktop context and available UI interactions.')
+@mcp.tool(name='State-Tool', description='Capture comprehensive desktop state including focused/opened applications, interactive UI elements (buttons, text fields, menus), informative content (text, labels, status), and scrollable areas. Optionally includes visual screenshot when use_vision=True; after the first one only the regions that changed since the previous screenshot are sent, with their pixel coordinates in the whole screenshot, or a note that nothing changed (set full_frame=True to always receive the whole screenshot). Set delta=True to list only the elements added, removed or changed since the previous State-Tool call. Set stream=True to also receive the elements of each app as progress notifications as soon as that app is captured, foreground app first; these carry no labels, act on the labels of the final result. Set deadline_ms to bound the time spent walking the apps (the clock starts once the screen has settled); apps that have not finished by then are left out and the state is flagged as partial. Set format to choose the layout of the lists: table (default), compact (tab separated lines), json (one JSON document) or outline (elements grouped by app and window). Set max_elements and/or max_bytes to bound the element lists (max_bytes counts the whole text output, headings included): the most relevant elements are kept (foreground app, around the focused element, larger and more actionable elements first), keep their usual labels, and the rest are counted per app. Set engine to choose how each app is read: walker (each property on first use) or prefetch (every property of an app subtree in one bulk request); the server default applies when it is not set. Essential for understanding current desktop context and available UI interactions.')
 @ensure_windows_available
-def state_tool(use_vision: bool = False) -> str:
+async def state_tool(use_vision: bool = False, delta: bool = False, stream: bool = False, deadline_ms: Optional[int] = None, format: Literal['table', 'compact', 'json', 'outline'] = 'table', max_elements: Optional[int] = None, max_bytes: Optional[int] = None, full_frame: bool = False, engine: Optional[Literal['walker', 'prefetch']] = None, ctx: Context = None) -> str:
     """Capture the current desktop state and UI elements."""
+    if format not in ('table', 'compact', 'json', 'outline'):
+        return f"Unknown format {format!r}. Use table, compact, json or outline."
     try:
-        desktop_state = desktop.get_state(use_vision=use_vision)
+        previous_state = desktop.desktop_state
+        on_app = None
+        if stream and ctx is not None:
+            loop = asyncio.get_running_loop()
+            streamed_apps = []
+            def on_app(app_name, app_state):
+                # Called from the capture thread as each app finishes. Labels are known only once every app
+                # before this one is in, so the chunks leave them out rather than show ones that collide
+                streamed_apps.append(app_name)
+                message = dedent(f'''
+                Elements of {app_name} (labels follow in the full result):
+                {app_state.interactive_elements_to_string(format, labels=False)}
+
+                {app_state.informative_elements_to_string(format)}
+
+                {app_state.scrollable_elements_to_string(format, labels=False)}
+                ''') if format != 'json' else app_state.to_json(labels=False)
+                asyncio.run_coroutine_threadsafe(ctx.report_progress(len(streamed_apps), message=message), loop)
+        # Capture off the event loop so progress notifications are sent while other apps are still walked
+        # With vision the screenshot is encoded in the background while the lists below are formatted
+        desktop_state = await asyncio.to_thread(desktop.get_state, use_vision=use_vision, as_bytes=use_vision, on_app=on_app, deadline_ms=deadline_ms, visual_diff=not full_frame, engine=engine)
         
         if not desktop_state:
             return "Unable to capture desktop state. Ensure you're running on Windows."
         
-        interactive_elements = desktop_state.tree_state.interactive_elements_to_string()
-        informative_elements = desktop_state.tree_state.informative_elements_to_string()
-        scrollable_elements = desktop_state.tree_state.scrollable_elements_to_string()
-        apps = desktop_state.apps_to_string()
-        active_app = desktop_state.active_app_to_string()
+        is_delta = delta and previous_state is not None
+        if format == 'json':
+            render = lambda selection: state_to_json(desktop_state, previous_state if is_delta else None, deadline_ms, selection)
+        else:
+            render = lambda selection: state_to_string(desktop_state, previous_state if is_delta else None, delta, deadline_ms, format, selection)
+        selection = None
+        if (max_elements is not None or max_bytes is not None) and not is_delta:
+            # Keep the most relevant elements within the output budget, labels stay those of the full state.
+            # The budget is checked against the whole rendered output, headings and budget notes included
+            measure = lambda selection: len(render(selection).encode())
+            selection = await asyncio.to_thread(desktop.select_elements, max_elements, max_bytes, format, measure)
+
+        return [render(selection), *screenshot_of(desktop_state, use_vision)]
         
-        result = [dedent(f'''
-        Focused App:
-        {active_app}
+    except Exception as e:
+        return f"Error capturing desktop state: {str(e)}"
 
-        Opened Apps:
-        {apps}
+def state_to_string(desktop_state, previous_state, delta: bool, deadline_ms: Optional[int], format: str, selection=None) -> str:
+    '''State-Tool output as text, with the elements changed since `previous_state` when given.'''
+    apps = desktop_state.apps_to_string(format)
+    active_app = desktop_state.active_app_to_string(format)
 
-        List of Interactive Elements:
-        {interactive_elements or 'No interactive elements found.'}
+    if previous_state is not None:
+        # Only the elements added, removed or changed since the previous call
+        tree_delta = desktop_state.tree_state.diff(previous_state.tree_state)
+        header = f"State: {tree_delta.fingerprint} (changes since {tree_delta.previous_fingerprint}{', none' if tree_delta.is_empty() else ''})\n"
+        titles = ('Changed Interactive Elements', 'Changed Informative Elements', 'Changed Scrollable Elements')
+        interactive_elements = tree_delta.interactive_elements_to_string(format)
+        informative_elements = tree_delta.informative_elements_to_string(format)
+        scrollable_elements = tree_delta.scrollable_elements_to_string(format)
+    else:
+        header = f'State: {desktop_state.tree_state.fingerprint()}\n' if delta else ''
+        titles = ('List of Interactive Elements', 'List of Informative Elements', 'List of Scrollable Elements')
+        interactive_elements = desktop_state.tree_state.interactive_elements_to_string(format, selection and selection.interactive)
+        informative_elements = desktop_state.tree_state.informative_elements_to_string(format, selection and selection.informative)
+        scrollable_elements = desktop_state.tree_state.scrollable_elements_to_string(format, selection and selection.scrollable)
+    
+    if desktop_state.tree_state.truncations:
+        header += f"Truncated by traversal budgets:\n{desktop_state.tree_state.truncations_to_string()}\n"
+    if selection is not None and selection.omitted:
+        header += f"Left out by the output budget ({selection.total_omitted()} elements):\n{selection.omitted_to_string()}\n"
+    if desktop_state.tree_state.is_partial():
+        header += f"Partial state: the {deadline_ms} ms deadline was reached before {', '.join(desktop_state.tree_state.timed_out_apps)} finished\n"
+    
+    return header + dedent(f'''
+    Focused App:
+    {active_app}
 
-        List of Informative Elements:
-        {informative_elements or 'No informative elements found.'}
+    Opened Apps:
+    {apps}
 
-        List of Scrollable Elements:
-        {scrollable_elements or 'No scrollable elements found.'}
-        ''')]
-        
-        if use_vision and desktop_state.screenshot:
-            result.append(Image(data=desktop_state.screenshot, format='png'))
-        
-        return result
-        
-    except Exception as e:
-        return f"Error capturing desktop state: {str(e)}"
+    {titles[0]}:
+    {interactive_elements or 'No interactive elements found.'}
+
+    {titles[1]}:
+    {informative_elements or 'No informative elements found.'}
+
+    {titles[2]}:
+    {scrollable_elements or 'No scrollable elements found.'}
+    ''')
+
+def screenshot_of(desktop_state, use_vision: bool) -> list:
+    screenshot = desktop_state.get_screenshot() if use_vision else None
+    regions = desktop_state.changed_regions
+    if regions is None:
+        return [Image(data=screenshot, format=desktop_state.screenshot_format)] if screenshot else []
+    if not regions:
+        return ['No visual change since the previous screenshot.']
+    boxes = ', '.join(f'({left},{top},{right},{bottom})' for left, top, right, bottom in regions)
+    note = f'Changed regions of the screenshot since the previous one, as (left,top,right,bottom) pixels of the whole screenshot, in order: {boxes}'
+    return [note, *(Image(data=image, format=desktop_state.screenshot_format) for image in screenshot)]
+
+def state_to_json(desktop_state, previous_state, deadline_ms: Optional[int], selection=None) -> str:
+    '''State-Tool output as one JSON document, with the elements changed since `previous_state` when given.'''
+    tree_state = desktop_state.tree_state
+    if previous_state is not None:
+        tree_delta = tree_state.diff(previous_state.tree_state)
+        state = (f'"state":{json.dumps(tree_delta.fingerprint)},"previous_state":{json.dumps(tree_delta.previous_fingerprint)},'
+                 f'"unchanged":{json.dumps(tree_delta.is_empty())},')
+        elements = tree_delta.to_json()
+    else:
+        state = f'"state":{json.dumps(tree_state.fingerprint())},'
+        elements = tree_state.to_json(selection)
+    truncations = [truncation.to_string() for truncation in tree_state.truncations]
+    partial = {'deadline_ms': deadline_ms, 'timed_out_apps': tree_state.timed_out_apps} if tree_state.is_partial() else None
+    return f'{{{state}"truncations":{json.dumps(truncations)},"partial":{json.dumps(partial)},{desktop_state.to_json(elements)[1:]}'
     
 @mcp.tool(name='Clipboard-Tool',description='Copy text to clipboard or retrieve current clipboard content. Use "copy" mode with text parameter to copy, "paste" mode to retrieve.')
 @ensure_windows_available
@@ -236,12 +329,12 @@ def clipboard_tool(mode: Literal['copy', 'paste'], text: str = None)->str:
     try:
         if mode == 'copy':
             if text:
-                pc.copy(text)  # Copy text to system clipboard
+                desktop.backend.set_clipboard(text)  # Copy text to system clipboard
                 return f'Copied "{text}" to clipboard'
             else:
                 return "Error: No text provided to copy"
         elif mode == 'paste':
-            clipboard_content = pc.paste()  # Get text from system clipboard
+            clipboard_content = desktop.backend.get_clipboard()  # Get text from system clipboard
             return f'Clipboard Content: "{clipboard_content}"'
         else:
             return 'Error: Invalid mode. Use "copy" or "paste".'
@@ -260,12 +353,13 @@ def click_tool(loc: Tuple[int, int],
     try:
         x, y = loc
         cursor.move_to(loc)
-        control = desktop.get_element_under_cursor()
-        pg.mouseDown()
-        pg.click(button=button, clicks=clicks)
-        pg.mouseUp()
+        name, control_type = desktop.get_element_at(loc)
+        desktop.backend.mouse_down()
+        desktop.backend.click(button=button, clicks=clicks)
+        desktop.backend.mouse_up()
+        desktop.invalidate_state()
         num_clicks = {1: 'Single', 2: 'Double', 3: 'Triple'}
-        return f'{num_clicks.get(clicks)} {button} clicked on {control.Name} Element with ControlType {control.ControlTypeName} at ({x},{y}).'
+        return f'{num_clicks.get(clicks)} {button} clicked on {name} Element with ControlType {control_type} at ({x},{y}).'
     except Exception as e:
         return f'Error clicking at {loc}: {str(e)}'
 
@@ -282,12 +376,13 @@ def type_tool(loc: Tuple[int, int], text: str, clear: bool = False) -> str:
     try:
         x, y = loc
         cursor.click_on(loc)
-        control = desktop.get_element_under_cursor()
+        name, control_type = desktop.get_element_at(loc)
         if clear:
-            pg.hotkey('ctrl', 'a')
-            pg.press('backspace')
-        pg.typewrite(text, interval=0.1)
-        return f'Typed "{text}" on {control.Name} Element with ControlType {control.ControlTypeName} at ({x},{y}).'
+            desktop.backend.hotkey('ctrl', 'a')
+            desktop.backend.press('backspace')
+        desktop.backend.type_text(text, interval=0.1)
+        desktop.invalidate_state()
+        return f'Typed "{text}" on {name} Element with ControlType {control_type} at ({x},{y}).'
     except Exception as e:
         return f'Error typing at {loc}: {str(e)}'
 
@@ -300,6 +395,7 @@ def switch_tool(name: str) -> str:
     
     try:
         _, status = desktop.switch_app(name.strip())
+        desktop.invalidate_state()
         if status != 0:
             return f'Failed to switch to {name.title()} window. Make sure the application is running.'
         else:
@@ -322,29 +418,32 @@ def scroll_tool(loc: Optional[Tuple[int, int]] = None,
         
         if type == 'vertical':
             if direction == 'up':
-                ua.WheelUp(wheel_times)
+                desktop.backend.wheel_up(wheel_times)
             elif direction == 'down':
-                ua.WheelDown(wheel_times)
+                desktop.backend.wheel_down(wheel_times)
             else:
                 return 'Error: Invalid direction for vertical scroll. Use "up" or "down".'
         elif type == 'horizontal':
             if direction == 'left':
-                pg.keyDown('Shift')
-                pg.sleep(0.05)
-                ua.WheelUp(wheel_times)
-                pg.sleep(0.05)
-                pg.keyUp('Shift')
+                desktop.backend.key_down('Shift')
+                sleep(0.05)
+                desktop.backend.wheel_up(wheel_times)
+                sleep(0.05)
+                desktop.backend.key_up('Shift')
             elif direction == 'right':
-                pg.keyDown('Shift')
-                pg.sleep(0.05)
-                ua.WheelDown(wheel_times)
-                pg.sleep(0.05)
-                pg.keyUp('Shift')
+                desktop.backend.key_down('Shift')
+                sleep(0.05)
+                desktop.backend.wheel_down(wheel_times)
+                sleep(0.05)
+                desktop.backend.key_up('Shift')
             else:
                 return 'Error: Invalid direction for horizontal scroll. Use "left" or "right".'
         else:
             return 'Error: Invalid scroll type. Use "horizontal" or "vertical".'
         
+        # Scrolling moves content without changing any window fingerprint
+        desktop.tree.invalidate()
+        desktop.invalidate_state()
         return f'Scrolled {type} {direction} by {wheel_times} wheel times.'
     except Exception as e:
         return f'Error scrolling: {str(e)}'
@@ -357,11 +456,13 @@ def drag_tool(from_loc: Tuple[int, int], to_loc: Tuple[int, int]) -> str:
         return "Error: Invalid coordinates. Provide (x, y) tuples for both from_loc and to_loc."
     
     try:
-        control = desktop.get_element_under_cursor()
+        name, control_type = desktop.get_element_at(from_loc)
         x1, y1 = from_loc
         x2, y2 = to_loc
         cursor.drag_and_drop(from_loc, to_loc)
-        return f'Dragged the {control.Name} element with ControlType {control.ControlTypeName} from ({x1},{y1}) to ({x2},{y2}).'
+        desktop.tree.invalidate()
+        desktop.invalidate_state()
+        return f'Dragged the {name} element with ControlType {control_type} from ({x1},{y1}) to ({x2},{y2}).'
     except Exception as e:
         return f'Error dragging from {from_loc} to {to_loc}: {str(e)}'
 
@@ -387,7 +488,8 @@ def shortcut_tool(shortcut: List[str]) -> str:
         return "Error: Provide shortcut as a list of keys (e.g., ['ctrl', 'c'])."
     
     try:
-        pg.hotkey(*shortcut)
+        desktop.backend.hotkey(*shortcut)
+        desktop.invalidate_state()
         return f'Pressed {"+".join(shortcut)}.'
     except Exception as e:
         return f'Error executing shortcut {shortcut}: {str(e)}'
@@ -400,7 +502,8 @@ def key_tool(key:str='')->str:
         return "Error: Key cannot be empty."
     
     try:
-        pg.press(key.strip())
+        desktop.backend.press(key.strip())
+        desktop.invalidate_state()
         return f'Pressed the key {key}.'
     except Exception as e:
         return f'Error pressing key {key}: {str(e)}'
@@ -412,7 +515,7 @@ def wait_tool(duration:int)->str:
         return "Error: Duration must be positive."
     
     try:
-        pg.sleep(duration)
+        sleep(duration)
         return f'Waited for {duration} seconds.'
     except Exception as e:
         return f'Error waiting: {str(e)}'
@@ -0,0 +1,3 @@
+from src.backend.views import Backend, Capture, Control, Rect, Box, SyntheticConfig
+from src.backend.service import get_backend
+from src.backend.capture import get_capture
@@ -0,0 +1,91 @@
+from src.backend.config import CAPTURE_ENV_VAR, CAPTURE_FRAME_ENV_VAR, DEFAULT_CAPTURE
+from src.backend.views import Backend, Capture, Box
+from typing import Optional
+from threading import Lock
+from PIL import Image
+import os
+
+class BackendCapture:
+    '''
+    Screenshots taken by the accessibility backend; regions are grabbed by the backend itself.
+
+    `reuse` has no effect: the backend hands back a new image on every grab, and copying it into a
+    kept buffer would only add a copy.
+    '''
+    name='backend'
+
+    def __init__(self,backend:Backend):
+        self.backend=backend
+
+    def grab(self,region:Optional[Box]=None,reuse:bool=False)->Image.Image:
+        return self.backend.screenshot(region)
+
+class FrameCapture:
+    '''
+    Regions of one fixed RGB frame, a stand-in for the screen where there is none to capture.
+
+    The frame is an image, the path of an image file or an array of shape (height, width, 3) with
+    one byte per channel (such as a NumPy `uint8` array). With `reuse` the region is copied into a
+    buffer kept between calls and the returned image is a view of it, valid until the next grab.
+    '''
+    name='frame'
+
+    def __init__(self,source):
+        self.buffer=bytearray()
+        self.lock=Lock()
+        self.set_frame(source)
+
+    def set_frame(self,source)->None:
+        if isinstance(source,str):
+            with Image.open(source) as image:
+                source=image.convert('RGB')
+        if isinstance(source,Image.Image):
+            image=source if source.mode=='RGB' else source.convert('RGB')
+            width,height=image.size
+            pixels=memoryview(image.tobytes())
+        else:
+            height,width,channels=source.shape
+            if channels!=3:
+                raise ValueError(f'Expected an RGB array, got {channels} channels')
+            pixels=memoryview(source).cast('B')
+        with self.lock:
+            self.width,self.height,self.pixels=width,height,pixels
+
+    def grab(self,region:Optional[Box]=None,reuse:bool=False)->Image.Image:
+        with self.lock:
+            frame_width,frame_height,pixels=self.width,self.height,self.pixels
+            left,top,right,bottom=region or (0,0,frame_width,frame_height)
+            left,top=max(left,0),max(top,0)
+            right,bottom=min(right,frame_width),min(bottom,frame_height)
+            width,height=max(right-left,0),max(bottom-top,0)
+            row,stride=width*3,frame_width*3
+            size=row*height
+            buffer=self.buffer if reuse else bytearray(size)
+            if len(buffer)<size:
+                buffer.extend(bytes(size-len(buffer)))
+            if row==stride:
+                # Whole rows are contiguous in the frame
+                buffer[:size]=pixels[top*stride:top*stride+size]
+            else:
+                start=top*stride+left*3
+                for offset in range(0,size,row):
+                    buffer[offset:offset+row]=pixels[start:start+row]
+                    start+=stride
+            return Image.frombuffer('RGB',(width,height),buffer,'raw','RGB',0,1)
+
+def get_capture(backend:Backend,name:Optional[str]=None)->Capture:
+    '''
+    Create the screen capture named `name`, or the one selected by the `DARBOT_CAPTURE`
+    environment variable (`backend` by default).
+    '''
+    name=(name or os.environ.get(CAPTURE_ENV_VAR) or DEFAULT_CAPTURE).lower()
+    match name:
+        case 'backend':
+            return BackendCapture(backend)
+        case 'frame':
+            path=os.environ.get(CAPTURE_FRAME_ENV_VAR)
+            if not path:
+                raise ValueError(f'The frame capture needs an image file in {CAPTURE_FRAME_ENV_VAR}.')
+            return FrameCapture(path)
+        case _:
+            raise ValueError(f'Unknown capture {name!r}. Use "backend" or "frame".')
@@ -0,0 +1,37 @@
+BACKEND_ENV_VAR='DARBOT_BACKEND'
+
+DEFAULT_BACKEND='uia'
+
+# Screen capture used for screenshots: `backend` asks the accessibility backend, `frame` serves
+# regions of a fixed frame loaded from the image file named by CAPTURE_FRAME_ENV_VAR
+CAPTURE_ENV_VAR='DARBOT_CAPTURE'
+CAPTURE_FRAME_ENV_VAR='DARBOT_CAPTURE_FRAME'
+DEFAULT_CAPTURE='backend'
+
+LOCALIZED_CONTROL_TYPES={
+    'ButtonControl':'button','CheckBoxControl':'check box','ComboBoxControl':'combo box',
+    'CustomControl':'custom','DataItemControl':'item','DocumentControl':'document',
+    'EditControl':'edit','GroupControl':'group','HeaderItemControl':'header item',
+    'HyperlinkControl':'link','ImageControl':'image','ListControl':'list',
+    'ListItemControl':'list item','MenuItemControl':'menu item','PaneControl':'pane',
+    'RadioButtonControl':'radio button','ScrollBarControl':'scroll bar','SpinnerControl':'spinner',
+    'SplitButtonControl':'split button','TabItemControl':'tab item','TextControl':'text',
+    'TitleBarControl':'title bar','ToolBarControl':'tool bar','TreeItemControl':'tree item',
+    'WindowControl':'window'
+}
+
+# Control types placed at the inner levels of a synthetic app subtree
+SYNTHETIC_CONTAINER_TYPES=[
+    'PaneControl','GroupControl','ToolBarControl','CustomControl','ListControl'
+]
+
+# Relative weights of the control types placed at the leaves of a synthetic app subtree
+SYNTHETIC_CONTROL_TYPE_MIX={
+    'ButtonControl':6,'TextControl':6,'EditControl':2,'CheckBoxControl':1,
+    'ListItemControl':3,'MenuItemControl':1,'TabItemControl':1,'ComboBoxControl':1,
+    'ImageControl':1,'HyperlinkControl':1,'TreeItemControl':1,'GroupControl':1
+}
+
+SYNTHETIC_ROOT_HANDLE=65552
+
+SYNTHETIC_DOM_ROW_HEIGHT=24
@@ -0,0 +1,124 @@
+from src.backend.views import Control
+from typing import Optional
+
+class PrefetchedPattern:
+    '''Pattern whose properties were fetched together with its element.'''
+    __slots__=('values',)
+
+    def __init__(self,values:dict):
+        self.values=values
+
+    def __getattr__(self,name:str):
+        if name=='values':
+            raise AttributeError(name)
+        try:
+            return self.values[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+class PrefetchedControl:
+    '''
+    Control whose properties, patterns and children were all fetched by one bulk request.
+
+    Reads never leave the process. Properties that were not requested raise
+    `AttributeError`; `element` keeps the live control for follow-up actions.
+    '''
+    __slots__=('values','element','parent','children','index','runtime_id','patterns')
+
+    def __init__(self,values:dict,element:Control,parent:Optional['PrefetchedControl']=None,runtime_id:Optional[list[int]]=None):
+        self.values=values
+        self.element=element
+        self.parent=parent
+        self.children:list[PrefetchedControl]=[]
+        self.index=0
+        self.runtime_id=runtime_id
+        self.patterns:dict[str,Optional[PrefetchedPattern]]={}
+        if parent is not None:
+            self.index=len(parent.children)
+            parent.children.append(self)
+
+    def __getattr__(self,name:str):
+        if name in PrefetchedControl.__slots__:
+            raise AttributeError(name)
+        try:
+            return self.values[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def GetChildren(self)->list['PrefetchedControl']:
+        return list(self.children)
+
+    def GetFirstChildControl(self)->Optional['PrefetchedControl']:
+        return self.children[0] if self.children else None
+
+    def GetLastChildControl(self)->Optional['PrefetchedControl']:
+        return self.children[-1] if self.children else None
+
+    def GetNextSiblingControl(self)->Optional['PrefetchedControl']:
+        if self.parent is None:
+            return None
+        siblings=self.parent.children
+        return siblings[self.index+1] if self.index+1<len(siblings) else None
+
+    def GetPreviousSiblingControl(self)->Optional['PrefetchedControl']:
+        if self.parent is None or self.index==0:
+            return None
+        return self.parent.children[self.index-1]
+
+    def GetParentControl(self)->Optional['PrefetchedControl']:
+        return self.parent
+
+    def GetRuntimeId(self)->list[int]:
+        if self.runtime_id is None:
+            self.runtime_id=list(self.element.GetRuntimeId())
+        return list(self.runtime_id)
+
+    def GetLegacyIAccessiblePattern(self)->Optional[PrefetchedPattern]:
+        return self.patterns.get('LegacyIAccessiblePattern')
+
+    def GetScrollPattern(self)->Optional[PrefetchedPattern]:
+        return self.patterns.get('ScrollPattern')
+
+PATTERN_PROPERTIES={
+    'LegacyIAccessiblePattern':['DefaultAction','Value'],
+    'ScrollPattern':['HorizontallyScrollable','VerticallyScrollable','HorizontalScrollPercent','VerticalScrollPercent']
+}
+
+def prefetch_by_walking(control:Control,properties:list[str],patterns:list[str])->PrefetchedControl:
+    '''
+    Build a prefetched subtree with ordinary per-property calls.
+
+    Fallback for backends without a bulk request; the result is the same as a bulk
+    prefetch but costs one backend call per property per element.
+    '''
+    def fetch(source:Control,parent:Optional[PrefetchedControl])->PrefetchedControl:
+        values={}
+        for name in properties:
+            try:
+                values[name]=getattr(source,name)
+            except Exception:
+                pass
+        node=PrefetchedControl(values,source,parent)
+        for pattern_name in patterns:
+            try:
+                pattern=getattr(source,f'Get{pattern_name}')()
+            except Exception:
+                pattern=None
+            if pattern is None:
+                node.patterns[pattern_name]=None
+                continue
+            pattern_values={}
+            for name in PATTERN_PROPERTIES[pattern_name]:
+                try:
+                    pattern_values[name]=getattr(pattern,name)
+                except Exception:
+                    pass
+            node.patterns[pattern_name]=PrefetchedPattern(pattern_values)
+        return node
+    root=fetch(control,None)
+    stack=[(control,root)]
+    while stack:
+        source,node=stack.pop()
+        for child in source.GetChildren():
+            stack.append((child,fetch(child,node)))
+    return root
@@ -0,0 +1,20 @@
+from src.backend.config import BACKEND_ENV_VAR, DEFAULT_BACKEND
+from src.backend.views import Backend, SyntheticConfig
+from typing import Optional
+import os
+
+def get_backend(name:Optional[str]=None,config:Optional[SyntheticConfig]=None)->Backend:
+    '''
+    Create the accessibility backend named `name`, or the one selected by the
+    `DARBOT_BACKEND` environment variable (`uia` by default).
+    '''
+    name=(name or os.environ.get(BACKEND_ENV_VAR) or DEFAULT_BACKEND).lower()
+    match name:
+        case 'uia':
+            from src.backend.uia import UIABackend
+            return UIABackend()
+        case 'synthetic':
+            from src.backend.synthetic import SyntheticBackend
+            return SyntheticBackend(config=config)
+        case _:
+            raise ValueError(f'Unknown backend {name!r}. Use "uia" or "synthetic".')
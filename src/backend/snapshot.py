@@ -0,0 +1,428 @@
+'''
+Record the control tree a `Desktop.get_state` call walks, and replay it without Windows.
+
+A snapshot holds every property, pattern value and window API result read while the
+state was captured, so replaying it through `Tree` yields a bit-identical `TreeState`.
+Snapshots are gzip-compressed JSON:
+
+    python -m src.backend.snapshot record outlook.json.gz --vision
+    python -m src.backend.snapshot info outlook.json.gz
+    python -m src.backend.snapshot replay outlook.json.gz
+'''
+from src.backend.synthetic import SyntheticBackend, SyntheticControl, SyntheticPattern
+from src.backend.prefetch import PrefetchedControl, prefetch_by_walking
+from src.backend.capture import BackendCapture
+from src.backend.views import Backend, Control, Rect, Box, SyntheticConfig
+from typing import Optional, TYPE_CHECKING
+from threading import Lock
+from io import BytesIO
+from PIL import Image
+import base64
+import gzip
+import json
+
+if TYPE_CHECKING:
+    from src.desktop.service import Desktop
+    from src.desktop.views import DesktopState
+
+SNAPSHOT_FORMAT='darbot-desktop-snapshot'
+SNAPSHOT_VERSION=1
+
+class ReplayError(Exception):
+    '''Raised on replay where the recorded call raised.'''
+
+def encode_value(value):
+    if hasattr(value,'left') and hasattr(value,'bottom'):
+        return [value.left,value.top,value.right,value.bottom]
+    return value
+
+def decode_value(name:str,value):
+    if name=='BoundingRectangle' and value is not None:
+        return Rect(*value)
+    return value
+
+class RecordingPattern:
+    __slots__=('_pattern','_record')
+
+    def __init__(self,pattern,record:dict):
+        self._pattern=pattern
+        self._record=record
+
+    def __getattr__(self,name:str):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            value=getattr(self._pattern,name)
+        except Exception as ex:
+            self._record[name]={'error':str(ex)}
+            raise
+        self._record[name]=encode_value(value)
+        return value
+
+class RecordingControl:
+    '''Transparent proxy over a backend control that records everything read through it.'''
+    __slots__=('_recorder','_control','_parent','_index','_children','_record','_patterns')
+
+    def __init__(self,recorder:'RecordingBackend',control:Control,parent:Optional['RecordingControl'],index:int):
+        self._recorder=recorder
+        self._control=control
+        self._parent=parent
+        self._index=index
+        self._children:Optional[list[RecordingControl]]=None
+        self._record:dict={'v':{}}
+        self._patterns:dict[str,Optional[RecordingPattern]]={}
+        recorder.register(self)
+
+    def __getattr__(self,name:str):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            value=getattr(self._control,name)
+        except Exception as ex:
+            self._record.setdefault('e',{})[name]=str(ex)
+            raise
+        if callable(value):
+            return value
+        self._record['v'][name]=encode_value(value)
+        return value
+
+    def _load_children(self)->list['RecordingControl']:
+        if self._children is None:
+            try:
+                children=self._control.GetChildren()
+            except Exception as ex:
+                self._record.setdefault('e',{})['GetChildren']=str(ex)
+                raise
+            self._children=[RecordingControl(self._recorder,child,self,index) for index,child in enumerate(children)]
+        return self._children
+
+    def GetChildren(self)->list['RecordingControl']:
+        return list(self._load_children())
+
+    def GetFirstChildControl(self)->Optional['RecordingControl']:
+        children=self._load_children()
+        return children[0] if children else None
+
+    def GetLastChildControl(self)->Optional['RecordingControl']:
+        children=self._load_children()
+        return children[-1] if children else None
+
+    def GetNextSiblingControl(self)->Optional['RecordingControl']:
+        if self._parent is None:
+            return None
+        siblings=self._parent._load_children()
+        return siblings[self._index+1] if self._index+1<len(siblings) else None
+
+    def GetPreviousSiblingControl(self)->Optional['RecordingControl']:
+        if self._parent is None or self._index==0:
+            return None
+        return self._parent._load_children()[self._index-1]
+
+    def GetParentControl(self)->Optional['RecordingControl']:
+        return self._parent
+
+    def GetRuntimeId(self)->list[int]:
+        runtime_id=list(self._control.GetRuntimeId())
+        self._record['r']=runtime_id
+        return runtime_id
+
+    def _get_pattern(self,key:str,method:str)->Optional[RecordingPattern]:
+        if key not in self._patterns:
+            try:
+                pattern=getattr(self._control,method)()
+            except Exception as ex:
+                self._record.setdefault('e',{})[method]=str(ex)
+                raise
+            if pattern is None:
+                self._record[key]=None
+                self._patterns[key]=None
+            else:
+                self._record[key]={}
+                self._patterns[key]=RecordingPattern(pattern,self._record[key])
+        return self._patterns[key]
+
+    def GetLegacyIAccessiblePattern(self)->Optional[RecordingPattern]:
+        return self._get_pattern('l','GetLegacyIAccessiblePattern')
+
+    def GetScrollPattern(self)->Optional[RecordingPattern]:
+        return self._get_pattern('s','GetScrollPattern')
+
+class RecordingBackend:
+    '''Wraps another backend and records the control tree and window state read through it.'''
+
+    def __init__(self,backend:Backend):
+        self.backend=backend
+        self.name=f'recording:{backend.name}'
+        self.nodes:list[RecordingControl]=[]
+        self.windows:dict[int,dict[str,bool]]={}
+        self.processes:dict[int,str]={}
+        self.foreground_window=0
+        self.screen_size=(0,0)
+        self.dpi_scaling=1.0
+        self.cursor=(0,0)
+        self.frame:Optional[Image.Image]=None
+        self._root:Optional[RecordingControl]=None
+        self._lock=Lock()
+
+    def __getattr__(self,name:str):
+        # Input and window actions pass straight through to the wrapped backend
+        return getattr(self.backend,name)
+
+    def register(self,control:RecordingControl)->None:
+        with self._lock:
+            self.nodes.append(control)
+
+    def get_root_control(self)->RecordingControl:
+        if self._root is None:
+            self._root=RecordingControl(self,self.backend.get_root_control(),None,0)
+        return self._root
+
+    def prefetch_subtree(self,control:RecordingControl,properties:list[str],patterns:list[str])->PrefetchedControl:
+        # Walk through the recording proxies so the snapshot holds everything the bulk request returned
+        return prefetch_by_walking(control,properties,patterns)
+
+    def _window(self,handle:int,key:str,value:bool)->bool:
+        self.windows.setdefault(handle,{})[key]=bool(value)
+        return value
+
+    def get_foreground_window(self)->int:
+        self.foreground_window=self.backend.get_foreground_window()
+        return self.foreground_window
+
+    def is_top_level_window(self,handle:int)->bool:
+        return self._window(handle,'top_level',self.backend.is_top_level_window(handle))
+
+    def is_iconic(self,handle:int)->bool:
+        return self._window(handle,'iconic',self.backend.is_iconic(handle))
+
+    def is_zoomed(self,handle:int)->bool:
+        return self._window(handle,'zoomed',self.backend.is_zoomed(handle))
+
+    def is_window_visible(self,handle:int)->bool:
+        return self._window(handle,'visible',self.backend.is_window_visible(handle))
+
+    def get_process_name(self,process_id:int)->str:
+        name=self.backend.get_process_name(process_id)
+        self.processes[process_id]=name
+        return name
+
+    def get_screen_size(self)->tuple[int,int]:
+        self.screen_size=tuple(self.backend.get_screen_size())
+        return self.screen_size
+
+    def get_dpi_scaling(self)->float:
+        self.dpi_scaling=self.backend.get_dpi_scaling()
+        return self.dpi_scaling
+
+    def get_cursor_position(self)->tuple[int,int]:
+        self.cursor=tuple(self.backend.get_cursor_position())
+        return self.cursor
+
+    def screenshot(self,region:Optional[Box]=None)->Image.Image:
+        frame=self.backend.screenshot(region)
+        # Snapshots hold the whole screen, so only full captures are recorded
+        if region is None:
+            self.frame=frame.copy()
+        return frame
+
+    def to_snapshot(self,seed:Optional[int]=None)->dict:
+        ids={id(control):index for index,control in enumerate(self.nodes)}
+        nodes=[]
+        for control in self.nodes:
+            record=dict(control._record)
+            if control._children is not None:
+                record['c']=[ids[id(child)] for child in control._children]
+            nodes.append(record)
+        screenshot=None
+        if self.frame is not None:
+            buffer=BytesIO()
+            self.frame.save(buffer,format='PNG')
+            screenshot=base64.b64encode(buffer.getvalue()).decode('ascii')
+        return {
+            'format':SNAPSHOT_FORMAT,
+            'version':SNAPSHOT_VERSION,
+            'seed':seed,
+            'screen':list(self.screen_size),
+            'dpi_scaling':self.dpi_scaling,
+            'cursor':list(self.cursor),
+            'foreground_window':self.foreground_window,
+            'windows':{str(handle):state for handle,state in self.windows.items()},
+            'processes':{str(process_id):name for process_id,name in self.processes.items()},
+            'root':ids[id(self._root)] if self._root is not None else None,
+            'nodes':nodes,
+            'screenshot':screenshot
+        }
+
+class ReplayControl(SyntheticControl):
+    __slots__=('_errors',)
+
+    def __getattr__(self,name:str):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        self._check(name)
+        return super().__getattr__(name)
+
+    def _check(self,name:str)->None:
+        if name in self._errors:
+            raise ReplayError(self._errors[name])
+
+    def GetChildren(self)->list['ReplayControl']:
+        self._check('GetChildren')
+        return super().GetChildren()
+
+    def GetFirstChildControl(self)->Optional['ReplayControl']:
+        self._check('GetChildren')
+        return super().GetFirstChildControl()
+
+    def GetLastChildControl(self)->Optional['ReplayControl']:
+        self._check('GetChildren')
+        return super().GetLastChildControl()
+
+    def GetLegacyIAccessiblePattern(self)->Optional['ReplayPattern']:
+        self._check('GetLegacyIAccessiblePattern')
+        return super().GetLegacyIAccessiblePattern()
+
+    def GetScrollPattern(self)->Optional['ReplayPattern']:
+        self._check('GetScrollPattern')
+        return super().GetScrollPattern()
+
+class ReplayPattern(SyntheticPattern):
+    __slots__=()
+
+    def __getattr__(self,name:str):
+        value=super().__getattr__(name)
+        if isinstance(value,dict) and 'error' in value:
+            raise ReplayError(value['error'])
+        return value
+
+class ReplayBackend(SyntheticBackend):
+    '''Serves a recorded snapshot back through the backend protocol.'''
+    name='replay'
+
+    def __init__(self,snapshot:dict):
+        if snapshot.get('format')!=SNAPSHOT_FORMAT:
+            raise ValueError('Not a desktop snapshot')
+        if snapshot.get('version')!=SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot version {snapshot.get('version')}")
+        self.snapshot=snapshot
+        self.seed:Optional[int]=snapshot.get('seed')
+        width,height=snapshot['screen']
+        super().__init__(config=SyntheticConfig(screen_width=width,screen_height=height))
+
+    @classmethod
+    def load(cls,path:str)->'ReplayBackend':
+        return cls(load_snapshot(path))
+
+    def _build_desktop(self)->ReplayControl:
+        snapshot=self.snapshot
+        records=snapshot['nodes']
+        controls:list[Optional[ReplayControl]]=[None]*len(records)
+        def build(index:int,parent:Optional[ReplayControl])->ReplayControl:
+            record=records[index]
+            properties={name:decode_value(name,value) for name,value in record['v'].items()}
+            control=ReplayControl(self,parent,record.get('r',[-1,index]),properties)
+            control._errors=record.get('e',{})
+            if record.get('l') is not None:
+                control._legacy_pattern=ReplayPattern(self,record['l'])
+            if record.get('s') is not None:
+                control._scroll_pattern=ReplayPattern(self,record['s'])
+            if properties.get('HasKeyboardFocus') and self.focused is None:
+                self.focused=control
+            handle=properties.get('NativeWindowHandle')
+            if handle:
+                self.handles[handle]=control
+            controls[index]=control
+            return control
+        # Iterative build: deep DOM snapshots would exceed the recursion limit
+        root=build(snapshot['root'],None)
+        stack=[(snapshot['root'],root)]
+        while stack:
+            index,control=stack.pop()
+            for child_index in records[index].get('c',[]):
+                stack.append((child_index,build(child_index,control)))
+        for handle,state in snapshot['windows'].items():
+            if state.get('iconic'):
+                self.minimized.add(int(handle))
+            if state.get('zoomed'):
+                self.maximized.add(int(handle))
+        self.processes.update({int(process_id):name for process_id,name in snapshot['processes'].items()})
+        self.foreground_handle=snapshot['foreground_window']
+        self.cursor=tuple(snapshot['cursor'])
+        return root
+
+    def is_top_level_window(self,handle:int)->bool:
+        return self.snapshot['windows'].get(str(handle),{}).get('top_level',False)
+
+    def is_window_visible(self,handle:int)->bool:
+        return self.snapshot['windows'].get(str(handle),{}).get('visible',True)
+
+    def get_dpi_scaling(self)->float:
+        return self.snapshot['dpi_scaling']
+
+    def screenshot(self,region:Optional[Box]=None)->Image.Image:
+        if self._frame is None:
+            encoded=self.snapshot.get('screenshot')
+            if encoded:
+                self._frame=Image.open(BytesIO(base64.b64decode(encoded))).convert('RGB')
+            else:
+                self._frame=Image.new('RGB',self.get_screen_size(),color=(0,0,0))
+        if region is None:
+            return self._frame.copy()
+        return self._frame.crop(region)
+
+def save_snapshot(snapshot:dict,path:str)->None:
+    with gzip.open(path,'wt',encoding='utf-8') as file:
+        json.dump(snapshot,file,separators=(',',':'))
+
+def load_snapshot(path:str)->dict:
+    with gzip.open(path,'rt',encoding='utf-8') as file:
+        return json.load(file)
+
+def record_snapshot(desktop:'Desktop',path:str,use_vision:bool=False,seed:int=0)->'DesktopState':
+    '''Capture the desktop state through a recording backend and save the snapshot to `path`.'''
+    recorder=RecordingBackend(desktop.backend)
+    backend,capture,tree_seed,incremental=desktop.backend,desktop.capture,desktop.tree.seed,desktop.tree.incremental
+    # Every window is walked through the recorder, none is answered from the window cache of an
+    # earlier capture (which is left empty afterwards, so no window holds recorded controls).
+    # The screenshot is grabbed through the recorder too, the capture of the desktop is bound to its own backend
+    desktop.backend,desktop.capture,desktop.tree.seed,desktop.tree.incremental=recorder,BackendCapture(recorder),seed,False
+    try:
+        recorder.get_screen_size()
+        recorder.get_dpi_scaling()
+        recorder.get_cursor_position()
+        desktop_state=desktop.get_state(use_vision=use_vision)
+    finally:
+        desktop.backend,desktop.capture,desktop.tree.seed,desktop.tree.incremental=backend,capture,tree_seed,incremental
+    save_snapshot(recorder.to_snapshot(seed=seed),path)
+    return desktop_state
+
+def replay_snapshot(path:str)->'Desktop':
+    '''Create a `Desktop` whose backend replays the snapshot at `path`.'''
+    from src.desktop.service import Desktop
+    backend=ReplayBackend.load(path)
+    desktop=Desktop(backend=backend)
+    desktop.tree.seed=backend.seed
+    return desktop
+
+if __name__=='__main__':
+    import argparse
+    parser=argparse.ArgumentParser(description='Record, inspect or replay desktop snapshots')
+    parser.add_argument('command',choices=['record','info','replay'])
+    parser.add_argument('path')
+    parser.add_argument('--vision',action='store_true',help='Also record the raw screenshot')
+    parser.add_argument('--seed',type=int,default=0)
+    args=parser.parse_args()
+    match args.command:
+        case 'record':
+            from src.desktop.service import Desktop
+            desktop_state=record_snapshot(Desktop(),args.path,use_vision=args.vision,seed=args.seed)
+            print(f'Recorded {len(desktop_state.tree_state.interactive_nodes)} interactive elements to {args.path}')
+        case 'info':
+            snapshot=load_snapshot(args.path)
+            reads=sum(len(node['v'])+len(node.get('l') or {})+len(node.get('s') or {}) for node in snapshot['nodes'])
+            print(f"Nodes: {len(snapshot['nodes'])}\nRecorded reads: {reads}\nWindows: {len(snapshot['windows'])}")
+            print(f"Screen: {snapshot['screen'][0]}x{snapshot['screen'][1]}\nScreenshot: {'yes' if snapshot['screenshot'] else 'no'}")
+        case 'replay':
+            desktop=replay_snapshot(args.path)
+            tree_state=desktop.get_state().tree_state
+            print(tree_state.interactive_elements_to_string())
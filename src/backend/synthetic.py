@@ -0,0 +1,587 @@
+from src.backend.config import LOCALIZED_CONTROL_TYPES, SYNTHETIC_CONTAINER_TYPES, SYNTHETIC_ROOT_HANDLE, SYNTHETIC_DOM_ROW_HEIGHT
+from src.backend.prefetch import PrefetchedControl, PrefetchedPattern
+from src.backend.views import Rect, Box, SyntheticConfig
+from PIL import Image, ImageDraw
+from typing import Optional,Literal
+from collections import deque
+from threading import Lock
+from time import sleep
+import random
+
+DEFAULT_ACTION_BY_CONTROL_TYPE={
+    'ButtonControl':'Press','HyperlinkControl':'Jump','CheckBoxControl':'Check',
+    'ListItemControl':'Double Click','MenuItemControl':'Open','TabItemControl':'Switch',
+    'TreeItemControl':'Expand','ComboBoxControl':'Open','RadioButtonControl':'Select'
+}
+
+FOCUSABLE_CONTROL_TYPES=set([
+    'ButtonControl','EditControl','CheckBoxControl','ComboBoxControl','HyperlinkControl',
+    'ListItemControl','MenuItemControl','TabItemControl','TreeItemControl','RadioButtonControl'
+])
+
+class SyntheticPattern:
+    __slots__=('_backend','_properties')
+
+    def __init__(self,backend:'SyntheticBackend',properties:dict):
+        self._backend=backend
+        self._properties=properties
+
+    def __getattr__(self,name:str):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            value=self._properties[name]
+        except KeyError:
+            raise AttributeError(name) from None
+        self._backend.read(name)
+        return value
+
+class SyntheticControl:
+    '''
+    In-memory stand-in for a `uiautomation.Control`.
+
+    Every property read and navigation call goes through `SyntheticBackend.read`,
+    which counts it and optionally sleeps to emulate a cross-process COM round trip.
+    '''
+    __slots__=('_backend','_properties','_parent','_children','_index','_runtime_id','_legacy_pattern','_scroll_pattern')
+
+    def __init__(self,backend:'SyntheticBackend',parent:Optional['SyntheticControl'],runtime_id:list[int],properties:dict):
+        self._backend=backend
+        self._properties=properties
+        self._parent=parent
+        self._children:list[SyntheticControl]=[]
+        self._index=0
+        self._runtime_id=runtime_id
+        self._legacy_pattern:Optional[SyntheticPattern]=None
+        self._scroll_pattern:Optional[SyntheticPattern]=None
+        if parent is not None:
+            self._index=len(parent._children)
+            parent._children.append(self)
+
+    def __getattr__(self,name:str):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            value=self._properties[name]
+        except KeyError:
+            raise AttributeError(name) from None
+        self._backend.read(name)
+        return value
+
+    def __repr__(self):
+        return f"SyntheticControl({self._properties['ControlTypeName']}, {self._properties['Name']!r})"
+
+    @property
+    def HasKeyboardFocus(self)->bool:
+        self._backend.read('HasKeyboardFocus')
+        return self._backend.focused is self
+
+    def GetChildren(self)->list['SyntheticControl']:
+        # uiautomation builds the list with a first-child call and a next-sibling call per child
+        self._backend.read('GetFirstChildControl')
+        for _ in self._children:
+            self._backend.read('GetNextSiblingControl')
+        return list(self._children)
+
+    def GetFirstChildControl(self)->Optional['SyntheticControl']:
+        self._backend.read('GetFirstChildControl')
+        return self._children[0] if self._children else None
+
+    def GetLastChildControl(self)->Optional['SyntheticControl']:
+        self._backend.read('GetLastChildControl')
+        return self._children[-1] if self._children else None
+
+    def GetNextSiblingControl(self)->Optional['SyntheticControl']:
+        self._backend.read('GetNextSiblingControl')
+        if self._parent is None:
+            return None
+        siblings=self._parent._children
+        return siblings[self._index+1] if self._index+1<len(siblings) else None
+
+    def GetPreviousSiblingControl(self)->Optional['SyntheticControl']:
+        self._backend.read('GetPreviousSiblingControl')
+        if self._parent is None or self._index==0:
+            return None
+        return self._parent._children[self._index-1]
+
+    def GetParentControl(self)->Optional['SyntheticControl']:
+        self._backend.read('GetParentControl')
+        return self._parent
+
+    def GetRuntimeId(self)->list[int]:
+        self._backend.read('GetRuntimeId')
+        return list(self._runtime_id)
+
+    def GetLegacyIAccessiblePattern(self)->Optional[SyntheticPattern]:
+        self._backend.read('GetLegacyIAccessiblePattern')
+        return self._legacy_pattern
+
+    def GetScrollPattern(self)->Optional[SyntheticPattern]:
+        self._backend.read('GetScrollPattern')
+        return self._scroll_pattern
+
+    def MoveWindow(self,x:int,y:int,width:int,height:int)->bool:
+        self._backend.read('MoveWindow')
+        self._properties['BoundingRectangle']=Rect(left=x,top=y,right=x+width,bottom=y+height)
+        return True
+
+class SyntheticBackend:
+    '''
+    Deterministic, generated desktop for running `Desktop` and `Tree` without Windows.
+
+    The shape of the desktop (apps, breadth, depth, browser DOM subtrees, dialogs and
+    control type mix) is controlled by `SyntheticConfig`; the same config and seed always
+    produce the same tree. Input calls move a virtual cursor and are recorded in `events`.
+    '''
+    name='synthetic'
+
+    def __init__(self,config:Optional[SyntheticConfig]=None):
+        self.config=config or SyntheticConfig()
+        self.calls:dict[str,int]={}
+        self.events:deque[tuple]=deque(maxlen=1000)
+        self.processes:dict[int,str]={}
+        self.handles:dict[int,SyntheticControl]={}
+        self.minimized:set[int]=set()
+        self.maximized:set[int]=set()
+        self.focused:Optional[SyntheticControl]=None
+        self.foreground_handle=0
+        self.cursor=(0,0)
+        self.clipboard=''
+        self._lock=Lock()
+        self._rng=random.Random(self.config.seed)
+        self._serial=0
+        self._next_handle=SYNTHETIC_ROOT_HANDLE
+        self._dom_y=0
+        self._frame:Optional[Image.Image]=None
+        self.root=self._build_desktop()
+
+    def read(self,name:str)->None:
+        with self._lock:
+            self.calls[name]=self.calls.get(name,0)+1
+        if self.config.call_latency:
+            sleep(self.config.call_latency)
+
+    @property
+    def call_count(self)->int:
+        return sum(self.calls.values())
+
+    def reset_calls(self)->None:
+        with self._lock:
+            self.calls.clear()
+
+    # Control tree
+
+    def get_root_control(self)->SyntheticControl:
+        return self.root
+
+    def get_focused_control(self)->Optional[SyntheticControl]:
+        return self.focused
+
+    def control_from_handle(self,handle:int)->Optional[SyntheticControl]:
+        return self.handles.get(handle)
+
+    def control_from_cursor(self)->Optional[SyntheticControl]:
+        return self.control_from_point(*self.cursor)
+
+    def prefetch_subtree(self,control:SyntheticControl,properties:list[str],patterns:list[str])->PrefetchedControl:
+        # A single cross-process request, like a UIA cache request built for the whole subtree
+        self.read('BuildUpdatedCache')
+        sources={'LegacyIAccessiblePattern':'_legacy_pattern','ScrollPattern':'_scroll_pattern'}
+        def fetch(source:SyntheticControl,parent:Optional[PrefetchedControl])->PrefetchedControl:
+            available=source._properties
+            values={name:available[name] for name in properties if name in available}
+            if 'HasKeyboardFocus' in properties:
+                values['HasKeyboardFocus']=self.focused is source
+            node=PrefetchedControl(values,source,parent,runtime_id=source._runtime_id)
+            for pattern_name in patterns:
+                pattern=getattr(source,sources[pattern_name])
+                node.patterns[pattern_name]=PrefetchedPattern(dict(pattern._properties)) if pattern is not None else None
+            return node
+        root=fetch(control,None)
+        stack=[(control,root)]
+        while stack:
+            source,node=stack.pop()
+            for child in source._children:
+                stack.append((child,fetch(child,node)))
+        return root
+
+    def control_from_point(self,x:int,y:int)->SyntheticControl:
+        for window in self.root._children:
+            handle=window._properties['NativeWindowHandle']
+            if handle in self.minimized or not window._properties['BoundingRectangle'].contains(x,y):
+                continue
+            element=window
+            while True:
+                hit=None
+                for child in element._children:
+                    properties=child._properties
+                    if not properties['IsOffscreen'] and properties['BoundingRectangle'].contains(x,y):
+                        hit=child
+                if hit is None:
+                    return element
+                element=hit
+        return self.root
+
+    # Windows and processes
+
+    def get_foreground_window(self)->int:
+        return self.foreground_handle
+
+    def is_top_level_window(self,handle:int)->bool:
+        control=self.handles.get(handle)
+        return control is not None and control._parent is self.root
+
+    def is_iconic(self,handle:int)->bool:
+        return handle in self.minimized
+
+    def is_zoomed(self,handle:int)->bool:
+        return handle in self.maximized
+
+    def is_window_visible(self,handle:int)->bool:
+        return handle in self.handles
+
+    def minimize_window(self,handle:int)->None:
+        self.minimized.add(handle)
+        self.events.append(('minimize',handle))
+
+    def restore_window(self,handle:int)->None:
+        self.minimized.discard(handle)
+        self.maximized.discard(handle)
+        self.events.append(('restore',handle))
+
+    def set_foreground_window(self,handle:int)->None:
+        window=self.handles.get(handle)
+        if window is None or window._parent is not self.root:
+            return None
+        windows=self.root._children
+        windows.remove(window)
+        # Keep always-on-top taskbar windows above the foreground window
+        position=0
+        while position<len(windows) and windows[position]._properties['ClassName']=='Shell_TrayWnd':
+            position+=1
+        windows.insert(position,window)
+        for index,child in enumerate(windows):
+            child._index=index
+        self.foreground_handle=handle
+        self._frame=None
+        self.events.append(('foreground',handle))
+
+    def bring_window_to_top(self,handle:int)->None:
+        self.set_foreground_window(handle)
+
+    def get_process_name(self,process_id:int)->str:
+        return self.processes.get(process_id,'')
+
+    # Screen
+
+    def get_screen_size(self)->tuple[int,int]:
+        return self.config.screen_width,self.config.screen_height
+
+    def get_dpi_scaling(self)->float:
+        return 1.0
+
+    def screenshot(self,region:Optional[Box]=None)->Image.Image:
+        if self._frame is None:
+            self._frame=self._render()
+        if region is None:
+            return self._frame.copy()
+        return self._frame.crop(region)
+
+    # Input
+
+    def get_cursor_position(self)->tuple[int,int]:
+        return self.cursor
+
+    def move_cursor(self,loc:tuple[int,int],duration:float=0.0)->None:
+        x,y=loc
+        self.cursor=(x,y)
+        self.events.append(('move',x,y))
+
+    def click(self,loc:Optional[tuple[int,int]]=None,button:Literal['left','right','middle']='left',clicks:int=1,duration:float=0.0)->None:
+        if loc is not None:
+            self.move_cursor(loc)
+        self.events.append(('click',button,clicks))
+
+    def mouse_down(self)->None:
+        self.events.append(('mouse_down',))
+
+    def mouse_up(self)->None:
+        self.events.append(('mouse_up',))
+
+    def drag_to(self,loc:tuple[int,int],duration:float=0.0)->None:
+        self.mouse_down()
+        self.move_cursor(loc)
+        self.mouse_up()
+
+    def wheel_up(self,times:int=1)->None:
+        self.events.append(('wheel',times))
+
+    def wheel_down(self,times:int=1)->None:
+        self.events.append(('wheel',-times))
+
+    def press(self,key:str)->None:
+        self.events.append(('press',key))
+
+    def hotkey(self,*keys:str)->None:
+        self.events.append(('hotkey',*keys))
+
+    def key_down(self,key:str)->None:
+        self.events.append(('key_down',key))
+
+    def key_up(self,key:str)->None:
+        self.events.append(('key_up',key))
+
+    def type_text(self,text:str,interval:float=0.0)->None:
+        self.events.append(('type',text))
+
+    def set_clipboard(self,text:str)->None:
+        self.clipboard=text
+
+    def get_clipboard(self)->str:
+        return self.clipboard
+
+    # Generation
+
+    def _new(self,parent:Optional[SyntheticControl],control_type:str,rect:Rect,name:str='',class_name:str='',
+             handle:int=0,process_id:int=0,offscreen:bool=False,**properties)->SyntheticControl:
+        self._serial+=1
+        window_handle=handle or (parent._runtime_id[1] if parent is not None else SYNTHETIC_ROOT_HANDLE)
+        values={
+            'Name':name,
+            'ControlTypeName':control_type,
+            'LocalizedControlType':LOCALIZED_CONTROL_TYPES.get(control_type,'custom'),
+            'ClassName':class_name,
+            'AutomationId':str(self._serial),
+            'AcceleratorKey':'',
+            'BoundingRectangle':rect,
+            'IsOffscreen':offscreen,
+            'IsEnabled':True,
+            'IsControlElement':True,
+            'IsKeyboardFocusable':control_type in FOCUSABLE_CONTROL_TYPES,
+            'NativeWindowHandle':handle,
+            'ProcessId':process_id or (parent._properties['ProcessId'] if parent is not None else 0),
+        }
+        values.update(properties)
+        control=SyntheticControl(self,parent,[42,window_handle,self._serial],values)
+        control._legacy_pattern=SyntheticPattern(self,{
+            'DefaultAction':DEFAULT_ACTION_BY_CONTROL_TYPE.get(control_type,''),
+            'Value':values.pop('Value','')
+        })
+        if handle:
+            self.handles[handle]=control
+        return control
+
+    def _handle(self)->int:
+        self._next_handle+=16
+        return self._next_handle
+
+    def _scrollable(self,control:SyntheticControl,vertical:bool=True,horizontal:bool=False)->None:
+        control._scroll_pattern=SyntheticPattern(self,{
+            'VerticallyScrollable':vertical,
+            'HorizontallyScrollable':horizontal,
+            'VerticalScrollPercent':0.0 if vertical else -1.0,
+            'HorizontalScrollPercent':0.0 if horizontal else -1.0
+        })
+
+    def _split(self,rect:Rect,count:int,vertical:bool)->list[Rect]:
+        rects=[]
+        for index in range(count):
+            if vertical:
+                top=rect.top+rect.height()*index//count
+                bottom=rect.top+rect.height()*(index+1)//count
+                rects.append(Rect(left=rect.left,top=top,right=rect.right,bottom=bottom))
+            else:
+                left=rect.left+rect.width()*index//count
+                right=rect.left+rect.width()*(index+1)//count
+                rects.append(Rect(left=left,top=rect.top,right=right,bottom=rect.bottom))
+        return rects
+
+    def _build_desktop(self)->SyntheticControl:
+        config=self.config
+        width,height=config.screen_width,config.screen_height
+        root=self._new(None,'PaneControl',Rect(0,0,width,height),name='Desktop 1',class_name='#32769',handle=SYNTHETIC_ROOT_HANDLE)
+        explorer_id=4
+        self.processes[explorer_id]='explorer.exe'
+        taskbar=self._new(root,'PaneControl',Rect(0,height-48,width,height),name='Taskbar',class_name='Shell_TrayWnd',
+                          handle=self._handle(),process_id=explorer_id)
+        windows=[]
+        for index in range(config.apps):
+            windows.append(self._build_app(root,index))
+        for index in range(config.dialogs):
+            if windows:
+                self._build_dialog(windows[index%len(windows)],index)
+        self._build_taskbar(taskbar,windows)
+        progman=self._new(root,'PaneControl',Rect(0,0,width,height),name='Program Manager',class_name='Progman',
+                          handle=self._handle(),process_id=explorer_id)
+        icons=self._new(progman,'ListControl',Rect(0,0,width,height),name='Desktop',class_name='SysListView32')
+        for index,name in enumerate(['Recycle Bin','This PC','Documents','Downloads']):
+            self._new(icons,'ListItemControl',Rect(8,8+index*96,88,96+index*96),name=name)
+        if windows:
+            self.foreground_handle=windows[0]._properties['NativeWindowHandle']
+        return root
+
+    def _build_app(self,root:SyntheticControl,index:int)->SyntheticControl:
+        config=self.config
+        width,height=config.screen_width,config.screen_height-48
+        is_browser=index<config.browser_apps
+        process_id=1000+index*4
+        self.processes[process_id]='msedge.exe' if is_browser else 'synthetic.exe'
+        if index==0:
+            rect=Rect(0,0,width,height)
+        else:
+            left,top=(40*index)%(width//4),(30*index)%(height//4)
+            rect=Rect(left,top,left+width*3//4,top+height*3//4)
+        name=f'Synthetic Page {index} - Microsoft Edge' if is_browser else f'Synthetic App {index}'
+        class_name='Chrome_WidgetWin_1' if is_browser else 'SyntheticWindow'
+        window=self._new(root,'WindowControl',rect,name=name,class_name=class_name,handle=self._handle(),process_id=process_id)
+        if index==0:
+            self.maximized.add(window._properties['NativeWindowHandle'])
+        title_rect=Rect(rect.left,rect.top,rect.right,rect.top+32)
+        title_bar=self._new(window,'TitleBarControl',title_rect,name=name)
+        for offset,button in enumerate(['Minimize','Maximize','Close']):
+            left=rect.right-(3-offset)*46
+            self._new(title_bar,'ButtonControl',Rect(left,rect.top,left+46,rect.top+32),name=button)
+        content=Rect(rect.left,rect.top+32,rect.right,rect.bottom)
+        if is_browser:
+            self._build_browser(window,content,focus=index==0)
+        else:
+            pane=self._new(window,'PaneControl',content,name='',class_name='SyntheticClient')
+            self._build_subtree(pane,content,level=0,offscreen=False,focus=index==0)
+        return window
+
+    def _build_subtree(self,parent:SyntheticControl,rect:Rect,level:int,offscreen:bool,focus:bool)->None:
+        config=self.config
+        if level>=config.depth:
+            return None
+        control_types=list(config.control_type_mix)
+        weights=list(config.control_type_mix.values())
+        for child_rect in self._split(rect,config.breadth,vertical=level%2==0):
+            child_offscreen=offscreen or self._rng.random()<config.offscreen_ratio
+            if level<config.depth-1:
+                control_type=self._rng.choice(SYNTHETIC_CONTAINER_TYPES)
+                child=self._new(parent,control_type,child_rect,name=f'{control_type[:-7]} {self._serial+1}',offscreen=child_offscreen)
+                if control_type=='ListControl':
+                    self._scrollable(child)
+                self._build_subtree(child,child_rect,level+1,child_offscreen,focus)
+            else:
+                control_type=self._rng.choices(control_types,weights)[0]
+                properties={}
+                if control_type=='EditControl':
+                    properties['Value']=f'Value {self._serial+1}'
+                elif control_type=='ButtonControl' and self._rng.random()<0.1:
+                    properties['AcceleratorKey']=f'Ctrl+{chr(65+self._rng.randrange(26))}'
+                if self._rng.random()<0.05:
+                    properties['IsEnabled']=False
+                name='' if control_type=='GroupControl' else f'{control_type[:-7]} {self._serial+1}'
+                child=self._new(parent,control_type,child_rect,name=name,offscreen=child_offscreen,**properties)
+                if focus and self.focused is None and control_type=='EditControl' and not child_offscreen:
+                    self.focused=child
+
+    def _build_browser(self,window:SyntheticControl,rect:Rect,focus:bool)->None:
+        config=self.config
+        toolbar_rect=Rect(rect.left,rect.top,rect.right,rect.top+40)
+        toolbar=self._new(window,'ToolBarControl',toolbar_rect,name='App bar')
+        for offset,button in enumerate(['Back','Forward','Refresh']):
+            left=rect.left+offset*40
+            self._new(toolbar,'ButtonControl',Rect(left,rect.top,left+40,rect.top+40),name=button)
+        address_bar=self._new(toolbar,'EditControl',Rect(rect.left+120,rect.top+4,rect.right-120,rect.top+36),
+                              name='Address and search bar',Value='https://example.com/',AcceleratorKey='Ctrl+L')
+        if focus and self.focused is None:
+            self.focused=address_bar
+        viewport=Rect(rect.left,rect.top+40,rect.right,rect.bottom)
+        document=self._new(window,'DocumentControl',viewport,name='Synthetic Page',class_name='Chrome_RenderWidgetHostHWND')
+        self._scrollable(document)
+        self._dom_y=viewport.top
+        self._build_dom(document,viewport,level=0)
+
+    def _dom_row(self,parent:SyntheticControl,viewport:Rect,level:int,control_type:str,**properties)->SyntheticControl:
+        top=self._dom_y
+        self._dom_y+=SYNTHETIC_DOM_ROW_HEIGHT
+        rect=Rect(viewport.left+16*(level+1),top,viewport.right-16,top+SYNTHETIC_DOM_ROW_HEIGHT)
+        offscreen=rect.top>=viewport.bottom
+        return self._new(parent,control_type,rect,offscreen=offscreen,**properties)
+
+    def _dom_span(self,control:SyntheticControl,viewport:Rect,top:int)->None:
+        rect=control._properties['BoundingRectangle']
+        rect.top,rect.bottom=top,max(self._dom_y,top+1)
+        control._properties['IsOffscreen']=rect.top>=viewport.bottom
+
+    def _build_dom(self,parent:SyntheticControl,viewport:Rect,level:int)->None:
+        config=self.config
+        rng=self._rng
+        for _ in range(config.dom_breadth):
+            serial=self._serial+1
+            if level<config.dom_depth-1 and rng.random()<0.5:
+                top=self._dom_y
+                if rng.random()<0.5:
+                    section=self._new(parent,'GroupControl',Rect(viewport.left,top,viewport.right,top),name='')
+                    self._build_dom(section,viewport,level+1)
+                    self._dom_span(section,viewport,top)
+                else:
+                    listing=self._new(parent,'ListControl',Rect(viewport.left,top,viewport.right,top),name='')
+                    for _ in range(config.dom_breadth):
+                        item=self._dom_row(listing,viewport,level+1,'ListItemControl',name='')
+                        self._new(item,'HyperlinkControl',item._properties['BoundingRectangle'],name=f'Item link {self._serial+1}',
+                                  offscreen=item._properties['IsOffscreen'])
+                    self._dom_span(listing,viewport,top)
+                continue
+            kind=rng.choice(['link','heading','text','text','button','edit','image','focusable_group'])
+            match kind:
+                case 'link':
+                    self._dom_row(parent,viewport,level,'HyperlinkControl',name=f'Link {serial}')
+                case 'heading':
+                    link=self._dom_row(parent,viewport,level,'HyperlinkControl',name='')
+                    self._new(link,'TextControl',link._properties['BoundingRectangle'],name=f'Heading {serial}',
+                              LocalizedControlType='heading',offscreen=link._properties['IsOffscreen'])
+                case 'text':
+                    self._dom_row(parent,viewport,level,'TextControl',name=f'Paragraph {serial}')
+                case 'button':
+                    self._dom_row(parent,viewport,level,'ButtonControl',name=f'Button {serial}')
+                case 'edit':
+                    self._dom_row(parent,viewport,level,'EditControl',name=f'Search {serial}',Value='')
+                case 'image':
+                    self._dom_row(parent,viewport,level,'ImageControl',name=f'Image {serial}',LocalizedControlType='graphic')
+                case 'focusable_group':
+                    group=self._dom_row(parent,viewport,level,'GroupControl',name='',IsKeyboardFocusable=True)
+                    group._legacy_pattern._properties['DefaultAction']='Click'
+                    self._new(group,'TextControl',group._properties['BoundingRectangle'],name=f'Card {serial}',
+                              offscreen=group._properties['IsOffscreen'])
+
+    def _build_dialog(self,window:SyntheticControl,index:int)->None:
+        rect=window._properties['BoundingRectangle']
+        left,top=rect.xcenter()-200,rect.ycenter()-80
+        dialog=self._new(window,'WindowControl',Rect(left,top,left+400,top+160),name=f'Dialog {index}',
+                         class_name='#32770',handle=self._handle())
+        self._new(dialog,'TitleBarControl',Rect(left,top,left+400,top+32),name=f'Dialog {index}')
+        self._new(dialog,'TextControl',Rect(left+16,top+48,left+384,top+80),name=f'Dialog message {index}')
+        self._new(dialog,'ButtonControl',Rect(left+200,top+112,left+288,top+144),name='OK')
+        self._new(dialog,'ButtonControl',Rect(left+296,top+112,left+384,top+144),name='Cancel')
+
+    def _build_taskbar(self,taskbar:SyntheticControl,windows:list[SyntheticControl])->None:
+        rect=taskbar._properties['BoundingRectangle']
+        self._new(taskbar,'ButtonControl',Rect(rect.left,rect.top,rect.left+48,rect.bottom),name='Start')
+        self._new(taskbar,'ButtonControl',Rect(rect.left+48,rect.top,rect.left+96,rect.bottom),name='Search')
+        tasks=self._new(taskbar,'ToolBarControl',Rect(rect.left+96,rect.top,rect.right-160,rect.bottom),name='Running applications')
+        for index,window in enumerate(windows):
+            left=rect.left+96+index*48
+            self._new(tasks,'ButtonControl',Rect(left,rect.top,left+48,rect.bottom),name=f"{window._properties['Name']} - 1 running window")
+        self._new(taskbar,'TextControl',Rect(rect.right-160,rect.top,rect.right,rect.bottom),name='12:00 PM')
+
+    def _render(self)->Image.Image:
+        width,height=self.get_screen_size()
+        frame=Image.new('RGB',(width,height),color=(0,84,147))
+        draw=ImageDraw.Draw(frame)
+        def draw_control(control:SyntheticControl,level:int):
+            properties=control._properties
+            rect=properties['BoundingRectangle']
+            if rect.isempty() or properties['IsOffscreen']:
+                return None
+            shade=255-(level*24)%96
+            draw.rectangle((rect.left,rect.top,rect.right-1,rect.bottom-1),fill=(shade,shade,shade),outline=(96,96,96))
+            if level<3:
+                for child in control._children:
+                    draw_control(child,level+1)
+        for window in reversed(self.root._children):
+            if window._properties['NativeWindowHandle'] not in self.minimized:
+                draw_control(window,0)
+        return frame
@@ -0,0 +1,244 @@
+from src.desktop.config import PROCESS_PER_MONITOR_DPI_AWARE
+from src.backend.prefetch import PrefetchedControl, PrefetchedPattern, PATTERN_PROPERTIES
+from src.backend.views import Rect, Box
+from typing import Optional,Literal
+from psutil import Process
+from PIL import Image
+import win32process
+import win32gui
+import win32con
+import ctypes
+
+try:
+    ctypes.windll.shcore.SetProcessDpiAwareness(PROCESS_PER_MONITOR_DPI_AWARE)
+except Exception:
+    ctypes.windll.user32.SetProcessDPIAware()
+
+import uiautomation as uia
+import pyautogui as pg
+import pyperclip as pc
+
+pg.FAILSAFE=False
+pg.PAUSE=1.0
+
+# Control property name -> UIA property id
+CACHED_PROPERTY_IDS={
+    'Name':uia.PropertyId.NameProperty,
+    'ControlTypeName':uia.PropertyId.ControlTypeProperty,
+    'LocalizedControlType':uia.PropertyId.LocalizedControlTypeProperty,
+    'ClassName':uia.PropertyId.ClassNameProperty,
+    'AcceleratorKey':uia.PropertyId.AcceleratorKeyProperty,
+    'BoundingRectangle':uia.PropertyId.BoundingRectangleProperty,
+    'IsOffscreen':uia.PropertyId.IsOffscreenProperty,
+    'IsEnabled':uia.PropertyId.IsEnabledProperty,
+    'IsControlElement':uia.PropertyId.IsControlElementProperty,
+    'IsKeyboardFocusable':uia.PropertyId.IsKeyboardFocusableProperty,
+    'HasKeyboardFocus':uia.PropertyId.HasKeyboardFocusProperty,
+    'NativeWindowHandle':uia.PropertyId.NativeWindowHandleProperty,
+    'ProcessId':uia.PropertyId.ProcessIdProperty
+}
+
+# Pattern name -> UIA pattern id and the ids of the pattern properties read by the tree
+CACHED_PATTERN_IDS={
+    'LegacyIAccessiblePattern':(uia.PatternId.LegacyIAccessiblePattern,[
+        uia.PropertyId.LegacyIAccessibleDefaultActionProperty,
+        uia.PropertyId.LegacyIAccessibleValueProperty
+    ]),
+    'ScrollPattern':(uia.PatternId.ScrollPattern,[
+        uia.PropertyId.ScrollHorizontallyScrollableProperty,
+        uia.PropertyId.ScrollVerticallyScrollableProperty,
+        uia.PropertyId.ScrollHorizontalScrollPercentProperty,
+        uia.PropertyId.ScrollVerticalScrollPercentProperty
+    ])
+}
+
+def read_cached_property(element,name:str):
+    match name:
+        case 'ControlTypeName':
+            return uia.ControlTypeNames[element.CachedControlType]
+        case 'BoundingRectangle':
+            rect=element.CachedBoundingRectangle
+            return Rect(rect.left,rect.top,rect.right,rect.bottom)
+        case 'IsOffscreen'|'IsEnabled'|'IsControlElement'|'IsKeyboardFocusable'|'HasKeyboardFocus':
+            return bool(getattr(element,f'Cached{name}'))
+        case _:
+            return getattr(element,f'Cached{name}')
+
+class UIABackend:
+    '''Backend over Windows UI Automation, the Win32 window APIs and pyautogui.'''
+    name='uia'
+
+    def get_root_control(self)->uia.Control:
+        return uia.GetRootControl()
+
+    def get_focused_control(self)->Optional[uia.Control]:
+        return uia.GetFocusedControl()
+
+    def control_from_handle(self,handle:int)->Optional[uia.Control]:
+        return uia.ControlFromHandle(handle)
+
+    def control_from_cursor(self)->Optional[uia.Control]:
+        return uia.ControlFromCursor()
+
+    def prefetch_subtree(self,control:uia.Control,properties:list[str],patterns:list[str])->PrefetchedControl:
+        # One IUIAutomationCacheRequest brings back the whole subtree in a single cross-process call
+        client=uia._AutomationClient.instance()
+        automation=client.IUIAutomation
+        request=automation.CreateCacheRequest()
+        for name in properties:
+            request.AddProperty(CACHED_PROPERTY_IDS[name])
+        for name in patterns:
+            pattern_id,property_ids=CACHED_PATTERN_IDS[name]
+            request.AddPattern(pattern_id)
+            for property_id in property_ids:
+                request.AddProperty(property_id)
+        # uiautomation navigates the raw view, so the cached tree uses the same filter
+        request.TreeFilter=automation.RawViewCondition
+        request.TreeScope=uia.TreeScope.Subtree
+        element=control.Element.BuildUpdatedCache(request)
+
+        def fetch(element,parent:Optional[PrefetchedControl])->PrefetchedControl:
+            values={}
+            for name in properties:
+                try:
+                    values[name]=read_cached_property(element,name)
+                except Exception:
+                    pass
+            try:
+                # The element carries its RuntimeId, reading it does not leave the process
+                runtime_id=list(element.GetRuntimeId())
+            except Exception:
+                runtime_id=None
+            node=PrefetchedControl(values,uia.Control.CreateControlFromElement(element),parent,runtime_id=runtime_id)
+            for name in patterns:
+                pattern_id,_=CACHED_PATTERN_IDS[name]
+                try:
+                    pattern=element.GetCachedPattern(pattern_id)
+                except Exception:
+                    pattern=None
+                if not pattern:
+                    node.patterns[name]=None
+                    continue
+                pattern=pattern.QueryInterface(uia.GetPatternIdInterface(pattern_id))
+                pattern_values={}
+                for property_name in PATTERN_PROPERTIES[name]:
+                    try:
+                        pattern_values[property_name]=getattr(pattern,f'Cached{property_name}')
+                    except Exception:
+                        pass
+                node.patterns[name]=PrefetchedPattern(pattern_values)
+            return node
+
+        root=fetch(element,None)
+        stack=[(element,root)]
+        while stack:
+            element,node=stack.pop()
+            children=element.GetCachedChildren()
+            if not children:
+                continue
+            for index in range(children.Length):
+                child=children.GetElement(index)
+                stack.append((child,fetch(child,node)))
+        return root
+
+    def get_foreground_window(self)->int:
+        return uia.GetForegroundWindow()
+
+    def is_top_level_window(self,handle:int)->bool:
+        return bool(uia.IsTopLevelWindow(handle))
+
+    def is_iconic(self,handle:int)->bool:
+        return bool(uia.IsIconic(handle))
+
+    def is_zoomed(self,handle:int)->bool:
+        return bool(uia.IsZoomed(handle))
+
+    def is_window_visible(self,handle:int)->bool:
+        return bool(uia.IsWindowVisible(handle))
+
+    def minimize_window(self,handle:int)->None:
+        uia.ShowWindow(handle,win32con.SW_MINIMIZE)
+
+    def restore_window(self,handle:int)->None:
+        uia.ShowWindow(handle,win32con.SW_RESTORE)
+
+    def set_foreground_window(self,handle:int)->None:
+        win32gui.SetForegroundWindow(handle)
+
+    def bring_window_to_top(self,handle:int)->None:
+        foreground_handle=uia.GetForegroundWindow()
+        foreground_thread,_=win32process.GetWindowThreadProcessId(foreground_handle)
+        target_thread,_=win32process.GetWindowThreadProcessId(handle)
+        win32process.AttachThreadInput(foreground_thread,target_thread,True)
+        uia.SetForegroundWindow(handle)
+        win32gui.BringWindowToTop(handle)
+        win32process.AttachThreadInput(foreground_thread,target_thread,False)
+
+    def get_process_name(self,process_id:int)->str:
+        return Process(process_id).name()
+
+    def get_screen_size(self)->tuple[int,int]:
+        width,height=uia.GetScreenSize()
+        return width,height
+
+    def get_dpi_scaling(self)->float:
+        dpi=ctypes.windll.user32.GetDpiForSystem()
+        return dpi/96.0
+
+    def screenshot(self,region:Optional[Box]=None)->Image.Image:
+        if region is None:
+            return pg.screenshot()
+        left,top,right,bottom=region
+        return pg.screenshot(region=(left,top,right-left,bottom-top))
+
+    def get_cursor_position(self)->tuple[int,int]:
+        position=pg.position()
+        return (position.x,position.y)
+
+    def move_cursor(self,loc:tuple[int,int],duration:float=0.0)->None:
+        x,y=loc
+        pg.moveTo(x,y,duration=duration)
+
+    def click(self,loc:Optional[tuple[int,int]]=None,button:Literal['left','right','middle']='left',clicks:int=1,duration:float=0.0)->None:
+        if loc is None:
+            pg.click(button=button,clicks=clicks)
+        else:
+            x,y=loc
+            pg.click(x,y,button=button,clicks=clicks,duration=duration)
+
+    def mouse_down(self)->None:
+        pg.mouseDown()
+
+    def mouse_up(self)->None:
+        pg.mouseUp()
+
+    def drag_to(self,loc:tuple[int,int],duration:float=0.0)->None:
+        x,y=loc
+        pg.dragTo(x,y,duration=duration)
+
+    def wheel_up(self,times:int=1)->None:
+        uia.WheelUp(times)
+
+    def wheel_down(self,times:int=1)->None:
+        uia.WheelDown(times)
+
+    def press(self,key:str)->None:
+        pg.press(key)
+
+    def hotkey(self,*keys:str)->None:
+        pg.hotkey(*keys)
+
+    def key_down(self,key:str)->None:
+        pg.keyDown(key)
+
+    def key_up(self,key:str)->None:
+        pg.keyUp(key)
+
+    def type_text(self,text:str,interval:float=0.0)->None:
+        pg.typewrite(text,interval=interval)
+
+    def set_clipboard(self,text:str)->None:
+        pc.copy(text)
+
+    def get_clipboard(self)->str:
+        return pc.paste()
@@ -0,0 +1,148 @@
+from src.backend.config import SYNTHETIC_CONTROL_TYPE_MIX
+from typing import Protocol, Optional, Literal, TYPE_CHECKING
+from dataclasses import dataclass,field
+from PIL.Image import Image
+
+if TYPE_CHECKING:
+    from src.backend.prefetch import PrefetchedControl
+
+# (left, top, right, bottom) of a screen area in pixels
+Box=tuple[int,int,int,int]
+
+@dataclass
+class Rect:
+    left:int
+    top:int
+    right:int
+    bottom:int
+
+    def width(self)->int:
+        return self.right-self.left
+
+    def height(self)->int:
+        return self.bottom-self.top
+
+    def xcenter(self)->int:
+        return self.left+self.width()//2
+
+    def ycenter(self)->int:
+        return self.top+self.height()//2
+
+    def isempty(self)->bool:
+        return self.width()<=0 or self.height()<=0
+
+    def contains(self,x:int,y:int)->bool:
+        return self.left<=x<self.right and self.top<=y<self.bottom
+
+class LegacyIAccessiblePattern(Protocol):
+    DefaultAction:str
+    Value:str
+
+class ScrollPattern(Protocol):
+    HorizontallyScrollable:bool
+    VerticallyScrollable:bool
+    HorizontalScrollPercent:float
+    VerticalScrollPercent:float
+
+class Control(Protocol):
+    '''The subset of a `uiautomation.Control` that the tree and desktop services read.'''
+    Name:str
+    ControlTypeName:str
+    LocalizedControlType:str
+    ClassName:str
+    AcceleratorKey:str
+    BoundingRectangle:Rect
+    IsOffscreen:bool
+    IsEnabled:bool
+    IsControlElement:bool
+    IsKeyboardFocusable:bool
+    HasKeyboardFocus:bool
+    NativeWindowHandle:int
+    ProcessId:int
+
+    def GetChildren(self)->list['Control']: ...
+    def GetFirstChildControl(self)->Optional['Control']: ...
+    def GetLastChildControl(self)->Optional['Control']: ...
+    def GetNextSiblingControl(self)->Optional['Control']: ...
+    def GetPreviousSiblingControl(self)->Optional['Control']: ...
+    def GetParentControl(self)->Optional['Control']: ...
+    def GetRuntimeId(self)->list[int]: ...
+    def GetLegacyIAccessiblePattern(self)->Optional[LegacyIAccessiblePattern]: ...
+    def GetScrollPattern(self)->Optional[ScrollPattern]: ...
+    def MoveWindow(self,x:int,y:int,width:int,height:int)->bool: ...
+
+class Backend(Protocol):
+    '''Accessibility, window management, screen and input operations used by `Desktop` and `Tree`.'''
+    name:str
+
+    # Control tree
+    def get_root_control(self)->Control: ...
+    def get_focused_control(self)->Optional[Control]: ...
+    def control_from_handle(self,handle:int)->Optional[Control]: ...
+    def control_from_cursor(self)->Optional[Control]: ...
+    def prefetch_subtree(self,control:Control,properties:list[str],patterns:list[str])->'PrefetchedControl':
+        '''Fetch the listed properties and patterns of `control` and all its descendants in one request.'''
+        ...
+
+    # Windows and processes
+    def get_foreground_window(self)->int: ...
+    def is_top_level_window(self,handle:int)->bool: ...
+    def is_iconic(self,handle:int)->bool: ...
+    def is_zoomed(self,handle:int)->bool: ...
+    def is_window_visible(self,handle:int)->bool: ...
+    def minimize_window(self,handle:int)->None: ...
+    def restore_window(self,handle:int)->None: ...
+    def set_foreground_window(self,handle:int)->None: ...
+    def bring_window_to_top(self,handle:int)->None: ...
+    def get_process_name(self,process_id:int)->str: ...
+
+    # Screen
+    def get_screen_size(self)->tuple[int,int]: ...
+    def get_dpi_scaling(self)->float: ...
+    def screenshot(self,region:Optional[Box]=None)->Image:
+        '''The screen, or only `region` of it.'''
+        ...
+
+    # Input
+    def get_cursor_position(self)->tuple[int,int]: ...
+    def move_cursor(self,loc:tuple[int,int],duration:float=0.0)->None: ...
+    def click(self,loc:Optional[tuple[int,int]]=None,button:Literal['left','right','middle']='left',clicks:int=1,duration:float=0.0)->None: ...
+    def mouse_down(self)->None: ...
+    def mouse_up(self)->None: ...
+    def drag_to(self,loc:tuple[int,int],duration:float=0.0)->None: ...
+    def wheel_up(self,times:int=1)->None: ...
+    def wheel_down(self,times:int=1)->None: ...
+    def press(self,key:str)->None: ...
+    def hotkey(self,*keys:str)->None: ...
+    def key_down(self,key:str)->None: ...
+    def key_up(self,key:str)->None: ...
+    def type_text(self,text:str,interval:float=0.0)->None: ...
+    def set_clipboard(self,text:str)->None: ...
+    def get_clipboard(self)->str: ...
+
+class Capture(Protocol):
+    '''Source of screenshots for `Desktop`, selected with `get_capture`.'''
+    name:str
+
+    def grab(self,region:Optional[Box]=None,reuse:bool=False)->Image:
+        '''
+        The screen, or only `region` of it. With `reuse` the capture may hand out a view of a
+        buffer it keeps, valid until its next grab.
+        '''
+        ...
+
+@dataclass
+class SyntheticConfig:
+    apps:int=3
+    breadth:int=4
+    depth:int=4
+    browser_apps:int=1
+    dom_breadth:int=6
+    dom_depth:int=4
+    dialogs:int=0
+    control_type_mix:dict[str,int]=field(default_factory=lambda:dict(SYNTHETIC_CONTROL_TYPE_MIX))
+    offscreen_ratio:float=0.1
+    screen_width:int=1920
+    screen_height:int=1080
+    call_latency:float=0.0
+    seed:int=0
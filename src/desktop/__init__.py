@@ -0,0 +1 @@
+from src.desktop.service import Desktop
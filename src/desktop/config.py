@@ -16,4 +16,34 @@ EXCLUDED_APPS:Set[str]=set([
     'Program Manager', 'Taskbar'  # Added from copy for broader compatibility
 ])
 
-PROCESS_PER_MONITOR_DPI_AWARE = 2
\ No newline at end of file
+PROCESS_PER_MONITOR_DPI_AWARE = 2
+
+# Filter that shrinks screenshots: a PIL resampling filter (nearest, box, bilinear, hamming, bicubic,
+# lanczos) or `auto`, which uses lanczos down to FAST_RESAMPLING_SCALE and the much cheaper box
+# filter for larger downscales, where its averaging loses little
+SCREENSHOT_RESAMPLING='auto'
+FAST_RESAMPLING_SCALE=0.5
+
+# Encoding of screenshots returned as bytes (see src/desktop/encoding.py): png, palette, jpeg or webp.
+# PNG level 1 spends a fraction of the default level's time for somewhat larger files
+SCREENSHOT_FORMAT='png'
+PNG_COMPRESS_LEVEL=1
+SCREENSHOT_QUALITY=85
+PALETTE_COLORS=256
+
+# Successive screenshots are compared in square tiles of SCREENSHOT_TILE_SIZE pixels, and only the
+# changed regions are sent, unless they cover more than MAX_CHANGED_RATIO of the screenshot. More than
+# MAX_CHANGED_REGIONS regions are sent as the one rectangle around them
+SCREENSHOT_TILE_SIZE=64
+MAX_CHANGED_RATIO=0.5
+MAX_CHANGED_REGIONS=8
+
+# Hand out the last encoded screenshot again, without annotating or encoding, while the screen and
+# the boxes of the interactive elements are unchanged
+SCREENSHOT_CACHE=True
+# The screen is compared by a hash of the frame shrunk by this factor on each side, averaging the
+# pixels of each block, rather than by every pixel
+SCREENSHOT_CACHE_REDUCTION=8
+
+# Seconds the last captured state answers element lookups by position before tools ask UIA again
+STATE_MAX_AGE = 10.0
@@ -0,0 +1,101 @@
+from src.desktop.config import SCREENSHOT_FORMAT, PNG_COMPRESS_LEVEL, SCREENSHOT_QUALITY, PALETTE_COLORS
+from src.backend.views import Box
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Lock
+from typing import Optional
+from io import BytesIO
+from PIL import Image
+import base64
+
+# Encodings of screenshots: `png` is lossless at PNG_COMPRESS_LEVEL, `palette` a PNG of the image
+# reduced to PALETTE_COLORS colors, `jpeg` and `webp` lossy at SCREENSHOT_QUALITY
+SCREENSHOT_FORMATS=('png','palette','jpeg','webp')
+
+class ScreenshotEncoder:
+    '''
+    Encodes screenshots in the configured format, into one output buffer kept between calls.
+
+    `submit` encodes on a background thread (Pillow's encoders release the GIL), so the caller can
+    format the rest of its answer meanwhile; `wait` blocks until that encoding is done.
+    '''
+    def __init__(self,format:str=SCREENSHOT_FORMAT,compress_level:int=PNG_COMPRESS_LEVEL,quality:int=SCREENSHOT_QUALITY,colors:int=PALETTE_COLORS):
+        self.format=format
+        self.compress_level=compress_level
+        self.quality=quality
+        self.colors=colors
+        self.buffer=BytesIO()
+        self.lock=Lock()
+        self.executor:Optional[ThreadPoolExecutor]=None
+        self.pending:Optional[Future]=None
+
+    @property
+    def image_format(self)->str:
+        '''Format of the encoded image file: png, jpeg or webp.'''
+        return 'png' if self.format=='palette' else self.format
+
+    @property
+    def settings(self)->tuple:
+        '''Everything the encoded bytes depend on besides the image.'''
+        return (self.format,self.compress_level,self.quality,self.colors)
+
+    @property
+    def mime_type(self)->str:
+        return f'image/{self.image_format}'
+
+    def write(self,image:Image.Image)->BytesIO:
+        '''Encode into the shared buffer; the caller holds `lock` while it reads the buffer.'''
+        match self.format:
+            case 'png':
+                options={'format':'PNG','compress_level':self.compress_level}
+            case 'palette':
+                image=image.quantize(colors=self.colors,method=Image.Quantize.FASTOCTREE)
+                options={'format':'PNG','compress_level':self.compress_level}
+            case 'jpeg':
+                image=image if image.mode in ('RGB','L') else image.convert('RGB')
+                options={'format':'JPEG','quality':self.quality}
+            case 'webp':
+                # The fastest method, the others take several times as long for a few percent
+                options={'format':'WEBP','quality':self.quality,'method':0}
+            case _:
+                raise ValueError(f'Unknown screenshot format {self.format!r}, expected one of {", ".join(SCREENSHOT_FORMATS)}')
+        buffer=self.buffer
+        buffer.seek(0)
+        image.save(buffer,**options)
+        buffer.truncate()
+        return buffer
+
+    def encode(self,image:Image.Image)->bytes:
+        with self.lock:
+            return self.write(image).getvalue()
+
+    def encode_base64(self,image:Image.Image)->str:
+        with self.lock:
+            # Straight from the buffer, without copying the encoded bytes out first
+            with self.write(image).getbuffer() as view:
+                return base64.b64encode(view).decode('ascii')
+
+    def submit(self,image:Image.Image)->Future:
+        '''Encode on the background thread; the image must not change until the future is done.'''
+        return self.run(self.encode,image)
+
+    def submit_regions(self,image:Image.Image,regions:list[Box])->Future:
+        '''Encode each region of the image on its own, as `submit`; the future holds the list of them.'''
+        return self.run(lambda:[self.encode(image.crop(region)) for region in regions])
+
+    def run(self,function,*args)->Future:
+        if self.executor is None:
+            self.executor=ThreadPoolExecutor(max_workers=1,thread_name_prefix='screenshot-encoder')
+        self.pending=self.executor.submit(function,*args)
+        return self.pending
+
+    def wait(self)->None:
+        '''Block until the last submitted encoding is done, such as before its image is drawn over.'''
+        pending=self.pending
+        if pending is not None:
+            pending.exception()
+
+    def close(self)->None:
+        '''Finish the pending encoding and stop the background thread; a later `submit` starts a new one.'''
+        executor,self.executor=self.executor,None
+        if executor is not None:
+            executor.shutdown(wait=True)
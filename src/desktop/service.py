@@ -1,26 +1,28 @@
-from src.desktop.config import EXCLUDED_APPS, AVOIDED_APPS, BROWSER_NAMES, PROCESS_PER_MONITOR_DPI_AWARE
+from src.desktop.config import EXCLUDED_APPS, AVOIDED_APPS, BROWSER_NAMES, STATE_MAX_AGE, SCREENSHOT_RESAMPLING, FAST_RESAMPLING_SCALE, SCREENSHOT_CACHE, SCREENSHOT_CACHE_REDUCTION
 from src.desktop.views import DesktopState, App, Size, Status
+from src.desktop.encoding import ScreenshotEncoder
+from src.desktop.tiles import FrameDiff
+from src.backend import Backend, Capture, Control, Box, get_backend, get_capture
 from src.tree.service import Tree
+from src.tree.views import TreeState, ElementSelection
+from src.tree.ranking import select_elements
+from src.tree.xpath import XPathNode, Step, get_steps
+from src.tree.spatial import SpatialIndex
 from PIL.Image import Image as PILImage
 from locale import getpreferredencoding
+from concurrent.futures import Future
 from contextlib import contextmanager
-from typing import Optional,Literal
+from typing import Optional,Literal,Callable
 from markdownify import markdownify
 from fuzzywuzzy import process
-from psutil import Process
-from time import sleep
-from io import BytesIO
+from time import sleep, monotonic
 from PIL import Image
-import win32process
 import subprocess
-import win32gui
-import win32con
 import requests
 import logging
-import ctypes
 import base64
+import zlib
 import csv
-import re
 import os
 import io
 
@@ -31,50 +33,137 @@ formatter = logging.Formatter('[%(levelname)s] %(message)s')
 handler.setFormatter(formatter)
 logger.addHandler(handler)
 
-try:  
-    ctypes.windll.shcore.SetProcessDpiAwareness(PROCESS_PER_MONITOR_DPI_AWARE)
-except Exception:  
-    ctypes.windll.user32.SetProcessDPIAware()  
-
-import uiautomation as uia
-import pyautogui as pg
-
-pg.FAILSAFE=False
-pg.PAUSE=1.0
-
 class Desktop:
-    def __init__(self):
+    def __init__(self,backend:Optional[Backend]=None,capture:Optional[Capture]=None):
         self.encoding=getpreferredencoding()
+        self.backend=backend or get_backend()
+        self.capture=capture or get_capture(self.backend)
+        self.screenshot_resampling=SCREENSHOT_RESAMPLING
+        self.encoder=ScreenshotEncoder()
+        self.frame_diff=FrameDiff()
+        self.screenshot_cache=SCREENSHOT_CACHE
+        self.screenshot_cache_reduction=SCREENSHOT_CACHE_REDUCTION
+        # Key (frame, elements and encoding) of the last annotated screenshot sent, with its encoding when it was sent whole
+        self.last_screenshot:Optional[tuple[tuple,Optional[Future]]]=None
         self.tree=Tree(self)
         self.desktop_state=None
+        # When desktop_state was captured, None once an action may have changed the screen
+        self.state_captured_at:Optional[float]=None
+        self.spatial_index:Optional[SpatialIndex]=None
+        # Controls resolved from xpaths with their RuntimeId at resolution, checked again on every hit
+        self.xpath_cache:dict[str,tuple[Control,list[int]]]={}
         
-    def get_state(self,use_vision:bool=False,as_bytes:bool=False)->DesktopState:
+    def get_state(self,use_vision:bool=False,as_bytes:bool=False,on_app:Optional[Callable[[str,TreeState],None]]=None,deadline_ms:Optional[int]=None,visual_diff:bool=False,engine:Optional[str]=None)->DesktopState:
         active_app,apps=self.get_apps()
         logger.debug(f"Active app: {active_app}")
         logger.debug(f"Apps: {apps}")
-        root=uia.GetRootControl()
-        tree_state=self.tree.get_state(root=root)
-        if use_vision:
+        root=self.backend.get_root_control()
+        # The deadline covers the walk only, not the pauses that let the screen settle before it
+        tree_state=self.tree.get_state(root=root,on_app=on_app,deadline_ms=deadline_ms,engine=engine)
+        screenshot,encoding,changed_regions=None,None,None
+        if use_vision and as_bytes:
+            encoding,changed_regions=self.encode_annotated_screenshot(tree_state,visual_diff)
+        elif use_vision:
             screenshot=self.tree.annotated_screenshot(tree_state.interactive_nodes,scale=1.0)
-            if as_bytes:
-                bytes_io=BytesIO()
-                screenshot.save(bytes_io,format='PNG')
-                screenshot=bytes_io.getvalue()
-        else:
-            screenshot=None
-        self.desktop_state=DesktopState(apps= apps,active_app=active_app,screenshot=screenshot,tree_state=tree_state)
+        self.desktop_state=DesktopState(apps= apps,active_app=active_app,screenshot=screenshot,tree_state=tree_state,
+            encoding=encoding,screenshot_format=self.encoder.image_format,changed_regions=changed_regions)
+        self.state_captured_at=monotonic()
+        # Xpaths into the windows that were walked again may now point at other elements
+        walked_windows=tuple(f'{xpath}/' for xpath in self.tree.walked_windows)
+        self.xpath_cache={xpath:entry for xpath,entry in self.xpath_cache.items() if not xpath.startswith(walked_windows)}
         return self.desktop_state
-    
-    def get_window_element_from_element(self,element:uia.Control)->uia.Control|None:
+
+    def encode_annotated_screenshot(self,tree_state:TreeState,visual_diff:bool)->tuple[Optional[Future],Optional[list[Box]]]:
+        '''
+        Start encoding the screenshot annotated with the interactive elements of `tree_state` in the
+        background (only its regions changed since the last one sent with `visual_diff`), see
+        DesktopState.get_screenshot. A screen equal to the last one sent, with the same elements,
+        is neither annotated nor encoded again.
+        '''
+        nodes=tree_state.interactive_nodes
+        # The last encoding may still be reading the annotation buffer drawn into below
+        self.encoder.wait()
+        frame=self.get_screenshot(scale=1.0,reuse=True)
+        key=None
+        if self.screenshot_cache:
+            # The annotation depends on nothing else than the pixels and the elements in label order.
+            # The pixels are compared by a reduced copy of the frame, so changes too faint to shift
+            # the average of a block go unnoticed
+            reduced=frame.reduce(self.screenshot_cache_reduction) if self.screenshot_cache_reduction>1 else frame
+            key=(frame.size,zlib.crc32(reduced.tobytes()),tree_state.fingerprint(),self.encoder.settings)
+            if self.last_screenshot is not None and self.last_screenshot[0]==key:
+                if visual_diff:
+                    return None,[]
+                if self.last_screenshot[1] is not None:
+                    return self.last_screenshot[1],None
+        # Encoded right away, so the annotation can be drawn into the same buffer every time
+        screenshot=self.tree.annotated_screenshot(nodes,scale=1.0,reuse_buffer=True,screenshot=frame)
+        # Every frame sent is kept, so the next one can be diffed against it even after a full frame
+        changed_regions=self.frame_diff.update(screenshot)
+        if not visual_diff:
+            changed_regions=None
+        if changed_regions is None:
+            encoding=self.encoder.submit(screenshot)
+        else:
+            encoding=self.encoder.submit_regions(screenshot,changed_regions)
+        # Only the encoding of a whole frame can be handed out again
+        self.last_screenshot=(key,encoding if changed_regions is None else None) if key is not None else None
+        return encoding,changed_regions
+
+    def close(self)->None:
+        '''Stop the background threads of the tree walks and the screenshot encoding.'''
+        self.tree.close()
+        self.encoder.close()
+
+    def invalidate_state(self):
+        '''Stop answering lookups by position from the last captured state.'''
+        self.state_captured_at=None
+
+    def get_spatial_index(self)->Optional[SpatialIndex]:
+        '''Spatial index over the last captured state, or None when there is none or it is stale.'''
+        if self.desktop_state is None or self.state_captured_at is None or monotonic()-self.state_captured_at>STATE_MAX_AGE:
+            return None
+        if self.spatial_index is None or self.spatial_index.tree_state is not self.desktop_state.tree_state:
+            self.spatial_index=SpatialIndex(self.desktop_state.tree_state)
+        return self.spatial_index
+
+    def select_elements(self,max_elements:Optional[int]=None,max_bytes:Optional[int]=None,format:str='table',measure:Optional[Callable[[ElementSelection],int]]=None)->ElementSelection:
+        '''
+        Elements of the last captured state to list within an output budget, the foreground app and the focused element's surroundings first.
+        `measure` gives the bytes of the output for a selection, by default those of the element lists alone.
+        '''
+        desktop_state=self.desktop_state
+        foreground_app=desktop_state.active_app.name.strip() if desktop_state.active_app is not None else None
+        return select_elements(desktop_state.tree_state,max_elements,max_bytes,format,foreground_app,self.get_focused_xpath(),measure)
+
+    def get_focused_xpath(self)->Optional[str]:
+        try:
+            focused=self.backend.get_focused_control()
+            return self.get_xpath_from_element(focused) if focused is not None else None
+        except Exception:
+            return None
+
+    def get_element_at(self,loc:tuple[int,int])->tuple[str,str]:
+        '''Name and control type of the element at `loc`, from the last captured state while it is fresh, otherwise from the element under the cursor.'''
+        spatial_index=self.get_spatial_index()
+        if spatial_index is not None:
+            element=spatial_index.element_at(*loc)
+            if element is not None:
+                return element.name,element.control_type
+        control=self.get_element_under_cursor()
+        # Described as State-Tool lists elements
+        return control.Name.strip(),(control.LocalizedControlType or control.ControlTypeName).title()
+    
+    def get_window_element_from_element(self,element:Control)->Control|None:
         while element is not None:
-            if uia.IsTopLevelWindow(element.NativeWindowHandle):
+            if self.backend.is_top_level_window(element.NativeWindowHandle):
                 return element
             element = element.GetParentControl()
         return None
     
     def get_active_app(self,apps:list[App])->App|None:
         try:
-            handle=uia.GetForegroundWindow()
+            handle=self.backend.get_foreground_window()
             for app in apps:
                 if app.handle!=handle:
                     continue
@@ -83,22 +172,21 @@ class Desktop:
             print(f"Error: {ex}")
         return None
     
-    def get_app_status(self,control:uia.Control)->Status:
-        if uia.IsIconic(control.NativeWindowHandle):
+    def get_app_status(self,control:Control)->Status:
+        if self.backend.is_iconic(control.NativeWindowHandle):
             return Status.MINIMIZED
-        elif uia.IsZoomed(control.NativeWindowHandle):
+        elif self.backend.is_zoomed(control.NativeWindowHandle):
             return Status.MAXIMIZED
-        elif uia.IsWindowVisible(control.NativeWindowHandle):
+        elif self.backend.is_window_visible(control.NativeWindowHandle):
             return Status.NORMAL
         else:
             return Status.HIDDEN
     
     def get_cursor_location(self)->tuple[int,int]:
-        position=pg.position()
-        return (position.x,position.y)
+        return self.backend.get_cursor_position()
     
-    def get_element_under_cursor(self)->uia.Control:
-        return uia.ControlFromCursor()
+    def get_element_under_cursor(self)->Control:
+        return self.backend.control_from_cursor()
     
     def get_apps_from_start_menu(self)->dict[str,str]:
         command='Get-StartApps | ConvertTo-Csv -NoTypeInformation'
@@ -124,9 +212,8 @@ class Desktop:
         except Exception as e:
             return ('Command execution failed', 1)
         
-    def is_app_browser(self,node:uia.Control):
-        process=Process(node.ProcessId)
-        return process.name() in BROWSER_NAMES
+    def is_app_browser(self,node:Control):
+        return self.backend.get_process_name(node.ProcessId) in BROWSER_NAMES
     
     def get_default_language(self)->str:
         command="Get-Culture | Select-Object Name,DisplayName | ConvertTo-Csv -NoTypeInformation"
@@ -143,7 +230,7 @@ class Desktop:
         elif active_app.status==Status.MAXIMIZED:
             return f"{active_app.name} is maximized",1
         else:
-            app_control=uia.ControlFromHandle(active_app.handle)
+            app_control=self.backend.control_from_handle(active_app.handle)
             if loc is None:
                 x=app_control.BoundingRectangle.left
                 y=app_control.BoundingRectangle.top
@@ -222,8 +309,8 @@ class Desktop:
             app_name=target.name
             target_handle=target.handle
 
-        if uia.IsIconic(target_handle):
-            uia.ShowWindow(target_handle, win32con.SW_RESTORE)
+        if self.backend.is_iconic(target_handle):
+            self.backend.restore_window(target_handle)
             content=f'{app_name.title()} restored from Minimized state.'
         else:
             self.bring_window_to_top(target_handle)
@@ -232,19 +319,12 @@ class Desktop:
         return content,0
     
     def bring_window_to_top(self,target_handle:int):
-        foreground_handle=uia.GetForegroundWindow()
-        foreground_thread,_=win32process.GetWindowThreadProcessId(foreground_handle)
-        target_thread,_=win32process.GetWindowThreadProcessId(target_handle)
-        win32process.AttachThreadInput(foreground_thread,target_thread,True)
-        uia.SetForegroundWindow(target_handle)
-        win32gui.BringWindowToTop(target_handle)
-        win32process.AttachThreadInput(foreground_thread,target_thread,False)
-    
-    def get_element_handle_from_label(self,label:int)->uia.Control:
+        self.backend.bring_window_to_top(target_handle)
+    
+    def get_element_handle_from_label(self,label:int)->Control:
         tree_state=self.desktop_state.tree_state
         element_node=tree_state.interactive_nodes[label]
-        xpath=element_node.xpath
-        element_handle=self.get_element_from_xpath(xpath)
+        element_handle=self.get_element_from_xpath(element_node.xpath_node)
         return element_handle
     
     def get_coordinates_from_label(self,label:int)->tuple[int,int]:
@@ -253,25 +333,23 @@ class Desktop:
         return bounding_rectangle.xcenter(),bounding_rectangle.ycenter()
         
     def click(self,loc:tuple[int,int],button:str='left',clicks:int=2):
-        x,y=loc
-        pg.click(x,y,button=button,clicks=clicks,duration=0.1)
+        self.backend.click(loc,button=button,clicks=clicks,duration=0.1)
 
     def type(self,loc:tuple[int,int],text:str,caret_position:Literal['start','end','none']='none',clear:Literal['true','false']='false',press_enter:Literal['true','false']='false'):
-        x,y=loc
-        pg.leftClick(x,y)
+        self.backend.click(loc)
         if caret_position == 'start':
-            pg.press('home')
+            self.backend.press('home')
         elif caret_position == 'end':
-            pg.press('end')
+            self.backend.press('end')
         else:
             pass
         if clear=='true':
-            pg.sleep(0.5)
-            pg.hotkey('ctrl','a')
-            pg.press('backspace')
-        pg.typewrite(text,interval=0.02)
+            sleep(0.5)
+            self.backend.hotkey('ctrl','a')
+            self.backend.press('backspace')
+        self.backend.type_text(text,interval=0.02)
         if press_enter=='true':
-            pg.press('enter')
+            self.backend.press('enter')
 
     def scroll(self,loc:tuple[int,int]=None,type:Literal['horizontal','vertical']='vertical',direction:Literal['up','down','left','right']='down',wheel_times:int=1)->str|None:
         if loc:
@@ -280,25 +358,25 @@ class Desktop:
             case 'vertical':
                 match direction:
                     case 'up':
-                        uia.WheelUp(wheel_times)
+                        self.backend.wheel_up(wheel_times)
                     case 'down':
-                        uia.WheelDown(wheel_times)
+                        self.backend.wheel_down(wheel_times)
                     case _:
                         return 'Invalid direction. Use "up" or "down".'
             case 'horizontal':
                 match direction:
                     case 'left':
-                        pg.keyDown('Shift')
-                        pg.sleep(0.05)
-                        uia.WheelUp(wheel_times)
-                        pg.sleep(0.05)
-                        pg.keyUp('Shift')
+                        self.backend.key_down('Shift')
+                        sleep(0.05)
+                        self.backend.wheel_up(wheel_times)
+                        sleep(0.05)
+                        self.backend.key_up('Shift')
                     case 'right':
-                        pg.keyDown('Shift')
-                        pg.sleep(0.05)
-                        uia.WheelDown(wheel_times)
-                        pg.sleep(0.05)
-                        pg.keyUp('Shift')
+                        self.backend.key_down('Shift')
+                        sleep(0.05)
+                        self.backend.wheel_down(wheel_times)
+                        sleep(0.05)
+                        self.backend.key_up('Shift')
                     case _:
                         return 'Invalid direction. Use "left" or "right".'
             case _:
@@ -306,33 +384,30 @@ class Desktop:
         return None
     
     def drag(self,loc:tuple[int,int]):
-        x,y=loc
-        pg.sleep(0.5)
-        pg.dragTo(x,y,duration=0.6)
+        sleep(0.5)
+        self.backend.drag_to(loc,duration=0.6)
 
     def move(self,loc:tuple[int,int]):
-        x,y=loc
-        pg.moveTo(x,y,duration=0.1)
+        self.backend.move_cursor(loc,duration=0.1)
 
     def shortcut(self,shortcut:str):
         shortcut=shortcut.split('+')
         if len(shortcut)>1:
-            pg.hotkey(*shortcut)
+            self.backend.hotkey(*shortcut)
         else:
-            pg.press(''.join(shortcut))
+            self.backend.press(''.join(shortcut))
 
     def multi_select(self,elements:list[tuple[int,int]|int]):
-        pg.keyDown('ctrl')
+        self.backend.key_down('ctrl')
         for element in elements:
             if isinstance(element,tuple):
-                x,y=element
-                pg.click(x,y,duration=0.2)
-                pg.sleep(0.5)
+                self.backend.click(element,duration=0.2)
+                sleep(0.5)
             else:
                 x,y=self.get_coordinates_from_label(element)
-                pg.click(x,y,duration=0.2)
-                pg.sleep(0.5)
-        pg.keyUp('ctrl')
+                self.backend.click((x,y),duration=0.2)
+                sleep(0.5)
+        self.backend.key_up('ctrl')
     
     def multi_edit(self,elements:list[tuple[int,int,str]|tuple[int,str]]):
         for element in elements:
@@ -350,7 +425,7 @@ class Desktop:
         content=markdownify(html=html)
         return content
     
-    def get_app_size(self,control:uia.Control):
+    def get_app_size(self,control:Control):
         window=control.BoundingRectangle
         if window.isempty():
             return Size(width=0,height=0)
@@ -363,7 +438,7 @@ class Desktop:
         is_overlay=self.is_overlay_app(app)
         return not is_overlay and is_minimized and area>10
     
-    def is_overlay_app(self,element:uia.Control) -> bool:
+    def is_overlay_app(self,element:Control) -> bool:
         no_children = len(element.GetChildren()) == 0
         is_name = "Overlay" in element.Name.strip()
         return no_children or is_name
@@ -371,13 +446,13 @@ class Desktop:
     def get_apps(self) -> tuple[App|None,list[App]]:
         try:
             sleep(0.5)
-            desktop = uia.GetRootControl()  # Get the desktop control
+            desktop = self.backend.get_root_control()  # Get the desktop control
             elements = desktop.GetChildren()
             apps = []
             for depth, element in enumerate(elements):
                 if (element.ClassName in EXCLUDED_APPS) or (element.ClassName in AVOIDED_APPS) or self.is_overlay_app(element):
                     continue
-                if element.ControlType in [uia.ControlType.WindowControl, uia.ControlType.PaneControl]:
+                if element.ControlTypeName in ['WindowControl', 'PaneControl']:
                     status = self.get_app_status(element)
                     size=self.get_app_size(element)
                     apps.append(App(name=element.Name, depth=depth, status=status,size=size,handle=element.NativeWindowHandle,process_id=element.ProcessId))
@@ -390,48 +465,103 @@ class Desktop:
             apps.remove(active_app)
         return (active_app,apps)
     
-    def get_xpath_from_element(self,element:uia.Control):
-        current=element
-        if current is None:
+    def get_xpath_from_element(self,element:Control):
+        if element is None:
             return ""
-        path_parts=[]
-        while current is not None:
+        tree_state=self.desktop_state.tree_state if self.desktop_state is not None else None
+        # Climb to the nearest element of the last capture (or the root), noting each step's place among its same-type siblings
+        steps=[]
+        current=element
+        while True:
+            runtime_id=tuple(current.GetRuntimeId())
+            xpath=tree_state.get_xpath(runtime_id) if tree_state is not None else None
+            if xpath is not None:
+                break
             parent=current.GetParentControl()
             if parent is None:
                 # we are at the root node
-                path_parts.append(f'{current.ControlTypeName}')
+                xpath=current.ControlTypeName
                 break
-            children=parent.GetChildren()
-            same_type_children=["-".join(map(lambda x:str(x),child.GetRuntimeId())) for child in children if child.ControlType==current.ControlType]
-            index=same_type_children.index("-".join(map(lambda x:str(x),current.GetRuntimeId())))
-            if same_type_children:
-                path_parts.append(f'{current.ControlTypeName}[{index+1}]')
-            else:
-                path_parts.append(f'{current.ControlTypeName}')
+            control_type=current.ControlTypeName
+            same_type_children=[tuple(child.GetRuntimeId()) for child in parent.GetChildren() if child.ControlTypeName==control_type]
+            steps.append((control_type,same_type_children.index(runtime_id),len(same_type_children),current))
             current=parent
-        path_parts.reverse()
-        xpath="/".join(path_parts)
-        return xpath
+        if not steps:
+            return xpath
+        # Number the steps like the traversal: top-level windows and DOM elements left to right, the rest right to left
+        lineage=[]
+        node=current
+        while node is not None:
+            lineage.append(node)
+            node=node.GetParentControl()
+        lineage.reverse()
+        window=lineage[1] if len(lineage)>1 else None
+        is_browser=window is not None and self.is_app_browser(window)
+        is_dom=is_browser and any(node.ClassName=="Chrome_RenderWidgetHostHWND" for node in lineage[1:])
+        path_parts=[xpath]
+        for control_type,index,count,step in reversed(steps):
+            if window is None:
+                window=step
+                is_browser=self.is_app_browser(window)
+                path_parts.append(f'{control_type}[{index+1}]')
+            else:
+                path_parts.append(f'{control_type}[{index+1 if is_dom else count-index}]')
+            if is_browser and not is_dom and step.ClassName=="Chrome_RenderWidgetHostHWND":
+                is_dom=True
+        return "/".join(path_parts)
 
-    def get_element_from_xpath(self,xpath:str)->uia.Control:
-        pattern = re.compile(r'(\w+)(?:\[(\d+)\])?')
-        parts=xpath.split("/")
-        root=uia.GetRootControl()
-        element=root
-        for part in parts[1:]:
-            match=pattern.fullmatch(part)
-            if match is None:
-                continue
-            control_type, index=match.groups()
-            index=int(index) if index else None
+    def get_element_from_xpath(self,xpath:str|XPathNode)->Control:
+        if not xpath:
+            return self.backend.get_root_control()
+        key=str(xpath)
+        entry=self.xpath_cache.get(key)
+        if entry is not None:
+            control,runtime_id=entry
+            try:
+                if control.GetRuntimeId()==runtime_id:
+                    return control
+            except Exception:
+                pass
+            del self.xpath_cache[key]
+        # Steps come straight from the trie for captured elements, strings are parsed once
+        steps=get_steps(xpath,self.tree.xpath_steps)
+        element,start=self.get_xpath_anchor(steps)
+        window,is_dom=element if start==2 else None,False
+        is_browser=window is not None and self.is_app_browser(window)
+        for control_type,index,_ in steps[start:]:
             children=element.GetChildren()
             same_type_children=list(filter(lambda x:x.ControlTypeName==control_type,children))
+            if window is not None and not is_dom:
+                # The traversal numbers siblings right to left outside the DOM (and top-level windows left to right)
+                same_type_children.reverse()
             if index:
                 element=same_type_children[index-1]
             else:
                 element=same_type_children[0]
+            if window is None:
+                window,is_browser=element,self.is_app_browser(element)
+            elif is_browser and not is_dom and element.ClassName=="Chrome_RenderWidgetHostHWND":
+                is_dom=True
+        try:
+            self.xpath_cache[key]=(element,list(element.GetRuntimeId()))
+        except Exception:
+            pass
         return element
-    
+
+    def get_xpath_anchor(self,steps:list[Step])->tuple[Control,int]:
+        '''Control to resolve the xpath `steps` from and the index of the first step left to resolve: the top-level window of the last capture that the xpath runs through, or the root.'''
+        window_handles=self.desktop_state.tree_state.window_handles if self.desktop_state is not None else {}
+        handle=window_handles.get("/".join(text for _,_,text in steps[:2])) if len(steps)>1 else None
+        if handle:
+            try:
+                window=self.backend.control_from_handle(handle) if self.backend.is_top_level_window(handle) else None
+                # The handle may have been reused by another window since the capture
+                if window is not None and window.ControlTypeName==steps[1][0]:
+                    return window,2
+            except Exception:
+                pass
+        return self.backend.get_root_control(),1
+
     def get_windows_version(self)->str:
         response,status=self.execute_command("(Get-CimInstance Win32_OperatingSystem).Caption")
         if status==0:
@@ -443,26 +573,33 @@ class Desktop:
         return "Local Account" if response.strip()=='Local' else "Microsoft Account" if status==0 else "Local Account"
     
     def get_dpi_scaling(self):
-        user32 = ctypes.windll.user32
-        dpi = user32.GetDpiForSystem()
-        return dpi / 96.0
+        return self.backend.get_dpi_scaling()
     
     def get_screen_size(self)->Size:
-        width, height = uia.GetScreenSize()
+        width, height = self.backend.get_screen_size()
         return Size(width=width,height=height)
     
-    def screenshot_in_base64(self,screenshot:PILImage)->bytes:
-        buffer=BytesIO()
-        screenshot.save(buffer,format='PNG')
-        img_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
-        data_uri = f"data:image/png;base64,{img_base64}"
+    def screenshot_in_base64(self,screenshot:PILImage)->str:
+        img_base64 = self.encoder.encode_base64(screenshot)
+        data_uri = f"data:{self.encoder.mime_type};base64,{img_base64}"
         return data_uri
 
-    def get_screenshot(self,scale:float=0.7)->Image.Image:
-        screenshot=pg.screenshot()
-        size=(screenshot.width*scale, screenshot.height*scale)
-        screenshot.thumbnail(size=size, resample=Image.Resampling.LANCZOS)
-        return screenshot
+    def get_resampling(self,scale:float,resampling:Optional[str]=None)->Image.Resampling:
+        resampling=(resampling or self.screenshot_resampling).lower()
+        if resampling=='auto':
+            return Image.Resampling.BOX if scale<=FAST_RESAMPLING_SCALE else Image.Resampling.LANCZOS
+        return Image.Resampling[resampling.upper()]
+
+    def get_screenshot(self,scale:float=0.7,region:Optional[Box]=None,resampling:Optional[str]=None,reuse:bool=False)->Image.Image:
+        '''
+        The screen, or only `region` of it, shrunk by `scale`. With `reuse` an unscaled screenshot
+        may be a view of the capture's buffer, valid until the next screenshot.
+        '''
+        screenshot=self.capture.grab(region,reuse=reuse)
+        if scale>=1.0:
+            return screenshot
+        size=(max(round(screenshot.width*scale),1),max(round(screenshot.height*scale),1))
+        return screenshot.resize(size,resample=self.get_resampling(scale,resampling),reducing_gap=2.0)
     
     def launch_app(self, name: str) -> tuple[str, int]:
         """Launch an application by name using PowerShell Start-Process"""
@@ -491,8 +628,7 @@ class Desktop:
         app_name, _ = matched_app
         app = apps.get(app_name)
         try:
-            # Use win32gui to bring window to foreground
-            win32gui.SetForegroundWindow(app.handle)
+            self.backend.set_foreground_window(app.handle)
             return (f'{app_name.title()} switched to foreground.', 0)
         except Exception:
             return (f'Failed to switch to {app_name.title()}.', 1)
@@ -504,25 +640,22 @@ class Desktop:
         reader = csv.DictReader(io.StringIO(apps_info))
         return {row.get('Name').lower(): row.get('AppID') for row in reader}
     
-    def is_app_browser(self, node: uia.Control) -> bool:
+    def is_app_browser(self, node: Control) -> bool:
         """Check if an application is a browser based on process name"""
         try:
-            process = Process(node.ProcessId)
-            return process.name() in BROWSER_NAMES
+            return self.backend.get_process_name(node.ProcessId) in BROWSER_NAMES
         except Exception:
             return False
     
     def screenshot_in_bytes(self, screenshot: Image.Image) -> bytes:
-        """Convert PIL Image to bytes"""
-        io_buffer = BytesIO()
-        screenshot.save(io_buffer, format='PNG')
-        return io_buffer.getvalue()
+        """Convert PIL Image to bytes in the encoder's format"""
+        return self.encoder.encode(screenshot)
     
     @contextmanager
     def auto_minimize(self):
         try:
-            handle = uia.GetForegroundWindow()
-            uia.ShowWindow(handle, win32con.SW_MINIMIZE)
+            handle = self.backend.get_foreground_window()
+            self.backend.minimize_window(handle)
             yield
         finally:
-            uia.ShowWindow(handle, win32con.SW_RESTORE)
\ No newline at end of file
+            self.backend.restore_window(handle)
\ No newline at end of file
@@ -0,0 +1,85 @@
+from src.desktop.config import SCREENSHOT_TILE_SIZE, MAX_CHANGED_RATIO, MAX_CHANGED_REGIONS
+from src.backend.views import Box
+from PIL import Image, ImageChops
+from threading import Lock
+from typing import Optional
+
+class FrameDiff:
+    '''
+    The last frame sent and the tiles of the next frame that differ from it.
+
+    Frames are split into square tiles of `tile_size` pixels. Changed tiles are merged into
+    rectangles: runs of adjacent tiles along a row, then runs spanning the same columns on
+    consecutive rows. More than `max_regions` rectangles are replaced by their bounding rectangle.
+    When the changes cover more than `max_changed_ratio` of the frame the whole frame is due.
+    '''
+    def __init__(self,tile_size:int=SCREENSHOT_TILE_SIZE,max_changed_ratio:float=MAX_CHANGED_RATIO,max_regions:int=MAX_CHANGED_REGIONS):
+        self.tile_size=tile_size
+        self.max_changed_ratio=max_changed_ratio
+        self.max_regions=max_regions
+        self.previous:Optional[Image.Image]=None
+        self.lock=Lock()
+
+    def update(self,frame:Image.Image)->Optional[list[Box]]:
+        '''
+        Keep `frame` as the last frame sent and return its regions that changed since the one before:
+        an empty list for no visual change, None when the whole frame has to be sent.
+        '''
+        with self.lock:
+            previous,self.previous=self.previous,frame.copy()
+        if previous is None or previous.size!=frame.size or previous.mode!=frame.mode:
+            return None
+        return self.changed_regions(previous,frame)
+
+    def reset(self)->None:
+        '''Forget the last frame, so the next one is sent whole.'''
+        with self.lock:
+            self.previous=None
+
+    def changed_regions(self,previous:Image.Image,frame:Image.Image)->Optional[list[Box]]:
+        difference=ImageChops.difference(previous,frame)
+        bounds=difference.getbbox()
+        if bounds is None:
+            return []
+        size,(width,height)=self.tile_size,frame.size
+        # Only the tiles under the bounding box of the changes can have changed
+        rows=range(bounds[1]//size,(bounds[3]-1)//size+1)
+        columns=range(bounds[0]//size,(bounds[2]-1)//size+1)
+        # (first column, last column) -> [first row, last row] of the rectangle still growing downwards
+        open_regions:dict[tuple[int,int],list[int]]={}
+        regions:list[tuple[int,int,int,int]]=[]
+        changed_tiles=0
+        for row in rows:
+            top=row*size
+            runs=[]
+            start=None
+            for column in columns:
+                left=column*size
+                changed=difference.crop((left,top,min(left+size,width),min(top+size,height))).getbbox() is not None
+                if changed:
+                    changed_tiles+=1
+                    if start is None:
+                        start=column
+                elif start is not None:
+                    runs.append((start,column-1))
+                    start=None
+            if start is not None:
+                runs.append((start,columns[-1]))
+            for key in list(open_regions):
+                if key not in runs:
+                    first,last=open_regions.pop(key)
+                    regions.append((key[0],first,key[1],last))
+            for run in runs:
+                open_regions.setdefault(run,[row,row])[1]=row
+        regions.extend((key[0],first,key[1],last) for key,(first,last) in open_regions.items())
+        if changed_tiles*size*size>self.max_changed_ratio*width*height:
+            return None
+        if len(regions)>self.max_regions:
+            # One rectangle around all the changes instead
+            regions=[(min(region[0] for region in regions),min(region[1] for region in regions),
+                      max(region[2] for region in regions),max(region[3] for region in regions))]
+            first_column,first_row,last_column,last_row=regions[0]
+            if (last_column-first_column+1)*(last_row-first_row+1)*size*size>self.max_changed_ratio*width*height:
+                return None
+        return [(first_column*size,first_row*size,min((last_column+1)*size,width),min((last_row+1)*size,height))
+                for first_column,first_row,last_column,last_row in sorted(regions,key=lambda region:(region[1],region[0]))]
@@ -1,10 +1,15 @@
 from src.tree.views import TreeState
 from dataclasses import dataclass
+from src.tree.formats import cell
+from json.encoder import encode_basestring as json_string
 from tabulate import tabulate
+from concurrent.futures import Future
 from typing import Optional
 from PIL.Image import Image
 from enum import Enum
 
+APP_HEADERS=("Name", "Depth", "Status", "Width", "Height", "Handle")
+
 class Browser(Enum):
     CHROME='Chrome'
     EDGE='Edge'
@@ -29,6 +34,17 @@ class App:
     def to_row(self):
         return [self.name, self.depth, self.status.value, self.size.width, self.size.height, self.handle]
 
+    def to_json(self):
+        return (f'{{"name":{json_string(self.name)},"depth":{self.depth},"status":{json_string(self.status.value)},'
+            f'"width":{self.size.width},"height":{self.size.height},"handle":{self.handle}}}')
+
+    def to_string(self, format: str):
+        if format == 'json':
+            return self.to_json()
+        if format == 'outline':
+            return f'{cell(self.name)} ({self.status.value}, {self.size.width}x{self.size.height}, depth {self.depth}, handle {self.handle})'
+        return '\t'.join(cell(value) for value in self.to_row())
+
 @dataclass
 class Size:
     width:int
@@ -41,18 +57,48 @@ class Size:
 class DesktopState:
     apps:list[App]
     active_app:Optional[App]
-    screenshot:Image|bytes|None
+    screenshot:Image|bytes|list[bytes]|None
     tree_state:TreeState
+    # Encoding of the screenshot still running in the background, see `get_screenshot`
+    encoding:Optional[Future]=None
+    screenshot_format:str='png'
+    # Regions of the screenshot that changed since the previous one sent, when only those are sent:
+    # the screenshot is then one image per region, and no region means no visual change
+    changed_regions:Optional[list[tuple[int,int,int,int]]]=None
 
-    def active_app_to_string(self):
+    def get_screenshot(self):
+        '''The screenshot (or the images of the changed regions), once its background encoding is done.'''
+        if self.encoding is not None:
+            self.screenshot=self.encoding.result()
+            self.encoding=None
+        return self.screenshot
+
+    def active_app_to_string(self, format: str = 'table'):
         if self.active_app is None:
-            return 'No active app found'
+            return 'null' if format == 'json' else 'No active app found'
+        if format != 'table':
+            return self.active_app.to_string(format) if format != 'compact' else apps_to_string([self.active_app], format)
         headers = ["Name", "Depth", "Status", "Width", "Height", "Handle"]
         return tabulate([self.active_app.to_row()], headers=headers, tablefmt="github")
 
-    def apps_to_string(self):
-        if not self.apps:
+    def apps_to_string(self, format: str = 'table'):
+        if not self.apps and format != 'json':
             return 'No apps running in background'
+        if format != 'table':
+            return apps_to_string(self.apps, format)
         headers = ["Name", "Depth", "Status", "Width", "Height", "Handle"]
         rows = [app.to_row() for app in self.apps]
-        return tabulate(rows, headers=headers, tablefmt="github")
\ No newline at end of file
+        return tabulate(rows, headers=headers, tablefmt="github")
+
+    def to_json(self, tree_state: Optional[str] = None):
+        '''The apps and elements as one JSON object; `tree_state` replaces the elements (such as a delta's JSON).'''
+        tree_state = tree_state if tree_state is not None else self.tree_state.to_json()
+        return f'{{"active_app":{self.active_app_to_string("json")},"apps":{self.apps_to_string("json")},"elements":{tree_state}}}'
+
+def apps_to_string(apps: list[App], format: str) -> str:
+    strings = [app.to_string(format) for app in apps]
+    if format == 'json':
+        return f'[{",".join(strings)}]'
+    if format == 'outline':
+        return '\n'.join(strings)
+    return '\n'.join(['\t'.join(APP_HEADERS), *strings])
\ No newline at end of file
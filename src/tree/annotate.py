@@ -0,0 +1,125 @@
+from src.tree.config import ANNOTATION_FONT_SIZE, ANNOTATION_PADDING, ANNOTATION_PALETTE_SIZE
+from PIL import Image, ImageFont, ImageDraw
+from colorsys import hsv_to_rgb
+from threading import Lock
+from math import ceil
+
+WHITE=(255,255,255)
+# Rendered label tiles kept per annotator, dropped all at once past this count
+MAX_LABEL_TILES=16384
+
+_fonts:dict[int,ImageFont.ImageFont]={}
+_fonts_lock=Lock()
+
+def get_font(size:int)->ImageFont.ImageFont:
+    '''The label font, loaded once per size.'''
+    with _fonts_lock:
+        font=_fonts.get(size)
+        if font is None:
+            try:
+                font=ImageFont.truetype('arial.ttf',size)
+            except IOError:
+                font=ImageFont.load_default()
+            _fonts[size]=font
+        return font
+
+def make_palette(size:int)->list[tuple[int,int,int]]:
+    '''Saturated colors spread around the hue circle by the golden ratio, so neighbouring labels differ.'''
+    palette=[]
+    for index in range(size):
+        hue=(index*0.618033988749895)%1.0
+        value=0.85 if index%2 else 0.65
+        red,green,blue=hsv_to_rgb(hue,0.9,value)
+        palette.append((int(red*255),int(green*255),int(blue*255)))
+    return palette
+
+class Annotator:
+    '''
+    Draws the labelled boxes of the interactive elements on a screenshot.
+
+    The font, the palette (a label's color is `palette[label % size]`), the digit glyphs and the
+    label tiles (the colored background with the white number, assembled from the glyphs once per
+    label) are kept between calls, so annotating is one pass of rectangle outlines and tile
+    pastes. With `reuse` the padded image is drawn into the same buffer every call, for callers
+    that encode it right away.
+    '''
+    def __init__(self,font_size:int=ANNOTATION_FONT_SIZE,padding:int=ANNOTATION_PADDING,palette_size:int=ANNOTATION_PALETTE_SIZE):
+        self.font_size=font_size
+        self.padding=padding
+        self.font=get_font(font_size)
+        self.palette=make_palette(palette_size)
+        self.tiles:dict[int,Image.Image]={}
+        # Digit -> (advance, glyph mask)
+        self.glyphs:dict[str,tuple[float,Image.Image]]={}
+        for digit in '0123456789':
+            advance=self.font.getlength(digit)
+            mask=Image.new('L',(ceil(advance)+2,font_size+3),0)
+            ImageDraw.Draw(mask).text((0,0),digit,fill=255,font=self.font)
+            self.glyphs[digit]=(advance,mask)
+        self.buffer:Image.Image|None=None
+        self.lock=Lock()
+
+    def get_tile(self,label:int)->Image.Image:
+        tile=self.tiles.get(label)
+        if tile is None:
+            if len(self.tiles)>=MAX_LABEL_TILES:
+                self.tiles.clear()
+            glyphs=[self.glyphs[digit] for digit in str(label)]
+            width=ceil(sum(advance for advance,_ in glyphs))
+            # Label background as tall as the font plus 4 pixels, with the text 2 pixels in
+            tile=Image.new('RGB',(width+4,self.font_size+5),self.palette[label%len(self.palette)])
+            x=2.0
+            for advance,mask in glyphs:
+                tile.paste(WHITE,(int(x),2),mask)
+                x+=advance
+            self.tiles[label]=tile
+        return tile
+
+    def get_canvas(self,width:int,height:int,reuse:bool)->Image.Image:
+        if not reuse:
+            return Image.new('RGB',(width,height),WHITE)
+        if self.buffer is None or self.buffer.size!=(width,height):
+            self.buffer=Image.new('RGB',(width,height),WHITE)
+        else:
+            # Labels near the edges of the last frame may have been drawn over the padding
+            padding=self.padding
+            for strip in ((0,0,width,padding),(0,height-padding,width,height),(0,0,padding,height),(width-padding,0,width,height)):
+                self.buffer.paste(WHITE,strip)
+        return self.buffer
+
+    def annotate(self,screenshot:Image.Image,boxes,scale:float=1.0,reuse:bool=False,origin:tuple[int,int]=(0,0))->Image.Image:
+        '''
+        Padded copy of the screenshot with each box outlined and labelled by its position in `boxes`.
+
+        `boxes` is an iterable of (left, top, right, bottom) in screen coordinates, which `origin`
+        (the top left corner of the screenshot on the screen) and `scale` map onto the screenshot.
+        '''
+        padding=self.padding
+        x,y=origin
+        width,height=screenshot.width+2*padding,screenshot.height+2*padding
+        with self.lock:
+            canvas=self.get_canvas(width,height,reuse)
+            canvas.paste(screenshot,(padding,padding))
+            draw=ImageDraw.Draw(canvas)
+            rectangle,paste,get_tile,palette=draw.rectangle,canvas.paste,self.get_tile,self.palette
+            colors=len(palette)
+            label_offset=self.font_size+4
+            for label,(left,top,right,bottom) in enumerate(boxes):
+                left,top=int((left-x)*scale)+padding,int((top-y)*scale)+padding
+                right,bottom=int((right-x)*scale)+padding,int((bottom-y)*scale)+padding
+                rectangle((left,top,right,bottom),outline=palette[label%colors],width=2)
+                tile=get_tile(label)
+                # Label above the top right corner of the box
+                paste(tile,(right-tile.width+4,top-label_offset))
+            return canvas
+
+def get_boxes(nodes)->zip|list:
+    '''(left, top, right, bottom) of every node, read straight from the columns of an `InteractiveTable`.'''
+    data=getattr(nodes,'data',None)
+    if data is not None:
+        return zip(data['left'],data['top'],data['right'],data['bottom'])
+    boxes=[]
+    for node in nodes:
+        box=node.bounding_box
+        boxes.append((box.left,box.top,box.right,box.bottom))
+    return boxes
@@ -0,0 +1,89 @@
+from src.tree.columns import ElementTable
+from array import array
+import logging
+
+try:
+    import numpy as np
+except ImportError:
+    np=None
+
+logger=logging.getLogger(__name__)
+
+BOX_COLUMNS=('left','top','right','bottom')
+
+# Whether the element-by-element fallback has been reported, it is logged once per process
+fallback_logged=False
+
+class BoxBatch:
+    '''
+    Element rectangles collected during a walk, each with the rectangle it is clipped to.
+
+    `apply` clips them against their window and the screen and computes their centers in one
+    pass, with NumPy when it is installed (the `numpy` extra) and element by element otherwise.
+    '''
+    __slots__=('element','clip')
+
+    def __init__(self):
+        self.element=tuple(array('i') for _ in BOX_COLUMNS)
+        self.clip=tuple(array('i') for _ in BOX_COLUMNS)
+
+    def add(self,element_box,clip_box)->None:
+        for column,name in zip(self.element,BOX_COLUMNS):
+            column.append(getattr(element_box,name))
+        for column,name in zip(self.clip,BOX_COLUMNS):
+            column.append(getattr(clip_box,name))
+
+    def pop(self)->None:
+        for column in self.element+self.clip:
+            del column[-1]
+
+    def clear(self)->None:
+        for column in self.element+self.clip:
+            del column[:]
+
+    def __len__(self)->int:
+        return len(self.element[0])
+
+    def clip_boxes(self,screen_box,vectorized:bool=True)->tuple[array,...]:
+        '''Clipped (left, top, right, bottom) and center (x, y) columns, as `Tree.iou_bounding_box` and `BoundingBox.get_center` compute them.'''
+        global fallback_logged
+        if vectorized:
+            if np is not None:
+                return self.clip_boxes_numpy(screen_box)
+            if not fallback_logged:
+                fallback_logged=True
+                logger.info('NumPy is not installed, element boxes are clipped one at a time')
+        columns=tuple(array('i') for _ in range(6))
+        screen_left,screen_top,screen_right,screen_bottom=screen_box.left,screen_box.top,screen_box.right,screen_box.bottom
+        for element_left,element_top,element_right,element_bottom,clip_left,clip_top,clip_right,clip_bottom in zip(*self.element,*self.clip):
+            left=max(screen_left,clip_left,element_left)
+            top=max(screen_top,clip_top,element_top)
+            right=min(screen_right,clip_right,element_right)
+            bottom=min(screen_bottom,clip_bottom,element_bottom)
+            if not (right>left and bottom>top):
+                left=top=right=bottom=0
+            for column,value in zip(columns,(left,top,right,bottom,left+(right-left)//2,top+(bottom-top)//2)):
+                column.append(value)
+        return columns
+
+    def clip_boxes_numpy(self,screen_box)->tuple[array,...]:
+        # Views over the arrays' buffers, stacked into one copy per batch
+        element=np.stack([np.frombuffer(column,dtype=np.intc) for column in self.element])
+        clip=np.stack([np.frombuffer(column,dtype=np.intc) for column in self.clip])
+        screen=np.array([screen_box.left,screen_box.top,screen_box.right,screen_box.bottom],dtype=np.intc)[:,None]
+        low=np.maximum(np.maximum(element[:2],clip[:2]),screen[:2])
+        high=np.minimum(np.minimum(element[2:],clip[2:]),screen[2:])
+        visible=(high>low).all(axis=0)
+        low*=visible
+        high*=visible
+        center=low+(high-low)//2
+        return tuple(array('i',row.astype(np.intc).tobytes()) for row in (*low,*high,*center))
+
+    def apply(self,table:ElementTable,screen_box,vectorized:bool=True)->None:
+        '''Write the clipped boxes and centers into the last `len(self)` rows of `table`.'''
+        if not len(self):
+            return
+        start=len(table)-len(self)
+        table.discard_strings(start)
+        for name,column in zip((*BOX_COLUMNS,'x','y'),self.clip_boxes(screen_box,vectorized)):
+            table.data[name][start:]=column
@@ -0,0 +1,160 @@
+from src.tree.views import CacheStats
+from src.backend.views import Control
+from typing import Optional, Iterator
+
+def cached_property(name:str)->property:
+    '''Property that reads `name` from the wrapped control once and serves it from a slot afterwards.'''
+    slot=f'_{name}'
+    def getter(self:'CachedControl'):
+        try:
+            value=getattr(self,slot)
+        except AttributeError:
+            value=getattr(self.control,name)
+            setattr(self,slot,value)
+            self.stats.fetches+=1
+            return value
+        self.stats.hits+=1
+        return value
+    return property(getter)
+
+class CachedPattern:
+    '''Pattern wrapper that reads each pattern property at most once.'''
+    __slots__=('pattern','stats','values')
+
+    def __init__(self,pattern,stats:CacheStats):
+        self.pattern=pattern
+        self.stats=stats
+        self.values={}
+
+    def __getattr__(self,name:str):
+        if name in CachedPattern.__slots__:
+            raise AttributeError(name)
+        values=self.values
+        if name in values:
+            self.stats.hits+=1
+            return values[name]
+        value=getattr(self.pattern,name)
+        values[name]=value
+        self.stats.fetches+=1
+        return value
+
+class CachedControl:
+    '''
+    Per-node view of a control used during a single traversal.
+
+    Each property, pattern and navigation result is fetched from the backend at most once
+    (every fetch is a cross-process call with UI Automation) and shared by all of the
+    traversal predicates and node constructors.
+    '''
+    __slots__=(
+        'control','stats','_children','_first_child','_legacy_pattern','_scroll_pattern','_runtime_id',
+        '_Name','_ControlTypeName','_LocalizedControlType','_ClassName','_AcceleratorKey',
+        '_BoundingRectangle','_IsOffscreen','_IsEnabled','_IsControlElement','_IsKeyboardFocusable',
+        '_HasKeyboardFocus','_NativeWindowHandle','_ProcessId'
+    )
+
+    Name=cached_property('Name')
+    ControlTypeName=cached_property('ControlTypeName')
+    LocalizedControlType=cached_property('LocalizedControlType')
+    ClassName=cached_property('ClassName')
+    AcceleratorKey=cached_property('AcceleratorKey')
+    BoundingRectangle=cached_property('BoundingRectangle')
+    IsOffscreen=cached_property('IsOffscreen')
+    IsEnabled=cached_property('IsEnabled')
+    IsControlElement=cached_property('IsControlElement')
+    IsKeyboardFocusable=cached_property('IsKeyboardFocusable')
+    HasKeyboardFocus=cached_property('HasKeyboardFocus')
+    NativeWindowHandle=cached_property('NativeWindowHandle')
+    ProcessId=cached_property('ProcessId')
+
+    def __init__(self,control:Control,stats:CacheStats):
+        self.control=control
+        self.stats=stats
+        self._children:Optional[list[CachedControl]]=None
+        self._first_child:Optional[CachedControl]=None
+        self._legacy_pattern=None
+        self._scroll_pattern=None
+        self._runtime_id:Optional[tuple[int,...]]=None
+        stats.nodes+=1
+
+    def GetChildren(self)->list['CachedControl']:
+        if self._children is None:
+            self.stats.fetches+=1
+            children=[CachedControl(child,self.stats) for child in self.control.GetChildren()]
+            # Keep the wrapper handed out by GetFirstChildControl so its cached reads are reused
+            if children and self._first_child is not None:
+                children[0]=self._first_child
+                self.stats.nodes-=1
+            self._children=children
+        else:
+            self.stats.hits+=1
+        return self._children
+
+    def GetFirstChildControl(self)->Optional['CachedControl']:
+        if self._children is not None:
+            self.stats.hits+=1
+            return self._children[0] if self._children else None
+        if self._first_child is None:
+            self.stats.fetches+=1
+            first_child=self.control.GetFirstChildControl()
+            if first_child is None:
+                self._children=[]
+                return None
+            self._first_child=CachedControl(first_child,self.stats)
+        else:
+            self.stats.hits+=1
+        return self._first_child
+
+    def iter_children(self,reverse:bool=False)->Iterator['CachedControl']:
+        '''
+        Children one at a time, last to first when `reverse` is set.
+
+        Siblings are navigated only as far as the caller iterates, so a walk that stops early
+        does not fetch the rest. A complete iteration is kept as the cached child list.
+        '''
+        if self._children is not None:
+            self.stats.hits+=1
+            yield from (reversed(self._children) if reverse else self._children)
+            return None
+        children=[]
+        if reverse:
+            self.stats.fetches+=1
+            last_child=self.control.GetLastChildControl()
+            child=CachedControl(last_child,self.stats) if last_child is not None else None
+        else:
+            child=self.GetFirstChildControl()
+        while child is not None:
+            children.append(child)
+            yield child
+            self.stats.fetches+=1
+            sibling=child.control.GetPreviousSiblingControl() if reverse else child.control.GetNextSiblingControl()
+            child=CachedControl(sibling,self.stats) if sibling is not None else None
+        if self._children is None:
+            if reverse:
+                children.reverse()
+            self._children=children
+
+    def GetRuntimeId(self)->list[int]:
+        if self._runtime_id is None:
+            self.stats.fetches+=1
+            self._runtime_id=tuple(self.control.GetRuntimeId())
+        else:
+            self.stats.hits+=1
+        return list(self._runtime_id)
+
+    def GetLegacyIAccessiblePattern(self)->CachedPattern:
+        if self._legacy_pattern is None:
+            self.stats.fetches+=1
+            self._legacy_pattern=CachedPattern(self.control.GetLegacyIAccessiblePattern(),self.stats)
+        else:
+            self.stats.hits+=1
+        return self._legacy_pattern
+
+    def GetScrollPattern(self)->Optional[CachedPattern]:
+        if self._scroll_pattern is None:
+            self.stats.fetches+=1
+            pattern=self.control.GetScrollPattern()
+            self._scroll_pattern=CachedPattern(pattern,self.stats) if pattern is not None else False
+        else:
+            self.stats.hits+=1
+        return self._scroll_pattern or None
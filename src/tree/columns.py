@@ -0,0 +1,265 @@
+from src.tree.views import TreeElementNode, TextElementNode, ScrollElementNode, BoundingBox, Center
+from src.tree.xpath import XPathNode
+from abc import ABC, abstractmethod
+from array import array
+from typing import Callable, Iterator
+
+class InternedColumn:
+    '''String column for values with few distinct strings (app names, control types), each stored once and referenced by index.'''
+    __slots__=('indices','strings','lookup')
+
+    def __init__(self):
+        self.indices=array('I')
+        self.strings:list[str]=[]
+        self.lookup:dict[str,int]={}
+
+    def intern(self,value:str)->int:
+        index=self.lookup.get(value)
+        if index is None:
+            index=self.lookup[value]=len(self.strings)
+            self.strings.append(value)
+        return index
+
+    def append(self,value:str)->None:
+        index=self.lookup.get(value)
+        self.indices.append(self.intern(value) if index is None else index)
+
+    def extend(self,other:'InternedColumn')->None:
+        strings=other.strings
+        self.indices.extend(self.intern(strings[index]) for index in other.indices)
+
+    def __getitem__(self,index:int)->str:
+        return self.strings[self.indices[index]]
+
+    def __delitem__(self,index)->None:
+        del self.indices[index]
+
+class ElementTable(ABC):
+    '''
+    Columnar store of element rows.
+
+    Coordinates live in typed arrays, app names and control types in interned columns and the
+    other values in plain lists. Indexing and iteration hand out light row views with the same
+    attributes and `to_row`/`key` methods as the node dataclasses, so a table stands in for a
+    list of nodes without allocating one object per element.
+
+    Rows rendered by the State-Tool serializers are kept as strings, so a row is formatted once
+    for the life of the table and the tables built from it with `extend` (such as a reused window).
+    '''
+    # Column name -> array typecode, 'list' for a list or 'intern' for an interned string column
+    columns:dict[str,str]={}
+    row_type:type=None
+    node_type:type=None
+    __slots__=('data','size','appends','strings')
+
+    def __init__(self,nodes=()):
+        self.size=0
+        self.data={}
+        # Rendering -> strings of the first rows, see `render`
+        self.strings:dict[str,list[str]]={}
+        for name,kind in self.columns.items():
+            if kind=='list':
+                self.data[name]=[]
+            elif kind=='intern':
+                self.data[name]=InternedColumn()
+            else:
+                self.data[name]=array(kind)
+        self.appends=tuple(column.append for column in self.data.values())
+        for node in nodes:
+            self.append(node)
+
+    def add(self,*values)->None:
+        '''Append a row given as one value per column, in column order.'''
+        for append,value in zip(self.appends,values):
+            append(value)
+        self.size+=1
+
+    def append(self,node)->None:
+        self.add(*self.node_values(node))
+
+    @abstractmethod
+    def node_values(self,node)->tuple:
+        '''The values of a node dataclass, one per column in column order.'''
+
+    def extend(self,other)->None:
+        if type(other) is type(self):
+            for column,values in zip(self.data.values(),other.data.values()):
+                column.extend(values)
+            for name,strings in other.strings.items():
+                cache=self.strings.setdefault(name,[])
+                # Only a cache of every row so far can take the other table's strings after it
+                if len(cache)==self.size:
+                    cache.extend(strings)
+            self.size+=other.size
+        else:
+            for node in other:
+                self.append(node)
+
+    def pop(self):
+        if not self.size:
+            raise IndexError('pop from empty table')
+        node=self[-1].to_node()
+        for column in self.data.values():
+            del column[-1]
+        self.size-=1
+        self.discard_strings(self.size)
+        return node
+
+    def clear(self)->None:
+        for column in self.data.values():
+            del column[:]
+        self.size=0
+        self.strings.clear()
+
+    def render(self,name:str,function:Callable[['ElementRow'],str])->list[str]:
+        '''`function` of every row, computed only for the rows not rendered under `name` before.'''
+        cache=self.strings.setdefault(name,[])
+        if len(cache)<self.size:
+            row_type=self.row_type
+            cache.extend(function(row_type(self,index)) for index in range(len(cache),self.size))
+        return cache
+
+    def discard_strings(self,start:int)->None:
+        '''Forget the rendered strings of the rows from `start` on, after they were changed.'''
+        for cache in self.strings.values():
+            del cache[start:]
+
+    def to_nodes(self)->list:
+        return [row.to_node() for row in self]
+
+    def __len__(self)->int:
+        return self.size
+
+    def __getitem__(self,index:int):
+        if index<0:
+            index+=self.size
+        if not 0<=index<self.size:
+            raise IndexError('table index out of range')
+        return self.row_type(self,index)
+
+    def __iter__(self)->Iterator:
+        row_type=self.row_type
+        for index in range(self.size):
+            yield row_type(self,index)
+
+    def __eq__(self,other)->bool:
+        if isinstance(other,(ElementTable,list)):
+            return len(self)==len(other) and all(row==node for row,node in zip(self,other))
+        return NotImplemented
+
+    def __repr__(self)->str:
+        return f'{type(self).__name__}({self.size} rows)'
+
+class ElementRow:
+    '''View of one row of an `ElementTable`.'''
+    __slots__=('table','index')
+
+    def __init__(self,table:ElementTable,index:int):
+        self.table=table
+        self.index=index
+
+    def __getattr__(self,name:str):
+        if name in ElementRow.__slots__:
+            raise AttributeError(name)
+        try:
+            return self.table.data[name][self.index]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def to_node(self):
+        return self.table.node_type(**{name:getattr(self,name) for name in self.table.node_type.__dataclass_fields__})
+
+    def __eq__(self,other)->bool:
+        if isinstance(other,ElementRow):
+            other=other.to_node()
+        return self.to_node()==other
+
+    def __repr__(self)->str:
+        return repr(self.to_node())
+
+class BoxRow(ElementRow):
+    __slots__=()
+
+    @property
+    def xpath(self)->str:
+        # Stored as a node of the walk's xpath trie, the string is built when asked for
+        return str(self.table.data['xpath'][self.index])
+
+    @property
+    def xpath_node(self)->XPathNode|str:
+        return self.table.data['xpath'][self.index]
+
+    @property
+    def bounding_box(self)->BoundingBox:
+        data,index=self.table.data,self.index
+        left,top,right,bottom=data['left'][index],data['top'][index],data['right'][index],data['bottom'][index]
+        return BoundingBox(left=left,top=top,right=right,bottom=bottom,width=right-left,height=bottom-top)
+
+    @property
+    def center(self)->Center:
+        data,index=self.table.data,self.index
+        return Center(x=data['x'][index],y=data['y'][index])
+
+class InteractiveRow(BoxRow):
+    __slots__=()
+    to_row=TreeElementNode.to_row
+    key=TreeElementNode.key
+
+class TextRow(ElementRow):
+    __slots__=()
+    to_row=TextElementNode.to_row
+    key=TextElementNode.key
+
+class ScrollRow(BoxRow):
+    __slots__=()
+    to_row=ScrollElementNode.to_row
+    key=ScrollElementNode.key
+
+class InteractiveTable(ElementTable):
+    columns={
+        'name':'list','control_type':'intern','value':'list','shortcut':'intern',
+        'left':'i','top':'i','right':'i','bottom':'i','x':'i','y':'i','xpath':'list','app_name':'intern',
+        'runtime_id':'list'
+    }
+    row_type=InteractiveRow
+    node_type=TreeElementNode
+    __slots__=()
+
+    def node_values(self,node:TreeElementNode)->tuple:
+        box,center=node.bounding_box,node.center
+        return (
+            node.name,node.control_type,node.value,node.shortcut,
+            box.left,box.top,box.left+box.width,box.top+box.height,center.x,center.y,node.xpath,node.app_name,
+            getattr(node,'runtime_id',None)
+        )
+
+class TextTable(ElementTable):
+    columns={'name':'list','app_name':'intern'}
+    row_type=TextRow
+    node_type=TextElementNode
+    __slots__=()
+
+    def node_values(self,node:TextElementNode)->tuple:
+        return (node.name,node.app_name)
+
+class ScrollTable(ElementTable):
+    columns={
+        'name':'list','control_type':'intern','xpath':'list','app_name':'intern',
+        'left':'i','top':'i','right':'i','bottom':'i','x':'i','y':'i',
+        'horizontal_scrollable':'list','horizontal_scroll_percent':'d',
+        'vertical_scrollable':'list','vertical_scroll_percent':'d','is_focused':'list',
+        'runtime_id':'list'
+    }
+    row_type=ScrollRow
+    node_type=ScrollElementNode
+    __slots__=()
+
+    def node_values(self,node:ScrollElementNode)->tuple:
+        box,center=node.bounding_box,node.center
+        return (
+            node.name,node.control_type,node.xpath,node.app_name,
+            box.left,box.top,box.left+box.width,box.top+box.height,center.x,center.y,
+            node.horizontal_scrollable,node.horizontal_scroll_percent,
+            node.vertical_scrollable,node.vertical_scroll_percent,node.is_focused,
+            getattr(node,'runtime_id',None)
+        )
@@ -14,4 +14,75 @@ INFORMATIVE_CONTROL_TYPE_NAMES=set([
     'TextControl','ImageControl'
 ])
 
-THREAD_MAX_RETRIES = 3
\ No newline at end of file
+THREAD_MAX_RETRIES = 3
+
+# Seconds to wait for the UI to settle before reading the tree or grabbing the screen
+SETTLE_DELAY = 0.1
+
+# How get_nodes reads an app's subtree: 'walker' fetches each property on first use,
+# 'prefetch' fetches every property the traversal reads for the whole subtree in one bulk request
+TRAVERSAL_ENGINE = 'walker'
+TRAVERSAL_ENGINES = ('walker','prefetch')
+
+PREFETCH_PROPERTIES = [
+    'Name','ControlTypeName','LocalizedControlType','ClassName','AcceleratorKey',
+    'BoundingRectangle','IsOffscreen','IsEnabled','IsControlElement','IsKeyboardFocusable',
+    'HasKeyboardFocus','NativeWindowHandle','ProcessId'
+]
+
+PREFETCH_PATTERNS = ['LegacyIAccessiblePattern','ScrollPattern']
+
+# Reuse the nodes of a top-level window from the last capture while its fingerprint
+# (title, rectangle, child count and focused element) is unchanged
+INCREMENTAL_TRAVERSAL = True
+
+# Worker threads shared by every capture (None uses the ThreadPoolExecutor default)
+TRAVERSAL_WORKERS = None
+
+# Seconds to wait before retrying a failed app walk, doubled on every attempt up to the maximum
+RETRY_BACKOFF = 0.05
+RETRY_BACKOFF_MAX = 0.5
+
+# Traversal budgets per app walk (None is unlimited). When one runs out the walk keeps the
+# focused element's ancestry first, then elements in the viewport, then the rest
+MAX_NODES = None
+MAX_DEPTH = None
+MAX_CHILDREN = None
+
+# Clip the element boxes of a walk against their window and the screen in one NumPy pass.
+# Falls back to a plain loop with the same results when NumPy is not installed
+VECTORIZED_BOXES = True
+
+# Leave out what top-level windows higher in the z-order cover: windows and subtrees that are
+# fully covered are not walked, and elements with less than MIN_VISIBLE_RATIO of their
+# on-screen area uncovered are dropped
+OCCLUSION_CULLING = True
+MIN_VISIBLE_RATIO = 0.25
+
+# Record the RuntimeId of every interactive and scrollable element in the capture, so a live
+# control is mapped back to its xpath with a lookup (one extra call per element with the walker)
+RUNTIME_ID_INDEX = True
+
+# Side in pixels of the grid cells of the spatial index over the last capture, and the number
+# of cells above which an element is kept in the list of large elements scanned by every query
+SPATIAL_CELL_SIZE = 64
+SPATIAL_MAX_CELLS = 64
+
+# Ranking of the elements kept when a State-Tool output budget (max_elements, max_bytes) is set.
+# An element scores the weighted sum of: being in the foreground app, the share of its xpath it
+# has in common with the focused element, its on-screen area (full score from RANKING_FULL_AREA
+# square pixels) and its control type (CONTROL_TYPE_RANKS, INFORMATIVE_RANK for text)
+RANKING_WEIGHTS = {'foreground': 4.0, 'focus': 2.0, 'area': 1.0, 'control_type': 1.0}
+RANKING_FULL_AREA = 10000
+CONTROL_TYPE_RANKS = {
+    'Edit': 1.0, 'Combo Box': 0.9, 'Button': 0.9, 'Split Button': 0.9, 'Check Box': 0.8, 'Radio Button': 0.8,
+    'Tab Item': 0.8, 'Menu Item': 0.7, 'Link': 0.7, 'Hyperlink': 0.7, 'List Item': 0.6, 'Tree Item': 0.6, 'Data Item': 0.5
+}
+DEFAULT_CONTROL_TYPE_RANK = 0.5
+INFORMATIVE_RANK = 0.4
+
+# Annotated screenshots: font size of the labels, white margin around the screenshot and number
+# of colors of the fixed palette the labels cycle through
+ANNOTATION_FONT_SIZE = 12
+ANNOTATION_PADDING = 5
+ANNOTATION_PALETTE_SIZE = 32
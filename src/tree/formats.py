@@ -0,0 +1,152 @@
+from src.tree.xpath import XPathNode
+from json.encoder import encode_basestring as json_string
+from typing import Callable, Iterable, Optional
+
+# Layouts of the State-Tool element lists: `table` is the GitHub table of tabulate, `compact` one
+# tab separated line per element, `json` arrays of objects and `outline` the elements of each app
+# under the app and the window (main window or dialog) they belong to
+STATE_FORMATS=('table','compact','json','outline')
+
+INTERACTIVE_HEADERS=("Label","App Name","ControlType","Name","Value","Shortcut","Coordinates")
+INFORMATIVE_HEADERS=("App Name","Name")
+SCROLLABLE_HEADERS=(
+    "Label","App Name","ControlType","Name","Coordinates",
+    "Horizontal Scrollable","Horizontal Scroll Percent(%)","Vertical Scrollable","Vertical Scroll Percent(%)","IsFocused"
+)
+
+# Tabs and line breaks inside values would break the compact and outline lines
+SEPARATORS=str.maketrans({'\t':' ','\n':' ','\r':' '})
+
+def cell(value)->str:
+    value=str(value)
+    if '\t' in value or '\n' in value or '\r' in value:
+        return value.translate(SEPARATORS)
+    return value
+
+def json_bool(value)->str:
+    return 'true' if value else 'false'
+
+# Each rendering leaves the label out, so a row renders the same wherever it is listed
+
+def compact_interactive(node)->str:
+    return '\t'.join((cell(node.app_name),cell(node.control_type),cell(node.name),cell(node.value),cell(node.shortcut),node.center.to_string()))
+
+def compact_informative(node)->str:
+    return f'{cell(node.app_name)}\t{cell(node.name)}'
+
+def compact_scrollable(node)->str:
+    return '\t'.join((
+        cell(node.app_name),cell(node.control_type),cell(node.name),node.center.to_string(),
+        str(node.horizontal_scrollable),str(node.horizontal_scroll_percent),
+        str(node.vertical_scrollable),str(node.vertical_scroll_percent),str(node.is_focused)
+    ))
+
+def json_interactive(node)->str:
+    center=node.center
+    return (f'{{"app_name":{json_string(node.app_name)},"control_type":{json_string(node.control_type)},"name":{json_string(node.name)},'
+        f'"value":{json_string(str(node.value))},"shortcut":{json_string(str(node.shortcut))},"x":{center.x},"y":{center.y}}}')
+
+def json_informative(node)->str:
+    return f'{{"app_name":{json_string(node.app_name)},"name":{json_string(node.name)}}}'
+
+def json_scrollable(node)->str:
+    center=node.center
+    return (f'{{"app_name":{json_string(node.app_name)},"control_type":{json_string(node.control_type)},"name":{json_string(node.name)},'
+        f'"x":{center.x},"y":{center.y},"horizontal_scrollable":{json_bool(node.horizontal_scrollable)},'
+        f'"horizontal_scroll_percent":{float(node.horizontal_scroll_percent)!r},"vertical_scrollable":{json_bool(node.vertical_scrollable)},'
+        f'"vertical_scroll_percent":{float(node.vertical_scroll_percent)!r},"is_focused":{json_bool(node.is_focused)}}}')
+
+def outline_interactive(node)->str:
+    line=f'{cell(node.control_type)}: {cell(node.name)}'
+    if node.value:
+        line+=f' = {cell(node.value)}'
+    if node.shortcut:
+        line+=f' [{cell(node.shortcut)}]'
+    return f'{line} {node.center.to_string()}'
+
+def outline_informative(node)->str:
+    return cell(node.name)
+
+def outline_scrollable(node)->str:
+    line=f'{cell(node.control_type)}: {cell(node.name)} {node.center.to_string()}'
+    if node.horizontal_scrollable:
+        line+=f' horizontal {node.horizontal_scroll_percent}%'
+    if node.vertical_scrollable:
+        line+=f' vertical {node.vertical_scroll_percent}%'
+    return line+(' focused' if node.is_focused else '')
+
+RENDERERS:dict[tuple[str,str],Callable[[object],str]]={
+    ('compact','interactive'):compact_interactive,('compact','informative'):compact_informative,('compact','scrollable'):compact_scrollable,
+    ('json','interactive'):json_interactive,('json','informative'):json_informative,('json','scrollable'):json_scrollable,
+    ('outline','interactive'):outline_interactive,('outline','informative'):outline_informative,('outline','scrollable'):outline_scrollable
+}
+
+def check_format(format:str)->None:
+    if format not in STATE_FORMATS:
+        raise ValueError(f'Unknown format {format!r}, expected one of {", ".join(STATE_FORMATS)}')
+
+def render(nodes,format:str,kind:str)->list[str]:
+    '''The rendering of every node, cached on the table when the nodes are an `ElementTable`.'''
+    check_format(format)
+    function=RENDERERS[(format,kind)]
+    if hasattr(nodes,'render'):
+        return nodes.render(f'{format}:{kind}',function)
+    return [function(node) for node in nodes]
+
+def get_window(xpath:XPathNode|str)->XPathNode|str|None:
+    '''Innermost dialog (a window below the top-level window) on the path of an element, None in the main window.'''
+    if isinstance(xpath,XPathNode):
+        node=xpath.parent
+        # Nodes deeper than the top-level window have a grandparent
+        while node is not None and node.parent is not None and node.parent.parent is not None:
+            if node.step[0]=='WindowControl':
+                return node
+            node=node.parent
+        return None
+    parts=xpath.split('/') if xpath else []
+    for index in range(len(parts)-2,1,-1):
+        if parts[index].startswith('WindowControl'):
+            return '/'.join(parts[:index+1])
+    return None
+
+def elements_to_string(strings:list[str],format:str,headers:Iterable[str],labels:Optional[Iterable[int]]=None,
+                       changes:Optional[Iterable[str]]=None,apps:Optional[Iterable[str]]=None,windows:Optional[Iterable]=None)->str:
+    '''
+    Join rendered rows into one list.
+
+    `changes` (for deltas) and `labels` are put in front of each row. The outline groups the rows
+    under their `apps` and, when given, their `windows` (see `get_window`).
+    '''
+    prefixes=[(name,values) for name,values in (('change',changes),('label',labels)) if values is not None]
+    columns=[values for _,values in prefixes]
+    if format=='compact':
+        header='\t'.join([*(name.title() for name,_ in prefixes if name=='change'),*headers])
+        return '\n'.join([header,*('\t'.join(map(str,values)) for values in zip(*columns,strings))])
+    if format=='json':
+        if not prefixes:
+            return f'[{",".join(strings)}]'
+        items=[]
+        for *values,string in zip(*columns,strings):
+            fields=','.join(f'"{name}":{json_string(value) if name=="change" else value}' for (name,_),value in zip(prefixes,values))
+            items.append(f'{{{fields},{string[1:]}')
+        return f'[{",".join(items)}]'
+    if format=='outline':
+        grouped=windows is not None
+        windows=windows if grouped else [None]*len(strings)
+        indent='    ' if grouped else '  '
+        lines,current_app,current_window,dialogs=[],None,None,{}
+        for app,window,*values,string in zip(apps,windows,*columns,strings):
+            if app!=current_app or not lines:
+                lines.append(app)
+                current_app,current_window=app,()
+            if grouped and window!=current_window:
+                if window is None:
+                    lines.append('  main window')
+                else:
+                    lines.append(f'  dialog {dialogs.setdefault((app,window),len(dialogs)+1)}')
+                current_window=window
+            prefix=''.join(f'({value}) ' if name=='change' else f'[{value}] ' for (name,_),value in zip(prefixes,values))
+            lines.append(f'{indent}{prefix}{string}')
+        return '\n'.join(lines)
+    check_format(format)
+    raise ValueError(f'No layout for the {format} format')
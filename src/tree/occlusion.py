@@ -0,0 +1,54 @@
+from typing import Iterable
+
+Box=tuple[int,int,int,int]
+
+class Region:
+    '''Part of the screen as a list of disjoint (left, top, right, bottom) rectangles.'''
+    __slots__=('rects',)
+
+    def __init__(self,rects:Iterable[Box]=()):
+        self.rects:list[Box]=[rect for rect in rects if rect[2]>rect[0] and rect[3]>rect[1]]
+
+    @classmethod
+    def from_box(cls,box)->'Region':
+        return cls([(box.left,box.top,box.right,box.bottom)])
+
+    def is_empty(self)->bool:
+        return not self.rects
+
+    def area(self)->int:
+        return sum((right-left)*(bottom-top) for left,top,right,bottom in self.rects)
+
+    def intersect(self,box)->'Region':
+        return Region((max(left,box.left),max(top,box.top),min(right,box.right),min(bottom,box.bottom)) for left,top,right,bottom in self.rects)
+
+    def subtract(self,box)->'Region':
+        '''The region without `box`; each rectangle it overlaps splits into at most four.'''
+        cut_left,cut_top,cut_right,cut_bottom=box.left,box.top,box.right,box.bottom
+        rects=[]
+        for rect in self.rects:
+            left,top,right,bottom=rect
+            if cut_left>=right or cut_right<=left or cut_top>=bottom or cut_bottom<=top:
+                rects.append(rect)
+                continue
+            middle_top,middle_bottom=max(top,cut_top),min(bottom,cut_bottom)
+            rects.extend((
+                (left,top,right,middle_top),
+                (left,middle_bottom,right,bottom),
+                (left,middle_top,max(left,cut_left),middle_bottom),
+                (min(right,cut_right),middle_top,right,middle_bottom)
+            ))
+        return Region(rects)
+
+    def overlap(self,left:int,top:int,right:int,bottom:int)->int:
+        '''Area of the box that lies inside the region.'''
+        area=0
+        for rect_left,rect_top,rect_right,rect_bottom in self.rects:
+            width=min(right,rect_right)-max(left,rect_left)
+            height=min(bottom,rect_bottom)-max(top,rect_top)
+            if width>0 and height>0:
+                area+=width*height
+        return area
+
+    def key(self)->tuple:
+        return tuple(self.rects)
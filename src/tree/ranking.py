@@ -0,0 +1,96 @@
+from src.tree.config import RANKING_WEIGHTS, RANKING_FULL_AREA, CONTROL_TYPE_RANKS, DEFAULT_CONTROL_TYPE_RANK, INFORMATIVE_RANK
+from src.tree.views import TreeState, ElementSelection, xpath_of
+from src.tree.formats import render
+from src.tree.xpath import XPathNode
+from typing import Callable, Optional
+
+# Kinds in the order of the columns of `ElementSelection.omitted`, and the order they are ranked in on ties
+KINDS=('interactive','informative','scrollable')
+KIND_ORDER={'interactive':0,'scrollable':1,'informative':2}
+# Line break and label of a row, on top of its rendering, when estimating the output size
+ROW_OVERHEAD=8
+
+def get_path(xpath:XPathNode|str)->list[str]:
+    if isinstance(xpath,XPathNode):
+        return [step[2] for step in xpath.steps()]
+    return xpath.split('/') if xpath else []
+
+def rank_elements(tree_state:TreeState,foreground_app:Optional[str]=None,focused_xpath:Optional[XPathNode|str]=None,
+                  weights:dict[str,float]=RANKING_WEIGHTS)->list[tuple[str,int]]:
+    '''(kind, position) of every element, most relevant first. Ties keep the list order, so the ranking is deterministic.'''
+    focused_path=get_path(focused_xpath) if focused_xpath else []
+    foreground_weight,focus_weight,area_weight,type_weight=(weights.get(name,0.0) for name in ('foreground','focus','area','control_type'))
+
+    def score(node,kind:str)->float:
+        value=foreground_weight if foreground_app is not None and node.app_name==foreground_app else 0.0
+        if kind=='informative':
+            return value+type_weight*INFORMATIVE_RANK
+        if focused_path:
+            common=0
+            for step,focused_step in zip(get_path(xpath_of(node)),focused_path):
+                if step!=focused_step:
+                    break
+                common+=1
+            value+=focus_weight*common/len(focused_path)
+        box=node.bounding_box
+        value+=area_weight*min(box.width*box.height/RANKING_FULL_AREA,1.0)**0.5
+        return value+type_weight*CONTROL_TYPE_RANKS.get(node.control_type,DEFAULT_CONTROL_TYPE_RANK)
+
+    ranked=[]
+    for kind in KINDS:
+        for index,node in enumerate(getattr(tree_state,f'{kind}_nodes')):
+            ranked.append((-score(node,kind),KIND_ORDER[kind],index,kind))
+    ranked.sort()
+    return [(kind,index) for _,_,index,kind in ranked]
+
+def build_selection(tree_state:TreeState,ranked:list[tuple[str,int]],count:int)->ElementSelection:
+    selection=ElementSelection()
+    for kind,index in ranked[:count]:
+        getattr(selection,kind).append(index)
+    for kind in KINDS:
+        getattr(selection,kind).sort()
+    omitted={}
+    for kind,index in ranked[count:]:
+        app_name=getattr(tree_state,f'{kind}_nodes')[index].app_name
+        omitted.setdefault(app_name,[0,0,0])[KINDS.index(kind)]+=1
+    selection.omitted=omitted
+    return selection
+
+def measure_selection(tree_state:TreeState,selection:ElementSelection,format:str)->int:
+    '''Bytes of the three element lists limited to the selection.'''
+    return sum(len(text.encode()) for text in (
+        tree_state.interactive_elements_to_string(format,selection.interactive),
+        tree_state.informative_elements_to_string(format,selection.informative),
+        tree_state.scrollable_elements_to_string(format,selection.scrollable),
+        selection.omitted_to_string()
+    ))
+
+def select_elements(tree_state:TreeState,max_elements:Optional[int]=None,max_bytes:Optional[int]=None,format:str='table',
+                    foreground_app:Optional[str]=None,focused_xpath:Optional[XPathNode|str]=None,
+                    measure:Optional[Callable[[ElementSelection],int]]=None)->ElementSelection:
+    '''
+    The most relevant elements that fit in `max_elements` elements and `max_bytes` bytes of output.
+
+    The byte budget is first estimated from the rendered rows, then checked against `measure`
+    (by default the size of the element lists in `format`) and tightened until it holds.
+    '''
+    ranked=rank_elements(tree_state,foreground_app,focused_xpath)
+    count=len(ranked) if max_elements is None else max(0,min(max_elements,len(ranked)))
+    if max_bytes is None:
+        return build_selection(tree_state,ranked,count)
+    # Tables pad their columns, so their size is estimated from the compact rows and checked after
+    strings={kind:render(getattr(tree_state,f'{kind}_nodes'),'compact' if format=='table' else format,kind) for kind in KINDS}
+    total=0
+    for position,(kind,index) in enumerate(ranked[:count]):
+        total+=len(strings[kind][index])+ROW_OVERHEAD
+        if total>max_bytes:
+            count=position
+            break
+    measure=measure or (lambda selection:measure_selection(tree_state,selection,format))
+    selection=build_selection(tree_state,ranked,count)
+    size=measure(selection)
+    while size>max_bytes and count>0:
+        count=min(count-1,int(count*max_bytes/size))
+        selection=build_selection(tree_state,ranked,count)
+        size=measure(selection)
+    return selection
@@ -1,12 +1,24 @@
-from src.tree.config import INTERACTIVE_CONTROL_TYPE_NAMES,INFORMATIVE_CONTROL_TYPE_NAMES, DEFAULT_ACTIONS, THREAD_MAX_RETRIES
-from src.tree.views import TreeElementNode, TextElementNode, ScrollElementNode, Center, BoundingBox, TreeState
-from uiautomation import Control,ImageControl,ScrollPattern,WindowControl,Rect
+from src.tree.config import INTERACTIVE_CONTROL_TYPE_NAMES,INFORMATIVE_CONTROL_TYPE_NAMES, DEFAULT_ACTIONS, THREAD_MAX_RETRIES, SETTLE_DELAY
+from src.tree.config import TRAVERSAL_ENGINE, TRAVERSAL_ENGINES, PREFETCH_PROPERTIES, PREFETCH_PATTERNS, INCREMENTAL_TRAVERSAL
+from src.tree.config import TRAVERSAL_WORKERS, RETRY_BACKOFF, RETRY_BACKOFF_MAX, MAX_NODES, MAX_DEPTH, MAX_CHILDREN, VECTORIZED_BOXES
+from src.tree.config import OCCLUSION_CULLING, MIN_VISIBLE_RATIO, RUNTIME_ID_INDEX
+from src.tree.xpath import XPathNode, XPathSteps
+from src.tree.views import BoundingBox, TreeState, CacheStats, WindowCacheEntry, Truncation
+from src.backend.views import Control,ScrollPattern,Rect
 from src.tree.utils import random_point_within_bounding_box
+from src.tree.cache import CachedControl
+from src.tree.columns import InteractiveTable, TextTable, ScrollTable
+from src.tree.boxes import BoxBatch
+from src.tree.occlusion import Region, Box
+from src.tree.annotate import Annotator, get_boxes
 from src.desktop.config import AVOIDED_APPS, EXCLUDED_APPS
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from PIL import Image, ImageFont, ImageDraw
-from typing import TYPE_CHECKING
-from time import sleep
+from heapq import heappush, heappop
+from itertools import count
+from threading import Lock
+from PIL import Image
+from typing import TYPE_CHECKING, Callable, Optional
+from time import sleep, monotonic
 import logging
 import random
 
@@ -25,70 +37,309 @@ class Tree:
         self.desktop=desktop
         screen_size=self.desktop.get_screen_size()
         self.dom_bounding_box:BoundingBox=None
+        self.settle_delay=SETTLE_DELAY
+        # Seed for the random points picked inside scrollable elements (None uses the global generator)
+        self.seed:int|None=None
+        # 'walker' or 'prefetch', see TRAVERSAL_ENGINE
+        self.engine=TRAVERSAL_ENGINE
+        # Clip the element boxes of a walk with NumPy when it is installed, see VECTORIZED_BOXES
+        self.vectorized_boxes=VECTORIZED_BOXES
+        # Leave out elements hidden behind windows higher in the z-order, see OCCLUSION_CULLING
+        self.occlusion=OCCLUSION_CULLING
+        self.min_visible_ratio=MIN_VISIBLE_RATIO
+        # Record the RuntimeId of every element with an xpath, see RUNTIME_ID_INDEX
+        self.runtime_id_index=RUNTIME_ID_INDEX
+        # Steps of the xpaths of the captured elements, shared by all captures
+        self.xpath_steps=XPathSteps()
+        # Font, palette, label tiles and frame buffer of the annotated screenshots
+        self.annotator=Annotator()
+        # Nodes of each top-level window from the last capture, keyed by handle, RuntimeId and xpath
+        self.incremental=INCREMENTAL_TRAVERSAL
+        self.window_cache:dict[tuple,WindowCacheEntry]={}
+        # Traversal budgets per app walk, see MAX_NODES
+        self.max_nodes:int|None=MAX_NODES
+        self.max_depth:int|None=MAX_DEPTH
+        self.max_children:int|None=MAX_CHILDREN
+        # Property cache counters of the last capture
+        self.cache_stats=CacheStats()
+        self._stats_lock=Lock()
+        # Apps that had not finished when the deadline of the last capture was reached
+        self.timed_out_apps:list[str]=[]
+        # Budget truncations of the last capture, keyed by app xpath
+        self.truncations:dict[str,Truncation]={}
+        # Native handles of the top-level windows of the last capture, keyed by xpath
+        self.window_handles:dict[str,int]={}
+        # Xpaths of the windows the last capture walked instead of reusing from the window cache
+        self.walked_windows:list[str]=[]
+        # Long-lived pool for the app walks, started by the first capture. A walk abandoned at a
+        # deadline stops at its next node (see get_nodes), so it does not hold on to its worker
+        self.executor:Optional[ThreadPoolExecutor]=None
         self.screen_box=BoundingBox(
             top=0, left=0, bottom=screen_size.height, right=screen_size.width,
             width=screen_size.width, height=screen_size.height 
         )
 
-    def get_state(self,root:Control=None)->TreeState:
-        """Get tree state, with optional root parameter for compatibility"""
-        sleep(0.1)
+    def get_state(self,root:Control=None,on_app:Optional[Callable[[str,TreeState],None]]=None,deadline_ms:Optional[int]=None,engine:Optional[str]=None)->TreeState:
+        """Get tree state, with optional root parameter for compatibility.
+
+        `deadline_ms` bounds the walk of the apps; its clock starts after the settle delay.
+        """
+        sleep(self.settle_delay)
+        deadline=monotonic()+deadline_ms/1000 if deadline_ms else None
         if root is None:
-            # Use GetRootControl if no root provided (copy's approach)
-            from uiautomation import GetRootControl
-            root = GetRootControl()
-        interactive_nodes,informative_nodes,scrollable_nodes=self.get_appwise_nodes(node=root)
-        return TreeState(interactive_nodes=interactive_nodes,informative_nodes=informative_nodes,scrollable_nodes=scrollable_nodes)
+            root=self.desktop.backend.get_root_control()
+        interactive_nodes,informative_nodes,scrollable_nodes=self.get_appwise_nodes(node=root,on_app=on_app,deadline=deadline,engine=engine)
+        return TreeState(
+            interactive_nodes=interactive_nodes,informative_nodes=informative_nodes,scrollable_nodes=scrollable_nodes,
+            timed_out_apps=list(self.timed_out_apps),truncations=list(self.truncations.values()),
+            window_handles=dict(self.window_handles)
+        )
+
+    def close(self)->None:
+        '''Shut the walk pool down without waiting for walks past their deadline; a later capture starts a new pool.'''
+        executor,self.executor=self.executor,None
+        if executor is not None:
+            executor.shutdown(wait=False,cancel_futures=True)
 
-    def get_appwise_nodes(self,node:Control) -> tuple[list[TreeElementNode],list[TextElementNode],list[ScrollElementNode]]:
+    def invalidate(self):
+        '''Forget the cached window subtrees so the next capture walks every window.'''
+        self.window_cache.clear()
+
+    def get_focus_fingerprint(self)->tuple:
+        '''Identity and value of the focused element, and the process that owns it.'''
+        try:
+            focused=self.desktop.backend.get_focused_control()
+            if focused is None:
+                return (None,None)
+            legacy_pattern=focused.GetLegacyIAccessiblePattern()
+            value=legacy_pattern.Value if legacy_pattern is not None else None
+            return (focused.ProcessId,(tuple(focused.GetRuntimeId()),focused.Name,value))
+        except Exception:
+            return (None,None)
+
+    def get_window_fingerprint(self,app:Control,focus:tuple)->tuple:
+        '''Cheap summary of a top-level window; when it is unchanged the window's subtree is assumed unchanged.'''
+        box=app.BoundingRectangle
+        process_id,focused=focus
+        return (
+            app.Name,(box.left,box.top,box.right,box.bottom),len(app.GetChildren()),
+            focused if process_id is not None and process_id==app.ProcessId else None
+        )
+
+    def get_app_name(self,node:Control)->str:
+        match node.ClassName:
+            case "Progman":
+                return "Desktop"
+            case 'Shell_TrayWnd'|'Shell_SecondaryTrayWnd':
+                return "Taskbar"
+            case 'Microsoft.UI.Content.PopupWindowSiteBridge':
+                return "Context Menu"
+            case _:
+                return node.Name.strip()
+
+    def get_nodes_after(self,delay:float,node:Control,current_xpath:str,is_browser=False,deadline:Optional[float]=None,region:Optional[Region]=None,engine:Optional[str]=None):
+        sleep(delay)
+        return self.get_nodes(node,current_xpath,is_browser,deadline,region,engine)
+
+    def is_occluding_window(self,window:Control)->bool:
+        '''Whether a top-level window hides what is below it.'''
+        try:
+            if window.ClassName in AVOIDED_APPS or window.ClassName=='Progman':
+                return False
+            handle=window.NativeWindowHandle
+            backend=self.desktop.backend
+            if not backend.is_window_visible(handle) or backend.is_iconic(handle) or window.BoundingRectangle.isempty():
+                return False
+            return not self.desktop.is_overlay_app(window)
+        except Exception:
+            return False
+
+    def get_visible_region(self,app:Control,above:list[Control],occluding:dict[Control,bool])->Optional[Region]:
+        '''
+        Part of the window of `app` on screen and not covered by the windows `above` it in the z-order,
+        or None when none of them covers it. `occluding` caches `is_occluding_window` across apps.
+        '''
+        region=Region.from_box(app.BoundingRectangle).intersect(self.screen_box)
+        area=region.area()
+        for window in above:
+            if window not in occluding:
+                occluding[window]=self.is_occluding_window(window)
+            if occluding[window]:
+                region=region.subtract(window.BoundingRectangle)
+        return None if region.area()==area else region
+
+    def get_appwise_nodes(self,node:Control,on_app:Optional[Callable[[str,TreeState],None]]=None,deadline:Optional[float]=None,engine:Optional[str]=None) -> tuple[InteractiveTable,TextTable,ScrollTable]:
+        '''
+        Walk the foreground app and the always-walked apps (Taskbar, Desktop) in parallel.
+
+        `on_app` is called with the app name and its nodes as each app finishes, so callers can
+        stream partial results. The foreground app is always reported first.
+
+        `deadline` is a `time.monotonic()` timestamp. When it is reached the apps that finished are
+        returned and the names of the others are left in `timed_out_apps`.
+
+        `engine` reads the subtrees of this capture (see `get_nodes`), `Tree.engine` when None.
+        '''
+        engine=engine or self.engine
         apps:list[tuple[Control,int]]=[]
+        foreground_app=None
         found_foreground_app=False
 
-        EXCLUDED_APPS.discard('Progman')
+        self.cache_stats=CacheStats()
+        self.timed_out_apps=[]
+        self.truncations={}
+        self.window_handles={}
+        budgets=(self.max_nodes,self.max_depth,self.max_children)
+        # The desktop (Progman) is only walked when it is the foreground app
+        excluded_apps=EXCLUDED_APPS-{'Progman'}
         type_to_count={}
+        # Top-level windows are listed in z-order, topmost first
+        regions,above,occluding={},[],{}
         for app in node.GetChildren():
             control_type=app.ControlTypeName
             # counting control types in the app
             type_to_count[control_type]=type_to_count.get(control_type,0)+1
-            if app.ClassName in EXCLUDED_APPS:
+            if app.ClassName in excluded_apps:
                 apps.append((app,type_to_count[control_type]))
             elif app.ClassName not in AVOIDED_APPS and self.desktop.is_app_visible(app):
                 if not found_foreground_app:
                     apps.append((app,type_to_count[control_type]))
+                    foreground_app=app
                     found_foreground_app=True
+            if self.occlusion and apps and apps[-1][0] is app:
+                try:
+                    regions[app]=self.get_visible_region(app,above,occluding)
+                except Exception:
+                    regions[app]=None
+            above.append(app)
+        # Windows fully covered by the ones above them are not walked
+        covered_apps=[app for app,region in regions.items() if region is not None and region.is_empty()]
+        if covered_apps:
+            logger.debug(f'Covered by other windows: {", ".join(self.get_app_name(app) for app in covered_apps)}')
+            apps=[(app,index) for app,index in apps if app not in covered_apps]
+            if foreground_app in covered_apps:
+                foreground_app=None
     
-        interactive_nodes, informative_nodes, scrollable_nodes = [], [], []
-
-        with ThreadPoolExecutor() as executor:
-            retry_counts = {app: 0 for app,_ in apps}
-            future_to_app = {
-                executor.submit(
-                    self.get_nodes, app, f"{node.ControlTypeName}/{app.ControlTypeName}[{index}]", 
-                    self.desktop.is_app_browser(app)
-                ): app 
-                for app,index in apps
-            }
-            while future_to_app:  # keep running until no pending futures
-                for future in as_completed(list(future_to_app)):
+        interactive_nodes, informative_nodes, scrollable_nodes = InteractiveTable(), TextTable(), ScrollTable()
+        # Results are merged in app order (not completion order) so labels are stable between calls
+        results = {}
+
+        reported,waiting=set(),[]
+        def report(app:Control):
+            # Hold back the other apps until the foreground app has been reported
+            if on_app is None or app in reported:
+                return None
+            if foreground_app is not None and foreground_app not in reported and app is not foreground_app:
+                waiting.append(app)
+                return None
+            for app in dict.fromkeys([app,*waiting]):
+                reported.add(app)
+                element_nodes,text_nodes,scroll_nodes=results[app]
+                try:
+                    on_app(self.get_app_name(app),TreeState(interactive_nodes=element_nodes,informative_nodes=text_nodes,scrollable_nodes=scroll_nodes))
+                except Exception as e:
+                    logger.warning(f'Failed to report the nodes of {app.Name}: {e}')
+            waiting.clear()
+
+        # Windows whose fingerprint matches the last capture reuse its nodes; only the others are walked
+        window_cache:dict[tuple,WindowCacheEntry]={}
+        keys,fingerprints,dirty_apps,xpaths={},{},[],[]
+        focus=self.get_focus_fingerprint() if self.incremental else None
+        for app,index in apps:
+            xpath=f"{node.ControlTypeName}/{app.ControlTypeName}[{index}]"
+            xpaths.append(xpath)
+            try:
+                self.window_handles[xpath]=app.NativeWindowHandle
+            except Exception:
+                pass
+            is_browser=self.desktop.is_app_browser(app)
+            if not self.incremental:
+                dirty_apps.append((app,xpath,is_browser))
+                continue
+            try:
+                region=regions.get(app)
+                key=(app.NativeWindowHandle,tuple(app.GetRuntimeId()),xpath,is_browser,budgets,region.key() if region is not None else None)
+                fingerprint=self.get_window_fingerprint(app,focus)
+            except Exception:
+                dirty_apps.append((app,xpath,is_browser))
+                continue
+            keys[app],fingerprints[app]=key,fingerprint
+            entry=self.window_cache.get(key)
+            if entry is not None and entry.fingerprint==fingerprint:
+                results[app]=entry.nodes
+                window_cache[key]=entry
+                if entry.truncation is not None:
+                    self.truncations[xpath]=entry.truncation
+                self.cache_stats.windows_reused+=1
+            else:
+                dirty_apps.append((app,xpath,is_browser))
+        self.cache_stats.windows_walked+=len(dirty_apps)
+        self.walked_windows=[xpath for _,xpath,_ in dirty_apps]
+        # The foreground app is submitted first so its walk starts before the others
+        dirty_apps.sort(key=lambda item:item[0] is not foreground_app)
+        for app,_ in apps:
+            if app in results:
+                report(app)
+
+        if self.executor is None:
+            self.executor=ThreadPoolExecutor(max_workers=TRAVERSAL_WORKERS,thread_name_prefix='tree')
+        executor = self.executor
+        retry_counts = {app: 0 for app,_,_ in dirty_apps}
+        arguments = {app: (xpath, is_browser) for app,xpath,is_browser in dirty_apps}
+        future_to_app = {
+            executor.submit(self.get_nodes, app, xpath, is_browser, deadline, regions.get(app), engine): app 
+            for app,xpath,is_browser in dirty_apps
+        }
+        while future_to_app:  # keep running until no pending futures
+            timeout = None if deadline is None else max(0.0, deadline-monotonic())
+            try:
+                for future in as_completed(list(future_to_app), timeout=timeout):
                     app = future_to_app.pop(future)  # remove completed future
                     try:
                         result = future.result()
                         if result:
-                            element_nodes, text_nodes, scroll_nodes = result
-                            interactive_nodes.extend(element_nodes)
-                            informative_nodes.extend(text_nodes)
-                            scrollable_nodes.extend(scroll_nodes)
+                            results[app] = result
+                            if app in keys:
+                                truncation=self.truncations.get(arguments[app][0])
+                                window_cache[keys[app]]=WindowCacheEntry(fingerprint=fingerprints[app],nodes=result,truncation=truncation)
+                            report(app)
                     except Exception as e:
                         retry_counts[app] += 1
-                        print(f"Error in processing node {app.Name}, retry attempt {retry_counts[app]}\nError: {e}")
-                        if retry_counts[app] < THREAD_MAX_RETRIES:
-                            new_future = executor.submit(self.get_nodes, app, self.desktop.is_app_browser(app))
+                        logger.warning(f'Error in processing node {app.Name}, retry attempt {retry_counts[app]}: {e}')
+                        delay = min(RETRY_BACKOFF*2**(retry_counts[app]-1), RETRY_BACKOFF_MAX)
+                        if retry_counts[app] < THREAD_MAX_RETRIES and (deadline is None or monotonic()+delay < deadline):
+                            new_future = executor.submit(self.get_nodes_after, delay, app, *arguments[app], deadline, regions.get(app), engine)
                             future_to_app[new_future] = app
                         else:
-                            print(f"Task failed completely for {app.Name} after {THREAD_MAX_RETRIES} retries")
+                            logger.error(f'Task failed completely for {app.Name} after {retry_counts[app]} attempts')
+            except TimeoutError:
+                # Deadline reached: keep what finished. The walks still running see the deadline and stop
+                for future, app in future_to_app.items():
+                    future.cancel()
+                    self.timed_out_apps.append(self.get_app_name(app))
+                logger.debug(f'Deadline reached before {", ".join(self.timed_out_apps)} finished')
+                break
+        self.window_cache=window_cache
+        # Truncations in app order, like the nodes
+        self.truncations={xpath:self.truncations[xpath] for xpath in xpaths if xpath in self.truncations}
+        # Report the others even when the foreground app failed
+        foreground_app=None
+        for app in list(waiting):
+            report(app)
+        for app,_ in apps:
+            if app in results:
+                element_nodes, text_nodes, scroll_nodes = results[app]
+                interactive_nodes.extend(element_nodes)
+                informative_nodes.extend(text_nodes)
+                scrollable_nodes.extend(scroll_nodes)
         return interactive_nodes,informative_nodes,scrollable_nodes
     
     def iou_bounding_box(self,window_box: Rect,element_box: Rect,) -> BoundingBox:
+        left,top,right,bottom=self.intersect_boxes(window_box,element_box)
+        return BoundingBox(left=left,top=top,right=right,bottom=bottom,width=right-left,height=bottom-top)
+
+    def intersect_boxes(self,window_box: Rect,element_box: Rect) -> tuple[int,int,int,int]:
+        '''`iou_bounding_box` as a (left, top, right, bottom) tuple.'''
         # Step 1: Intersection of element and window (existing logic)
         intersection_left = max(window_box.left, element_box.left)
         intersection_top = max(window_box.top, element_box.top)
@@ -103,31 +354,32 @@ class Tree:
 
         # Step 3: Validate intersection
         if (intersection_right > intersection_left and intersection_bottom > intersection_top):
-            bounding_box = BoundingBox(
-                left=intersection_left,
-                top=intersection_top,
-                right=intersection_right,
-                bottom=intersection_bottom,
-                width=intersection_right - intersection_left,
-                height=intersection_bottom - intersection_top
-            )
-        else:
-            # No valid visible intersection (either outside window or screen)
-            bounding_box = BoundingBox(
-                left=0,
-                top=0,
-                right=0,
-                bottom=0,
-                width=0,
-                height=0
-            )
-        return bounding_box
-
-
-    def get_nodes(self, node: Control, current_xpath: str, is_browser=False) -> tuple[list[TreeElementNode],list[TextElementNode],list[ScrollElementNode]]:
+            return intersection_left, intersection_top, intersection_right, intersection_bottom
+        # No valid visible intersection (either outside window or screen)
+        return 0, 0, 0, 0
+
+    def get_nodes(self, node: Control, current_xpath: str, is_browser=False, deadline:Optional[float]=None, region:Optional[Region]=None, engine:Optional[str]=None) -> tuple[InteractiveTable,TextTable,ScrollTable]:
+        '''
+        The nodes of one app, read by `engine` ('walker' or 'prefetch', `Tree.engine` when None).
+
+        Past `deadline` the walk stops at the next node and returns what it has; the bulk request
+        of the prefetch engine is not interrupted.
+        '''
+        stats=CacheStats()
+        engine=engine or self.engine
+        if engine not in TRAVERSAL_ENGINES:
+            raise ValueError(f'Unknown traversal engine {engine!r}, expected one of {", ".join(TRAVERSAL_ENGINES)}')
+        if engine=='prefetch':
+            node=self.desktop.backend.prefetch_subtree(node,PREFETCH_PROPERTIES,PREFETCH_PATTERNS)
+        node=CachedControl(node,stats)
         window_bounding_box=node.BoundingRectangle
+        rng=random.Random(f'{self.seed}:{current_xpath}') if self.seed is not None else random
+        max_nodes,max_depth,max_children=self.max_nodes,self.max_depth,self.max_children
+        min_visible_ratio=self.min_visible_ratio
+        record_runtime_ids=self.runtime_id_index
+        xpath_steps=self.xpath_steps
 
-        def is_element_visible(node:Control,threshold:int=0):
+        def is_element_visible(node:CachedControl,threshold:int=0):
             is_control=node.IsControlElement
             box=node.BoundingRectangle
             if box.isempty():
@@ -138,26 +390,26 @@ class Tree:
             is_offscreen=(not node.IsOffscreen) or node.ControlTypeName in ['EditControl']
             return area > threshold and is_offscreen and is_control
     
-        def is_element_enabled(node:Control):
+        def is_element_enabled(node:CachedControl):
             try:
                 return node.IsEnabled
             except Exception:
                 return False
             
-        def is_default_action(node:Control):
+        def is_default_action(node:CachedControl):
             legacy_pattern=node.GetLegacyIAccessiblePattern()
             default_action=legacy_pattern.DefaultAction.title()
             if default_action in DEFAULT_ACTIONS:
                 return True
             return False
         
-        def is_element_image(node:Control):
-            if isinstance(node,ImageControl):
+        def is_element_image(node:CachedControl):
+            if node.ControlTypeName=='ImageControl':
                 if node.LocalizedControlType=='graphic' or not node.IsKeyboardFocusable:
                     return True
             return False
         
-        def is_element_text(node:Control):
+        def is_element_text(node:CachedControl):
             try:
                 if node.ControlTypeName in INFORMATIVE_CONTROL_TYPE_NAMES:
                     if is_element_visible(node) and is_element_enabled(node) and not is_element_image(node):
@@ -166,14 +418,14 @@ class Tree:
                 return False
             return False
         
-        def is_element_scrollable(node:Control):
+        def is_element_scrollable(node:CachedControl):
             try:
                 scroll_pattern:ScrollPattern=node.GetScrollPattern()
                 return scroll_pattern.VerticallyScrollable or scroll_pattern.HorizontallyScrollable
             except Exception:
                 return False
             
-        def is_keyboard_focusable(node:Control):
+        def is_keyboard_focusable(node:CachedControl):
             try:
                 if node.ControlTypeName in set(['EditControl','ButtonControl','CheckBoxControl','RadioButtonControl','TabItemControl']):
                     return True
@@ -181,14 +433,14 @@ class Tree:
             except Exception:
                 return False
             
-        def element_has_child_element(node:Control,control_type:str,child_control_type:str):
+        def element_has_child_element(node:CachedControl,control_type:str,child_control_type:str):
             if node.LocalizedControlType==control_type:
                 first_child=node.GetFirstChildControl()
                 if first_child is None:
                     return False
                 return first_child.LocalizedControlType==child_control_type
             
-        def group_has_no_name(node:Control):
+        def group_has_no_name(node:CachedControl):
             try:
                 if node.ControlTypeName=='GroupControl':
                     if not node.Name.strip():
@@ -197,7 +449,7 @@ class Tree:
             except Exception:
                 return False
             
-        def is_element_interactive(node:Control):
+        def is_element_interactive(node:CachedControl):
             try:
                 if is_browser and node.ControlTypeName in set(['DataItemControl','ListItemControl']) and not is_keyboard_focusable(node):
                     return False
@@ -214,12 +466,29 @@ class Tree:
                 return False
             return False
         
-        def dom_correction(node:Control):
+        def get_runtime_id(node:CachedControl)->Optional[tuple[int,...]]:
+            if not record_runtime_ids:
+                return None
+            try:
+                return tuple(node.GetRuntimeId())
+            except Exception:
+                return None
+
+        def add_interactive_node(nodes:InteractiveTable,boxes:BoxBatch,name:str,control_type:str,value:str,shortcut:str,element_box:Rect,clip_box:Rect,xpath:XPathNode|str,runtime_id:Optional[tuple[int,...]]=None):
+            # The box and center are filled in by one clipping pass over all the boxes after the walk
+            nodes.add(name,control_type,value,shortcut,0,0,0,0,0,0,xpath,app_name,runtime_id)
+            boxes.add(element_box,clip_box)
+
+        def pop_dom_node():
+            dom_interactive_nodes.pop()
+            dom_boxes.pop()
+
+        def dom_correction(node:CachedControl):
             if element_has_child_element(node,'list item','link') or element_has_child_element(node,'item','link'):
-                dom_interactive_nodes.pop()
+                pop_dom_node()
                 return None
             elif node.ControlTypeName=='GroupControl':
-                dom_interactive_nodes.pop()
+                pop_dom_node()
                 if is_keyboard_focusable(node):
                     child=node
                     try:
@@ -234,123 +503,157 @@ class Tree:
                     legacy_pattern=node.GetLegacyIAccessiblePattern()
                     value=legacy_pattern.Value
                     element_bounding_box = node.BoundingRectangle
-                    bounding_box=self.iou_bounding_box(self.dom_bounding_box,element_bounding_box)
-                    center = bounding_box.get_center()
-                    dom_interactive_nodes.append(TreeElementNode(
-                        name=child.Name.strip(),
-                        control_type=node.LocalizedControlType,
-                        value=value,
-                        shortcut=node.AcceleratorKey,
-                        bounding_box=bounding_box,
-                        xpath='',
-                        center=center,
-                        app_name=app_name
-                    ))
+                    add_interactive_node(dom_interactive_nodes,dom_boxes,child.Name.strip(),node.LocalizedControlType,value,node.AcceleratorKey,
+                        element_bounding_box,self.dom_bounding_box,'')
             elif element_has_child_element(node,'link','heading'):
-                dom_interactive_nodes.pop()
+                pop_dom_node()
                 node=node.GetFirstChildControl()
                 control_type='link'
                 legacy_pattern=node.GetLegacyIAccessiblePattern()
                 value=legacy_pattern.Value
                 element_bounding_box = node.BoundingRectangle
-                bounding_box=self.iou_bounding_box(self.dom_bounding_box,element_bounding_box)
-                center = bounding_box.get_center()
-                dom_interactive_nodes.append(TreeElementNode(
-                    name=node.Name.strip(),
-                    control_type=control_type,
-                    value=node.Name.strip(),
-                    shortcut=node.AcceleratorKey,
-                    bounding_box=bounding_box,
-                    xpath='',
-                    center=center,
-                    app_name=app_name
-                ))
+                add_interactive_node(dom_interactive_nodes,dom_boxes,node.Name.strip(),control_type,node.Name.strip(),node.AcceleratorKey,
+                    element_bounding_box,self.dom_bounding_box,'')
             
-        def tree_traversal(node: Control, current_xpath:str,is_dom=False,is_dialog=False):
+        def is_element_skipped(node:CachedControl):
+            # Offscreen elements are skipped with their subtree, except for these containers
+            return node.IsOffscreen and (node.ControlTypeName not in set(["GroupControl","EditControl","TitleBarControl"])) and node.ClassName not in set(["Popup","Windows.UI.Core.CoreComponentInputSource"])
+
+        def get_focus_path():
+            # Center of the focused element and the runtime ids of it and its ancestors in this app
+            try:
+                focused=self.desktop.backend.get_focused_control()
+                if focused is None or focused.ProcessId!=node.ProcessId:
+                    return None,set()
+                box=focused.BoundingRectangle
+                ancestry=set()
+                while focused is not None and focused.ProcessId==node.ProcessId:
+                    ancestry.add(tuple(focused.GetRuntimeId()))
+                    focused=focused.GetParentControl()
+                return (box.xcenter(),box.ycenter()),ancestry
+            except Exception:
+                return None,set()
+
+        def select_nodes(root:CachedControl,truncation:Truncation)->set[CachedControl]:
+            '''Prioritized breadth-first pass choosing the nodes the walk may visit within the budgets.'''
+            focus_point,focus_ancestry=get_focus_path()
+            screen=self.screen_box
+            def get_priority(node:CachedControl)->int:
+                # Ancestry of the focused element first, then the viewport, then the rest.
+                # An ancestor contains the focused element, so only those boxes read the runtime id
+                box=node.BoundingRectangle
+                if focus_point is not None and box.contains(*focus_point) and tuple(node.GetRuntimeId()) in focus_ancestry:
+                    return 0
+                if not node.IsOffscreen and box.right>screen.left and box.left<screen.right and box.bottom>screen.top and box.top<screen.bottom:
+                    return 1
+                return 2
+            selected=set()
+            order=count()
+            heap=[(0,0,next(order),root)]
+            while heap:
+                if deadline is not None and monotonic()>deadline:
+                    break
+                if max_nodes is not None and len(selected)>=max_nodes:
+                    # The frontier only: what lies below these nodes was never read, so it is not counted
+                    truncation.max_nodes+=len(heap)
+                    break
+                _,depth,_,node=heappop(heap)
+                selected.add(node)
+                if is_element_skipped(node):
+                    continue
+                children=node.GetChildren()
+                if max_depth is not None and depth>=max_depth:
+                    truncation.max_depth+=len(children)
+                    continue
+                priorities=[get_priority(child) for child in children]
+                if max_children is not None and len(children)>max_children:
+                    truncation.max_children+=len(children)-max_children
+                    ranked=sorted(range(len(children)),key=priorities.__getitem__)[:max_children]
+                    children,priorities=[children[index] for index in ranked],[priorities[index] for index in ranked]
+                for child,priority in zip(children,priorities):
+                    heappush(heap,(priority,depth+1,next(order),child))
+            return selected
+
+        def get_visible_ratio(node:CachedControl,is_dom=False)->Optional[float]:
+            # Share of the element's on-screen box that no window above the app covers, None when it has none
+            clip_box=self.dom_bounding_box if is_browser and is_dom else window_bounding_box
+            left,top,right,bottom=self.intersect_boxes(clip_box,node.BoundingRectangle)
+            area=(right-left)*(bottom-top)
+            return region.overlap(left,top,right,bottom)/area if area else None
+
+        def visit_node(node: CachedControl, current_xpath:XPathNode,is_dom=False,is_dialog=False)->bool:
             # Checks to skip the nodes that are not interactive
-            if node.IsOffscreen and (node.ControlTypeName not in set(["GroupControl","EditControl","TitleBarControl"])) and node.ClassName not in set(["Popup","Windows.UI.Core.CoreComponentInputSource"]):
-                return None
+            if is_element_skipped(node):
+                return False
+
+            if region is not None:
+                visible_ratio=get_visible_ratio(node,is_dom)
+                if visible_ratio is not None and visible_ratio<min_visible_ratio:
+                    # Mostly behind other windows, its uncovered descendants are still visited
+                    return True
             
             if is_element_scrollable(node):
                 scroll_pattern:ScrollPattern=node.GetScrollPattern()
                 box = node.BoundingRectangle
                 # Get the center
-                x,y=random_point_within_bounding_box(node=node,scale_factor=0.8)
-                center = Center(x=x,y=y)
-                scrollable_nodes.append(ScrollElementNode(
-                    name=node.Name.strip() or node.LocalizedControlType.capitalize() or "''",
-                    app_name=app_name,
-                    control_type=node.LocalizedControlType.title(),
-                    bounding_box=BoundingBox(
-                        left=box.left,
-                        top=box.top,
-                        right=box.right,
-                        bottom=box.bottom,
-                        width=box.width(),
-                        height=box.height()
-                    ),
-                    center=center,
-                    xpath=current_xpath,
-                    horizontal_scrollable=scroll_pattern.HorizontallyScrollable,
-                    horizontal_scroll_percent=scroll_pattern.HorizontalScrollPercent if scroll_pattern.HorizontallyScrollable else 0,
-                    vertical_scrollable=scroll_pattern.VerticallyScrollable,
-                    vertical_scroll_percent=scroll_pattern.VerticalScrollPercent if scroll_pattern.VerticallyScrollable else 0,
-                    is_focused=node.HasKeyboardFocus
-                ))
+                x,y=random_point_within_bounding_box(node=node,scale_factor=0.8,rng=rng)
+                scrollable_nodes.add(
+                    node.Name.strip() or node.LocalizedControlType.capitalize() or "''",
+                    node.LocalizedControlType.title(),
+                    current_xpath,
+                    app_name,
+                    box.left,box.top,box.right,box.bottom,
+                    x,y,
+                    scroll_pattern.HorizontallyScrollable,
+                    scroll_pattern.HorizontalScrollPercent if scroll_pattern.HorizontallyScrollable else 0,
+                    scroll_pattern.VerticallyScrollable,
+                    scroll_pattern.VerticalScrollPercent if scroll_pattern.VerticallyScrollable else 0,
+                    node.HasKeyboardFocus,
+                    get_runtime_id(node)
+                )
             elif is_element_interactive(node):
                 legacy_pattern=node.GetLegacyIAccessiblePattern()
                 value=legacy_pattern.Value.strip() if legacy_pattern.Value is not None else ""
                 name=node.Name.strip()
                 element_bounding_box = node.BoundingRectangle
                 if is_browser and is_dom:
-                    bounding_box=self.iou_bounding_box(self.dom_bounding_box,element_bounding_box)
-                    center = bounding_box.get_center()
-                    tree_node=TreeElementNode(
-                            name=name,
-                            control_type=node.LocalizedControlType.title(),
-                            value=value,
-                            shortcut=node.AcceleratorKey,
-                            bounding_box=bounding_box,
-                            center=center,
-                            xpath=current_xpath,
-                            app_name=app_name
-                        )
-                    dom_interactive_nodes.append(tree_node)
+                    add_interactive_node(dom_interactive_nodes,dom_boxes,name,node.LocalizedControlType.title(),value,node.AcceleratorKey,
+                        element_bounding_box,self.dom_bounding_box,current_xpath,get_runtime_id(node))
                     dom_correction(node=node)
                 else:
-                    bounding_box=self.iou_bounding_box(window_bounding_box,element_bounding_box)
-                    center = bounding_box.get_center()
-                    tree_node=TreeElementNode(
-                            name=name,
-                            control_type=node.LocalizedControlType.title(),
-                            value=value,
-                            shortcut=node.AcceleratorKey,
-                            bounding_box=bounding_box,
-                            center=center,
-                            xpath=current_xpath,
-                            app_name=app_name
-                        )
-                    interactive_nodes.append(tree_node)
+                    add_interactive_node(interactive_nodes,interactive_boxes,name,node.LocalizedControlType.title(),value,node.AcceleratorKey,
+                        element_bounding_box,window_bounding_box,current_xpath,get_runtime_id(node))
             elif is_element_text(node):
-                informative_nodes.append(TextElementNode(
-                    name=node.Name.strip() or "''",
-                    app_name=app_name
-                ))
+                informative_nodes.add(node.Name.strip() or "''",app_name)
             
-            children=node.GetChildren()
-            type_to_count={}
+            return True
 
-            # Recursively traverse the tree the right to left for normal apps and for DOM traverse from left to right
-            for child in (children if is_dom else children[::-1]):
-                # Incrementally building the xpath
+        def tree_traversal(node: CachedControl, current_xpath:XPathNode,is_dom=False,is_dialog=False):
+            if not visit_node(node,current_xpath,is_dom=is_dom,is_dialog=is_dialog):
+                return None
+            # Explicit stack of (children, type counts, xpath, is_dom, is_dialog) frames instead of recursion.
+            # Normal apps are traversed right to left and the DOM left to right, one sibling at a time
+            stack=[(node.iter_children(reverse=not is_dom),{},current_xpath,is_dom,is_dialog)]
+            while stack:
+                if deadline is not None and monotonic()>deadline:
+                    # The capture has given up on this app, stop fetching
+                    break
+                children,type_to_count,current_xpath,is_dom,is_dialog=stack[-1]
+                child=next(children,None)
+                if child is None:
+                    stack.pop()
+                    continue
+                # Position of the child among its same-type siblings, the index of its xpath step
                 control_type=child.ControlTypeName
-                if children:
-                    type_to_count[control_type]=type_to_count.get(control_type,0)+1
-                    child_index=type_to_count[control_type]
-                    child_xpath=f'{current_xpath}/{control_type}[{child_index}]'
-                else:
-                    child_xpath=f'{current_xpath}/{control_type}'
-                
+                type_to_count[control_type]=type_to_count.get(control_type,0)+1
+                # Left out by a traversal budget
+                if allowed is not None and child not in allowed:
+                    continue
+                # Fully covered by windows higher in the z-order
+                if region is not None and get_visible_ratio(child,is_dom)==0:
+                    continue
+
+                child_is_dom,child_is_dialog=is_dom,is_dialog
                 # Check if the child is a DOM element
                 if is_browser and child.ClassName == "Chrome_RenderWidgetHostHWND":
                     bounding_box=child.BoundingRectangle
@@ -358,95 +661,60 @@ class Tree:
                     right=bounding_box.right,bottom=bounding_box.bottom,width=bounding_box.width(),
                     height=bounding_box.height())
                     # enter DOM subtree
-                    tree_traversal(child, current_xpath=child_xpath, is_dom=True, is_dialog=is_dialog)
+                    child_is_dom=True
                 # Check if the child is a dialog
-                elif isinstance(child,WindowControl):
+                elif control_type=='WindowControl':
                     if not child.IsOffscreen:
                         if is_dom:
                             bounding_box=child.BoundingRectangle
                             if bounding_box.width() > 0.8*self.dom_bounding_box.width:
                                 # Because this window element covers the majority of the screen
                                 dom_interactive_nodes.clear()
+                                dom_boxes.clear()
                         else:
                             interactive_nodes.clear()
+                            interactive_boxes.clear()
                     # enter dialog subtree
-                    tree_traversal(child, current_xpath=child_xpath, is_dom=is_dom, is_dialog=True)
-                else:
-                    # normal non-dialog children
-                    tree_traversal(child, current_xpath=child_xpath, is_dom=is_dom, is_dialog=is_dialog)
+                    child_is_dialog=True
+                # Incrementally building the xpath, one node on top of the parent's
+                child_xpath=current_xpath.child(xpath_steps,control_type,type_to_count[control_type])
+                if visit_node(child,child_xpath,is_dom=child_is_dom,is_dialog=child_is_dialog):
+                    stack.append((child.iter_children(reverse=not child_is_dom),{},child_xpath,child_is_dom,child_is_dialog))
 
-        interactive_nodes, dom_interactive_nodes, informative_nodes, scrollable_nodes = [], [], [],[]
-        app_name=node.Name.strip()
-        match node.ClassName:
-            case "Progman":
-                app_name="Desktop"
-            case 'Shell_TrayWnd'|'Shell_SecondaryTrayWnd':
-                app_name="Taskbar"
-            case 'Microsoft.UI.Content.PopupWindowSiteBridge':
-                app_name="Context Menu"
-            case _:
-                pass
-        tree_traversal(node,current_xpath=current_xpath,is_dom=False,is_dialog=False)
+        interactive_nodes, dom_interactive_nodes, informative_nodes, scrollable_nodes = InteractiveTable(), InteractiveTable(), TextTable(), ScrollTable()
+        interactive_boxes, dom_boxes = BoxBatch(), BoxBatch()
+        app_name=self.get_app_name(node)
+        allowed=None
+        if max_nodes is not None or max_depth is not None or max_children is not None:
+            truncation=Truncation(app_name=app_name)
+            allowed=select_nodes(node,truncation)
+            if truncation.total():
+                with self._stats_lock:
+                    self.truncations[current_xpath]=truncation
+        tree_traversal(node,current_xpath=xpath_steps.node(current_xpath),is_dom=False,is_dialog=False)
 
         logger.debug(f'Interactive nodes:{len(interactive_nodes)}')
         logger.debug(f'DOM interactive nodes:{len(dom_interactive_nodes)}')
+        logger.debug(f'{app_name}: {stats.fetches_per_node():.2f} backend calls per node, {stats.saved_per_node():.2f} saved by the property cache')
+        with self._stats_lock:
+            self.cache_stats.merge(stats)
 
+        interactive_boxes.apply(interactive_nodes,self.screen_box,self.vectorized_boxes)
+        dom_boxes.apply(dom_interactive_nodes,self.screen_box,self.vectorized_boxes)
         interactive_nodes.extend(dom_interactive_nodes)
         return (interactive_nodes,informative_nodes,scrollable_nodes)
     
     def get_random_color(self):
         return "#{:06x}".format(random.randint(0, 0xFFFFFF))
 
-    def annotated_screenshot(self, nodes: list[TreeElementNode],scale:float=0.7) -> Image.Image:
-        screenshot = self.desktop.get_screenshot(scale=scale)
-        sleep(0.10)
-        # Add padding
-        padding = 5
-        width = screenshot.width + (2 * padding)
-        height = screenshot.height + (2 * padding)
-        padded_screenshot = Image.new("RGB", (width, height), color=(255, 255, 255))
-        padded_screenshot.paste(screenshot, (padding, padding))
-
-        draw = ImageDraw.Draw(padded_screenshot)
-        font_size = 12
-        try:
-            font = ImageFont.truetype('arial.ttf', font_size)
-        except IOError:
-            font = ImageFont.load_default()
-
-        def get_random_color():
-            return "#{:06x}".format(random.randint(0, 0xFFFFFF))
-
-        def draw_annotation(label, node: TreeElementNode):
-            box = node.bounding_box
-            color = get_random_color()
-
-            # Scale and pad the bounding box also clip the bounding box
-            adjusted_box = (
-                int(box.left * scale) + padding,
-                int(box.top * scale) + padding,
-                int(box.right * scale) + padding,
-                int(box.bottom * scale) + padding
-            )
-            # Draw bounding box
-            draw.rectangle(adjusted_box, outline=color, width=2)
-
-            # Label dimensions
-            label_width = draw.textlength(str(label), font=font)
-            label_height = font_size
-            left, top, right, bottom = adjusted_box
-
-            # Label position above bounding box
-            label_x1 = right - label_width
-            label_y1 = top - label_height - 4
-            label_x2 = label_x1 + label_width
-            label_y2 = label_y1 + label_height + 4
-
-            # Draw label background and text
-            draw.rectangle([(label_x1, label_y1), (label_x2, label_y2)], fill=color)
-            draw.text((label_x1 + 2, label_y1 + 2), str(label), fill=(255, 255, 255), font=font)
-
-        # Draw annotations in parallel
-        with ThreadPoolExecutor() as executor:
-            executor.map(draw_annotation, range(len(nodes)), nodes)
-        return padded_screenshot
\ No newline at end of file
+    def annotated_screenshot(self, nodes: InteractiveTable,scale:float=0.7,reuse_buffer:bool=False,region:Optional[Box]=None,screenshot:Optional[Image.Image]=None) -> Image.Image:
+        '''
+        Screenshot (of `region` when given) with the interactive elements boxed and labelled; with `reuse_buffer` the image is only valid until the next call.
+        `screenshot` is drawn on instead of taking one, when the caller already has it.
+        '''
+        if screenshot is None:
+            # The capture buffer can be reused too, the screenshot is copied into the annotation right away
+            screenshot = self.desktop.get_screenshot(scale=scale,region=region,reuse=reuse_buffer)
+            sleep(self.settle_delay)
+        origin=region[:2] if region else (0,0)
+        return self.annotator.annotate(screenshot,get_boxes(nodes),scale=scale,reuse=reuse_buffer,origin=origin)
\ No newline at end of file
@@ -0,0 +1,144 @@
+from src.tree.config import SPATIAL_CELL_SIZE, SPATIAL_MAX_CELLS
+from src.tree.columns import InteractiveRow, ScrollRow
+from src.tree.views import TreeState
+from array import array
+from math import hypot
+
+class SpatialIndex:
+    '''
+    Uniform grid over the bounding boxes of the interactive and scrollable elements of a `TreeState`.
+
+    Each element is listed in every cell its box overlaps. Elements spanning more than
+    `max_cells` cells (documents, panes, lists) are kept in a short list that every query scans.
+    Entries are numbered interactive first, then scrollable, which is also their label order.
+    '''
+    def __init__(self,tree_state:TreeState,cell_size:int=SPATIAL_CELL_SIZE,max_cells:int=SPATIAL_MAX_CELLS):
+        self.tree_state=tree_state
+        self.cell_size=cell_size
+        self.max_cells=max_cells
+        self.cells:dict[tuple[int,int],list[int]]={}
+        self.large:list[int]=[]
+        self.base_index=len(tree_state.interactive_nodes)
+        self.left,self.top,self.right,self.bottom=array('i'),array('i'),array('i'),array('i')
+        for nodes in (tree_state.interactive_nodes,tree_state.scrollable_nodes):
+            for node in nodes:
+                box=node.bounding_box
+                self.insert(box.left,box.top,box.left+box.width,box.top+box.height)
+        # Grid cells spanned by the indexed elements, bounding the rings a nearest query visits
+        columns,rows=[column for column,_ in self.cells],[row for _,row in self.cells]
+        self.extent=(min(columns),max(columns),min(rows),max(rows)) if self.cells else None
+
+    def insert(self,left:int,top:int,right:int,bottom:int):
+        entry=len(self.left)
+        self.left.append(left)
+        self.top.append(top)
+        self.right.append(right)
+        self.bottom.append(bottom)
+        if right<=left or bottom<=top:
+            # Not visible, never hit
+            return
+        size=self.cell_size
+        columns=range(left//size,(right-1)//size+1)
+        rows=range(top//size,(bottom-1)//size+1)
+        if len(columns)*len(rows)>self.max_cells:
+            self.large.append(entry)
+            return
+        for column in columns:
+            for row in rows:
+                self.cells.setdefault((column,row),[]).append(entry)
+
+    def __len__(self)->int:
+        return len(self.left)
+
+    def node(self,entry:int)->InteractiveRow|ScrollRow:
+        if entry<self.base_index:
+            return self.tree_state.interactive_nodes[entry]
+        return self.tree_state.scrollable_nodes[entry-self.base_index]
+
+    def contains(self,entry:int,x:int,y:int)->bool:
+        return self.left[entry]<=x<self.right[entry] and self.top[entry]<=y<self.bottom[entry]
+
+    def area(self,entry:int)->int:
+        return (self.right[entry]-self.left[entry])*(self.bottom[entry]-self.top[entry])
+
+    def distance(self,entry:int,x:int,y:int)->float:
+        '''Distance from the point to the box, 0 inside it.'''
+        dx=max(self.left[entry]-x,0,x-self.right[entry]+1)
+        dy=max(self.top[entry]-y,0,y-self.bottom[entry]+1)
+        return hypot(dx,dy)
+
+    def entries_at(self,x:int,y:int)->list[int]:
+        '''Entries whose box contains the point, smallest box first.'''
+        size=self.cell_size
+        candidates=self.cells.get((x//size,y//size),[])+self.large
+        hits=[entry for entry in candidates if self.contains(entry,x,y)]
+        # The smallest box is the most specific element; on ties the later (deeper) one wins
+        return sorted(hits,key=lambda entry:(self.area(entry),-entry))
+
+    def entries_in_rect(self,left:int,top:int,right:int,bottom:int,contained:bool=False)->list[int]:
+        '''Entries whose box intersects the rectangle (or lies inside it when `contained`), in label order.'''
+        if right<=left or bottom<=top:
+            return []
+        size=self.cell_size
+        candidates=set(self.large)
+        for column in range(left//size,(right-1)//size+1):
+            for row in range(top//size,(bottom-1)//size+1):
+                candidates.update(self.cells.get((column,row),()))
+        hits=[]
+        for entry in sorted(candidates):
+            if contained:
+                hit=left<=self.left[entry] and top<=self.top[entry] and self.right[entry]<=right and self.bottom[entry]<=bottom
+            else:
+                hit=self.left[entry]<right and left<self.right[entry] and self.top[entry]<bottom and top<self.bottom[entry]
+            if hit:
+                hits.append(entry)
+        return hits
+
+    def nearest_entries(self,x:int,y:int,count:int=1)->list[int]:
+        '''The `count` entries closest to the point, closest first.'''
+        size=self.cell_size
+        column,row=x//size,y//size
+        # Only the rings of cells that overlap the indexed elements can hold anything
+        min_ring,max_ring=0,-1
+        if self.extent is not None:
+            min_column,max_column,min_row,max_row=self.extent
+            min_ring=max(min_column-column,column-max_column,min_row-row,row-max_row,0)
+            max_ring=max(column-min_column,max_column-column,row-min_row,max_row-row)
+        seen=set(self.large)
+        found=[(self.distance(entry,x,y),entry) for entry in self.large]
+        for ring in range(min_ring,max_ring+1):
+            for key in self.ring_cells(column,row,ring):
+                for entry in self.cells.get(key,()):
+                    if entry not in seen:
+                        seen.add(entry)
+                        found.append((self.distance(entry,x,y),entry))
+            found.sort()
+            # Anything in the next ring is at least `ring*size` away from the point
+            if len(found)>=count and found[count-1][0]<=ring*size:
+                break
+        else:
+            found.sort()
+        return [entry for _,entry in found[:count]]
+
+    def ring_cells(self,column:int,row:int,ring:int):
+        if ring==0:
+            yield (column,row)
+            return
+        for offset in range(-ring,ring+1):
+            yield (column+offset,row-ring)
+            yield (column+offset,row+ring)
+        for offset in range(-ring+1,ring):
+            yield (column-ring,row+offset)
+            yield (column+ring,row+offset)
+
+    def element_at(self,x:int,y:int)->InteractiveRow|ScrollRow|None:
+        entries=self.entries_at(x,y)
+        return self.node(entries[0]) if entries else None
+
+    def elements_in_rect(self,left:int,top:int,right:int,bottom:int,contained:bool=False)->list[tuple[int,InteractiveRow|ScrollRow]]:
+        '''(label, element) pairs in the rectangle.'''
+        return [(entry,self.node(entry)) for entry in self.entries_in_rect(left,top,right,bottom,contained)]
+
+    def nearest_elements(self,x:int,y:int,count:int=1)->list[tuple[int,InteractiveRow|ScrollRow]]:
+        '''(label, element) pairs closest to the point.'''
+        return [(entry,self.node(entry)) for entry in self.nearest_entries(x,y,count)]
@@ -1,37 +1,243 @@
 from dataclasses import dataclass,field
+from src.tree.xpath import XPathNode
+from src.tree.formats import INTERACTIVE_HEADERS, INFORMATIVE_HEADERS, SCROLLABLE_HEADERS, elements_to_string, render, get_window
 from tabulate import tabulate
+from json.encoder import encode_basestring as json_string
+from typing import TYPE_CHECKING
+import hashlib
+
+if TYPE_CHECKING:
+    from src.tree.columns import InteractiveTable, TextTable, ScrollTable
 
 @dataclass
 class TreeState:
-    interactive_nodes:list['TreeElementNode']=field(default_factory=list)
-    informative_nodes:list['TextElementNode']=field(default_factory=list)
-    scrollable_nodes:list['ScrollElementNode']=field(default_factory=list)
+    # Captures fill these with the columnar tables of src.tree.columns, which index and iterate like lists of nodes
+    interactive_nodes:'InteractiveTable|list[TreeElementNode]'=field(default_factory=list)
+    informative_nodes:'TextTable|list[TextElementNode]'=field(default_factory=list)
+    scrollable_nodes:'ScrollTable|list[ScrollElementNode]'=field(default_factory=list)
+    # Apps left out because the capture deadline was reached before their walk finished
+    timed_out_apps:list[str]=field(default_factory=list)
+    # Apps whose walk stopped early because a traversal budget ran out
+    truncations:list['Truncation']=field(default_factory=list)
+    # Native handles of the walked top-level windows, keyed by their xpath, to anchor xpath resolution
+    window_handles:dict[str,int]=field(default_factory=dict)
+    # RuntimeId -> xpath of the captured interactive and scrollable elements, built on first lookup
+    xpaths_by_runtime_id:dict[tuple,XPathNode|str]|None=field(default=None, init=False, repr=False, compare=False)
+    # The fingerprint, computed on first use
+    fingerprint_digest:str|None=field(default=None, init=False, repr=False, compare=False)
+
+    def is_partial(self) -> bool:
+        return bool(self.timed_out_apps)
+
+    def get_xpath(self, runtime_id: list[int]) -> str|None:
+        '''Xpath of the captured element with this RuntimeId, None when it is not in the capture.'''
+        if self.xpaths_by_runtime_id is None:
+            index = {}
+            for nodes in (self.interactive_nodes, self.scrollable_nodes):
+                for node in nodes:
+                    node_runtime_id = getattr(node, 'runtime_id', None)
+                    xpath = xpath_of(node)
+                    if node_runtime_id is not None and xpath:
+                        index.setdefault(node_runtime_id, xpath)
+            self.xpaths_by_runtime_id = index
+        xpath = self.xpaths_by_runtime_id.get(tuple(runtime_id))
+        return str(xpath) if xpath is not None else None
 
-    def interactive_elements_to_string(self) -> str:
-        if not self.interactive_nodes:
+    def truncations_to_string(self) -> str:
+        return '\n'.join(truncation.to_string() for truncation in self.truncations)
+
+    def interactive_elements_to_string(self, format: str = 'table', indices: list[int] | None = None, labels: bool = True) -> str:
+        '''
+        The interactive elements, or only those at `indices` (still labelled with their index).
+        Without `labels` the label column is left out, for states whose indices are not the final labels.
+        '''
+        nodes = self.interactive_nodes
+        indices = range(len(nodes)) if indices is None else indices
+        if not indices and format != 'json':
             return "No interactive elements"
+        if format != 'table':
+            strings = render(nodes, format, 'interactive')
+            return elements_to_string([strings[index] for index in indices], format, INTERACTIVE_HEADERS if labels else INTERACTIVE_HEADERS[1:],
+                labels=indices if labels else None,
+                apps=[nodes[index].app_name for index in indices] if format == 'outline' else None,
+                windows=[get_window(xpath_of(nodes[index])) for index in indices] if format == 'outline' else None)
         headers = ["Label", "App Name", "ControlType", "Name", "Value", "Shortcut", "Coordinates"]
-        rows = [node.to_row(idx) for idx, node in enumerate(self.interactive_nodes)]
+        rows = [nodes[index].to_row(index) for index in indices]
+        if not labels:
+            headers, rows = headers[1:], [row[1:] for row in rows]
         return tabulate(rows, headers=headers, tablefmt="github")
 
-    def informative_elements_to_string(self) -> str:
-        if not self.informative_nodes:
+    def informative_elements_to_string(self, format: str = 'table', indices: list[int] | None = None) -> str:
+        nodes = self.informative_nodes
+        indices = range(len(nodes)) if indices is None else indices
+        if not indices and format != 'json':
             return "No informative elements"
+        if format != 'table':
+            strings = render(nodes, format, 'informative')
+            return elements_to_string([strings[index] for index in indices], format, INFORMATIVE_HEADERS,
+                apps=[nodes[index].app_name for index in indices] if format == 'outline' else None)
         headers = ["App Name", "Name"]
-        rows = [node.to_row() for node in self.informative_nodes]
+        rows = [nodes[index].to_row() for index in indices]
         return tabulate(rows, headers=headers, tablefmt="github")
 
-    def scrollable_elements_to_string(self) -> str:
-        if not self.scrollable_nodes:
+    def scrollable_elements_to_string(self, format: str = 'table', indices: list[int] | None = None, labels: bool = True) -> str:
+        '''The scrollable elements, or only those at `indices` (positions in `scrollable_nodes`, labelled after the interactive elements).'''
+        nodes = self.scrollable_nodes
+        indices = range(len(nodes)) if indices is None else indices
+        if not indices and format != 'json':
             return "No scrollable elements"
+        base_index = len(self.interactive_nodes)
+        if format != 'table':
+            strings = render(nodes, format, 'scrollable')
+            return elements_to_string([strings[index] for index in indices], format, SCROLLABLE_HEADERS if labels else SCROLLABLE_HEADERS[1:],
+                labels=[base_index + index for index in indices] if labels else None,
+                apps=[nodes[index].app_name for index in indices] if format == 'outline' else None,
+                windows=[get_window(xpath_of(nodes[index])) for index in indices] if format == 'outline' else None)
         headers = [
             "Label", "App Name", "ControlType", "Name", "Coordinates",
             "Horizontal Scrollable", "Horizontal Scroll Percent(%)", "Vertical Scrollable", "Vertical Scroll Percent(%)", "IsFocused"
         ]
-        base_index = len(self.interactive_nodes)
-        rows = [node.to_row(idx, base_index) for idx, node in enumerate(self.scrollable_nodes)]
+        rows = [nodes[index].to_row(index, base_index) for index in indices]
+        if not labels:
+            headers, rows = headers[1:], [row[1:] for row in rows]
         return tabulate(rows, headers=headers, tablefmt="github")
-    
+
+    def to_json(self, selection: 'ElementSelection | None' = None, labels: bool = True) -> str:
+        '''The three element lists as one JSON object, limited to `selection` when given.'''
+        if selection is None:
+            return (f'{{"interactive":{self.interactive_elements_to_string("json", labels=labels)},'
+                f'"informative":{self.informative_elements_to_string("json")},'
+                f'"scrollable":{self.scrollable_elements_to_string("json", labels=labels)}}}')
+        return (f'{{"interactive":{self.interactive_elements_to_string("json", selection.interactive)},'
+            f'"informative":{self.informative_elements_to_string("json", selection.informative)},'
+            f'"scrollable":{self.scrollable_elements_to_string("json", selection.scrollable)},'
+            f'"omitted":{selection.omitted_to_json()}}}')
+
+    def fingerprint(self) -> str:
+        '''Short hash of every element row, equal for two states that serialize the same.'''
+        if self.fingerprint_digest is not None:
+            return self.fingerprint_digest
+        digest = hashlib.sha1()
+        for node in self.interactive_nodes:
+            digest.update(repr(node.to_row(0)[1:]).encode())
+        digest.update(b'|')
+        for node in self.informative_nodes:
+            digest.update(repr(node.to_row()).encode())
+        digest.update(b'|')
+        for node in self.scrollable_nodes:
+            digest.update(repr(scroll_state(node)).encode())
+        self.fingerprint_digest = digest.hexdigest()[:12]
+        return self.fingerprint_digest
+
+    def diff(self, previous: 'TreeState') -> 'TreeStateDelta':
+        '''Elements added, removed or changed since `previous`. Labels are the ones each element has in its own state.'''
+        base_index, previous_base_index = len(self.interactive_nodes), len(previous.interactive_nodes)
+        interactive = diff_nodes(previous.interactive_nodes, self.interactive_nodes, lambda node: node.to_row(0)[1:])
+        informative = diff_nodes(previous.informative_nodes, self.informative_nodes, lambda node: node.to_row())
+        scrollable = diff_nodes(previous.scrollable_nodes, self.scrollable_nodes, scroll_state)
+        return TreeStateDelta(
+            fingerprint=self.fingerprint(),
+            previous_fingerprint=previous.fingerprint(),
+            added_interactive=interactive[0], removed_interactive=interactive[1], changed_interactive=interactive[2],
+            added_informative=[node for _, node in informative[0]], removed_informative=[node for _, node in informative[1]],
+            added_scrollable=[(base_index + index, node) for index, node in scrollable[0]],
+            removed_scrollable=[(previous_base_index + index, node) for index, node in scrollable[1]],
+            changed_scrollable=[(base_index + index, node) for index, node in scrollable[2]]
+        )
+
+def xpath_of(node) -> 'XPathNode|str':
+    # Rows of the columnar tables hold the xpath as a node of the walk's trie
+    return getattr(node, 'xpath_node', None) or node.xpath
+
+def scroll_state(node: 'ScrollElementNode') -> list:
+    # The center is a random point inside the element, so compare the bounding box instead
+    row = node.to_row(0, 0)
+    return [*row[1:4], node.bounding_box.xyxy_to_string(), *row[5:]]
+
+def diff_nodes(previous: list, current: list, row) -> tuple[list, list, list]:
+    '''Match nodes by `key()` and return the (index, node) pairs that were added, removed and changed.'''
+    def keyed(nodes: list) -> dict:
+        occurrences, result = {}, {}
+        for index, node in enumerate(nodes):
+            key = node.key()
+            occurrences[key] = occurrences.get(key, 0) + 1
+            result[(key, occurrences[key])] = (index, node)
+        return result
+    old, new = keyed(previous), keyed(current)
+    added = [pair for key, pair in new.items() if key not in old]
+    removed = [pair for key, pair in old.items() if key not in new]
+    changed = [pair for key, pair in new.items() if key in old and row(pair[1]) != row(old[key][1])]
+    return added, removed, changed
+
+@dataclass
+class TreeStateDelta:
+    fingerprint: str
+    previous_fingerprint: str
+    added_interactive: list[tuple[int, 'TreeElementNode']] = field(default_factory=list)
+    removed_interactive: list[tuple[int, 'TreeElementNode']] = field(default_factory=list)
+    changed_interactive: list[tuple[int, 'TreeElementNode']] = field(default_factory=list)
+    added_informative: list['TextElementNode'] = field(default_factory=list)
+    removed_informative: list['TextElementNode'] = field(default_factory=list)
+    added_scrollable: list[tuple[int, 'ScrollElementNode']] = field(default_factory=list)
+    removed_scrollable: list[tuple[int, 'ScrollElementNode']] = field(default_factory=list)
+    changed_scrollable: list[tuple[int, 'ScrollElementNode']] = field(default_factory=list)
+
+    def is_empty(self) -> bool:
+        return self.fingerprint == self.previous_fingerprint
+
+    def interactive_elements_to_string(self, format: str = 'table') -> str:
+        entries = [(change, index, node) for change, nodes in (
+            ('added', self.added_interactive), ('changed', self.changed_interactive), ('removed', self.removed_interactive)
+        ) for index, node in nodes]
+        if not entries and format != 'json':
+            return "No changes to interactive elements"
+        if format != 'table':
+            return changes_to_string(entries, format, 'interactive', INTERACTIVE_HEADERS)
+        headers = ["Change", "Label", "App Name", "ControlType", "Name", "Value", "Shortcut", "Coordinates"]
+        rows = [[change, *node.to_row(index)] for change, index, node in entries]
+        return tabulate(rows, headers=headers, tablefmt="github")
+
+    def informative_elements_to_string(self, format: str = 'table') -> str:
+        entries = [(change, None, node) for change, nodes in (
+            ('added', self.added_informative), ('removed', self.removed_informative)
+        ) for node in nodes]
+        if not entries and format != 'json':
+            return "No changes to informative elements"
+        if format != 'table':
+            return changes_to_string(entries, format, 'informative', INFORMATIVE_HEADERS)
+        headers = ["Change", "App Name", "Name"]
+        rows = [[change, *node.to_row()] for change, _, node in entries]
+        return tabulate(rows, headers=headers, tablefmt="github")
+
+    def scrollable_elements_to_string(self, format: str = 'table') -> str:
+        entries = [(change, index, node) for change, nodes in (
+            ('added', self.added_scrollable), ('changed', self.changed_scrollable), ('removed', self.removed_scrollable)
+        ) for index, node in nodes]
+        if not entries and format != 'json':
+            return "No changes to scrollable elements"
+        if format != 'table':
+            return changes_to_string(entries, format, 'scrollable', SCROLLABLE_HEADERS)
+        headers = [
+            "Change", "Label", "App Name", "ControlType", "Name", "Coordinates",
+            "Horizontal Scrollable", "Horizontal Scroll Percent(%)", "Vertical Scrollable", "Vertical Scroll Percent(%)", "IsFocused"
+        ]
+        rows = [[change, *node.to_row(index, 0)] for change, index, node in entries]
+        return tabulate(rows, headers=headers, tablefmt="github")
+
+    def to_json(self) -> str:
+        return (f'{{"fingerprint":{json_string(self.fingerprint)},"previous_fingerprint":{json_string(self.previous_fingerprint)},'
+            f'"interactive":{self.interactive_elements_to_string("json")},"informative":{self.informative_elements_to_string("json")},'
+            f'"scrollable":{self.scrollable_elements_to_string("json")}}}')
+
+def changes_to_string(entries: list[tuple], format: str, kind: str, headers: tuple) -> str:
+    nodes = [node for _, _, node in entries]
+    has_labels = kind != 'informative'
+    return elements_to_string(render(nodes, format, kind), format, headers,
+        labels=[index for _, index, _ in entries] if has_labels else None,
+        changes=[change for change, _, _ in entries],
+        apps=[node.app_name for node in nodes] if format == 'outline' else None,
+        windows=[get_window(xpath_of(node)) for node in nodes] if format == 'outline' and has_labels else None)
+
 @dataclass
 class BoundingBox:
     left:int
@@ -78,6 +284,10 @@ class TreeElementNode:
     def to_row(self, index: int):
         return [index, self.app_name, self.control_type, self.name, self.value, self.shortcut, self.center.to_string()]
 
+    def key(self) -> tuple:
+        # Nodes rebuilt by the DOM correction have no xpath
+        return (self.app_name, self.xpath) if self.xpath else (self.app_name, self.control_type, self.name)
+
 
 @dataclass
 class TextElementNode:
@@ -87,6 +297,9 @@ class TextElementNode:
     def to_row(self):
         return [self.app_name, self.name]
 
+    def key(self) -> tuple:
+        return (self.app_name, self.name)
+
 
 @dataclass
 class ScrollElementNode:
@@ -116,4 +329,78 @@ class ScrollElementNode:
             self.is_focused
         ]
 
-ElementNode=TreeElementNode|TextElementNode|ScrollElementNode
\ No newline at end of file
+    def key(self) -> tuple:
+        return (self.app_name, self.xpath)
+
+ElementNode=TreeElementNode|TextElementNode|ScrollElementNode
+@dataclass
+class CacheStats:
+    nodes:int=0
+    fetches:int=0
+    hits:int=0
+    windows_walked:int=0
+    windows_reused:int=0
+
+    def merge(self,other:'CacheStats'):
+        self.nodes+=other.nodes
+        self.fetches+=other.fetches
+        self.hits+=other.hits
+        self.windows_walked+=other.windows_walked
+        self.windows_reused+=other.windows_reused
+
+    def fetches_per_node(self)->float:
+        return self.fetches/self.nodes if self.nodes else 0.0
+
+    def saved_per_node(self)->float:
+        '''Backend calls per node avoided by serving repeated reads from the cache.'''
+        return self.hits/self.nodes if self.nodes else 0.0
+
+@dataclass
+class Truncation:
+    '''
+    Subtrees left out of an app walk, by the budget that ran out.
+
+    Each count is of the roots of the subtrees not visited: `max_nodes` counts the frontier
+    nodes still queued when the budget ran out, not the descendants behind them, which were
+    never read.
+    '''
+    app_name:str
+    max_nodes:int=0
+    max_depth:int=0
+    max_children:int=0
+
+    def total(self)->int:
+        return self.max_nodes+self.max_depth+self.max_children
+
+    def to_string(self)->str:
+        reasons=', '.join(f'{count} {label}' for label,count in (
+            ('frontier nodes not visited at max_nodes',self.max_nodes),('children below max_depth',self.max_depth),('children over max_children',self.max_children)
+        ) if count)
+        return f'{self.app_name}: {self.total()} subtrees not visited ({reasons})'
+
+@dataclass
+class ElementSelection:
+    '''Positions of the elements kept by an output budget, with the counts of the others per app.'''
+    interactive:list[int]=field(default_factory=list)
+    informative:list[int]=field(default_factory=list)
+    scrollable:list[int]=field(default_factory=list)
+    # App name -> [interactive, informative, scrollable] elements left out
+    omitted:dict[str,list[int]]=field(default_factory=dict)
+
+    def total_omitted(self)->int:
+        return sum(map(sum,self.omitted.values()))
+
+    def omitted_to_string(self)->str:
+        return '\n'.join(f'{app_name}: '+', '.join(f'{count} {kind}' for kind,count in zip(('interactive','informative','scrollable'),counts) if count)
+            for app_name,counts in self.omitted.items())
+
+    def omitted_to_json(self)->str:
+        return '{'+','.join(f'{json_string(app_name)}:{{"interactive":{counts[0]},"informative":{counts[1]},"scrollable":{counts[2]}}}'
+            for app_name,counts in self.omitted.items())+'}'
+
+@dataclass
+class WindowCacheEntry:
+    '''Nodes found in a top-level window and the fingerprint of the window when they were found.'''
+    fingerprint:tuple
+    nodes:tuple[list[TreeElementNode],list[TextElementNode],list[ScrollElementNode]]
+    truncation:Truncation|None=None
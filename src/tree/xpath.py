@@ -0,0 +1,74 @@
+import re
+
+# (control type, 1-based index among same-type siblings or None, text of the step)
+Step=tuple[str,int|None,str]
+
+STEP_PATTERN=re.compile(r'(\w+)(?:\[(\d+)\])?')
+
+class XPathNode:
+    '''
+    One step of an xpath, pointing at the node of its parent.
+
+    The elements of a walk share the nodes of their common ancestors, so storing a node costs one
+    small object instead of a string of the whole path. `str()` materializes the path.
+    '''
+    __slots__=('parent','step')
+
+    def __init__(self,parent:'XPathNode|None',step:Step):
+        self.parent=parent
+        self.step=step
+
+    def child(self,steps:'XPathSteps',control_type:str,index:int)->'XPathNode':
+        return XPathNode(self,steps.get(control_type,index))
+
+    def steps(self)->list[Step]:
+        '''Steps from the root down to this node.'''
+        steps=[]
+        node=self
+        while node is not None:
+            steps.append(node.step)
+            node=node.parent
+        steps.reverse()
+        return steps
+
+    def __str__(self)->str:
+        return '/'.join(step[2] for step in self.steps())
+
+    def __repr__(self)->str:
+        return f'XPathNode({str(self)!r})'
+
+class XPathSteps:
+    '''Interned steps, so every node of a given type and index refers to the same tuple and string.'''
+    __slots__=('steps',)
+
+    def __init__(self):
+        self.steps:dict[tuple[str,int|None],Step]={}
+
+    def get(self,control_type:str,index:int|None)->Step:
+        step=self.steps.get((control_type,index))
+        if step is None:
+            step=self.steps.setdefault((control_type,index),(control_type,index,control_type if index is None else f'{control_type}[{index}]'))
+        return step
+
+    def node(self,xpath:str)->XPathNode|None:
+        '''Chain of nodes for an xpath string, None for an empty xpath.'''
+        node=None
+        for step in self.parse(xpath):
+            node=XPathNode(node,step)
+        return node
+
+    def parse(self,xpath:str)->list[Step]:
+        steps=[]
+        for part in xpath.split('/') if xpath else ():
+            match=STEP_PATTERN.fullmatch(part)
+            if match is None:
+                continue
+            control_type,index=match.groups()
+            steps.append(self.get(control_type,int(index) if index else None))
+        return steps
+
+def get_steps(xpath:'str|XPathNode',steps:XPathSteps)->list[Step]:
+    '''Steps of an xpath given as a string or as a node.'''
+    if isinstance(xpath,XPathNode):
+        return xpath.steps()
+    return steps.parse(xpath)
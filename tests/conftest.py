@@ -0,0 +1,21 @@
+from src.backend.synthetic import SyntheticBackend
+from src.backend.views import SyntheticConfig
+from src.desktop.service import Desktop
+import pytest
+
+# A few apps, a browser among them, and a dialog; tests that need another desktop parametrize `config`
+CONFIG=SyntheticConfig(apps=3,browser_apps=1,breadth=3,depth=3,dom_breadth=3,dom_depth=3,dialogs=1)
+
+@pytest.fixture
+def config()->SyntheticConfig:
+    return CONFIG
+
+@pytest.fixture
+def desktop(config:SyntheticConfig)->Desktop:
+    '''Desktop over a synthetic backend, without settle pauses.'''
+    desktop=Desktop(backend=SyntheticBackend(config=config))
+    desktop.tree.settle_delay=0
+    desktop.tree.seed=0
+    # Every capture walks every window, so captures can be compared
+    desktop.tree.incremental=False
+    return desktop
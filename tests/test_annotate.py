@@ -0,0 +1,35 @@
+from src.tree.annotate import Annotator, get_boxes, get_font
+import pytest
+
+@pytest.fixture
+def screen(desktop):
+    nodes=desktop.get_state().tree_state.interactive_nodes
+    assert len(nodes)>0
+    return desktop.get_screenshot(scale=1.0),list(get_boxes(nodes))
+
+@pytest.mark.parametrize('reuse',[False,True])
+def test_annotating_twice_gives_the_same_pixels(screen,reuse):
+    screenshot,boxes=screen
+    annotator=Annotator()
+    first=annotator.annotate(screenshot,boxes,reuse=reuse).tobytes()
+    # Labels drawn over the padding by another frame are cleared from the reused buffer
+    annotator.annotate(screenshot,[(0,0,40,40),(screenshot.width-40,screenshot.height-40,screenshot.width,screenshot.height)]*50,reuse=reuse)
+    assert annotator.annotate(screenshot,boxes,reuse=reuse).tobytes()==first
+    assert Annotator().annotate(screenshot,boxes).tobytes()==first
+
+def test_label_tiles_are_cached(screen):
+    screenshot,boxes=screen
+    annotator=Annotator()
+    annotator.annotate(screenshot,boxes)
+    tiles=dict(annotator.tiles)
+    assert sorted(tiles)==list(range(len(boxes)))
+    annotator.annotate(screenshot,boxes)
+    assert annotator.tiles.keys()==tiles.keys()
+    assert all(annotator.tiles[label] is tile for label,tile in tiles.items())
+    # The tile background is the label's color
+    for label,tile in tiles.items():
+        assert tile.getpixel((0,0))==annotator.palette[label%len(annotator.palette)]
+
+def test_fonts_are_loaded_once():
+    assert get_font(12) is get_font(12)
+    assert Annotator(font_size=12).font is Annotator(font_size=12).font
@@ -0,0 +1,59 @@
+from src.tree.views import BoundingBox
+from src.tree import boxes
+from src.tree.boxes import BoxBatch
+import random
+import pytest
+
+def random_box(rng:random.Random,screen:BoundingBox)->BoundingBox:
+    # Partly or wholly off the screen, empty and inverted boxes included
+    left=rng.randint(screen.left-200,screen.right+200)
+    top=rng.randint(screen.top-200,screen.bottom+200)
+    right=left+rng.randint(-50,800)
+    bottom=top+rng.randint(-50,600)
+    return BoundingBox(left=left,top=top,right=right,bottom=bottom,width=right-left,height=bottom-top)
+
+def get_scalar_columns(tree,pairs)->list[tuple[int,...]]:
+    rows=[]
+    for element_box,clip_box in pairs:
+        box=tree.iou_bounding_box(clip_box,element_box)
+        center=box.get_center()
+        rows.append((box.left,box.top,box.right,box.bottom,center.x,center.y))
+    return rows
+
+@pytest.mark.parametrize('numpy',[True,False])
+def test_clip_boxes_match_scalar_clipping(desktop,numpy,monkeypatch):
+    if numpy:
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(boxes,'np',None)
+    tree=desktop.tree
+    screen=tree.screen_box
+    rng=random.Random(0)
+    pairs=[(random_box(rng,screen),random_box(rng,screen)) for _ in range(500)]
+    batch=BoxBatch()
+    for element_box,clip_box in pairs:
+        batch.add(element_box,clip_box)
+    expected=get_scalar_columns(tree,pairs)
+    for vectorized in (True,False):
+        columns=batch.clip_boxes(screen,vectorized)
+        assert list(zip(*columns))==expected
+
+def test_vectorized_walk_matches_scalar_walk(desktop):
+    desktop.tree.vectorized_boxes=False
+    scalar=desktop.tree.get_state()
+    desktop.tree.vectorized_boxes=True
+    vectorized=desktop.tree.get_state()
+    assert len(scalar.interactive_nodes)>0
+    assert vectorized.interactive_nodes==scalar.interactive_nodes
+    assert vectorized.scrollable_nodes==scalar.scrollable_nodes
+
+def test_fallback_is_logged_once(desktop,monkeypatch,caplog):
+    monkeypatch.setattr(boxes,'np',None)
+    monkeypatch.setattr(boxes,'fallback_logged',False)
+    screen=desktop.tree.screen_box
+    batch=BoxBatch()
+    batch.add(screen,screen)
+    with caplog.at_level('INFO',logger=boxes.__name__):
+        batch.clip_boxes(screen)
+        batch.clip_boxes(screen)
+    assert [record.name for record in caplog.records]==[boxes.__name__]
@@ -0,0 +1,63 @@
+from src.tree.columns import ElementTable, InteractiveTable, TextTable, ScrollTable
+import pytest
+
+def test_element_table_is_abstract():
+    with pytest.raises(TypeError):
+        ElementTable()
+
+def test_rows_match_their_nodes(desktop):
+    state=desktop.tree.get_state()
+    assert isinstance(state.interactive_nodes,InteractiveTable)
+    assert isinstance(state.informative_nodes,TextTable)
+    assert isinstance(state.scrollable_nodes,ScrollTable)
+    assert len(state.interactive_nodes)>0 and len(state.informative_nodes)>0 and len(state.scrollable_nodes)>0
+    for index,row in enumerate(state.interactive_nodes):
+        node=row.to_node()
+        assert row.to_row(index)==node.to_row(index)
+        assert row.key()==node.key()
+        assert row.bounding_box==node.bounding_box and row.center==node.center
+    for row in state.informative_nodes:
+        assert row.to_row()==row.to_node().to_row()
+    for index,row in enumerate(state.scrollable_nodes):
+        assert row.to_row(index,10)==row.to_node().to_row(index,10)
+
+def test_table_round_trips_its_nodes(desktop):
+    table=desktop.tree.get_state().interactive_nodes
+    nodes=table.to_nodes()
+    rebuilt=InteractiveTable(nodes)
+    assert rebuilt==table and rebuilt.to_nodes()==nodes
+    assert rebuilt.pop()==nodes[-1] and len(rebuilt)==len(nodes)-1
+
+def test_interned_columns_store_each_string_once(desktop):
+    table=desktop.tree.get_state().interactive_nodes
+    for name in ('app_name','control_type'):
+        column=table.data[name]
+        assert len(column.strings)==len(set(column.strings))
+        assert set(column.strings)=={getattr(row,name) for row in table}
+        assert len(column.strings)<len(table)
+        # Rows with the same value hold the same string object
+        by_value={}
+        for row in table:
+            value=getattr(row,name)
+            assert by_value.setdefault(value,value) is value
+
+def test_extend_joins_the_tables_of_several_apps(desktop):
+    state=desktop.tree.get_state()
+    nodes=state.interactive_nodes.to_nodes()
+    apps=list(dict.fromkeys(node.app_name for node in nodes))
+    assert len(apps)>1
+    tables=[InteractiveTable(node for node in nodes if node.app_name==app) for app in apps]
+    for table in tables:
+        # Strings rendered before the join carry over to the joined table
+        table.render('test',lambda row:row.name)
+    joined=InteractiveTable()
+    for table in tables:
+        joined.extend(table)
+    assert joined.to_nodes()==[node for app in apps for node in nodes if node.app_name==app]
+    assert joined.data['app_name'].strings==apps
+    assert joined.strings['test']==[node.name for node in joined.to_nodes()]
+    # A list of nodes extends a table as well
+    mixed=InteractiveTable()
+    mixed.extend(tables[0].to_nodes())
+    mixed.extend(tables[1])
+    assert mixed==tables[0].to_nodes()+tables[1].to_nodes()
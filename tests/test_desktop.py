@@ -0,0 +1,38 @@
+from src.tree.views import TreeState
+
+def test_element_at_is_described_alike_on_both_paths(desktop):
+    nodes=desktop.get_state().tree_state.interactive_nodes.to_nodes()
+    assert len(nodes)>0
+    captured_at=desktop.state_captured_at
+    for node in nodes:
+        loc=(node.center.x,node.center.y)
+        desktop.backend.move_cursor(loc)
+        desktop.state_captured_at=captured_at
+        indexed=desktop.get_element_at(loc)
+        # A stale state sends the lookup to the element under the cursor
+        desktop.state_captured_at=None
+        assert desktop.get_element_at(loc)==indexed==(node.name,node.control_type)
+
+def count_annotations(desktop,monkeypatch)->list:
+    calls=[]
+    annotate=desktop.tree.annotated_screenshot
+    def annotated_screenshot(*args,**kwargs):
+        calls.append(args)
+        return annotate(*args,**kwargs)
+    monkeypatch.setattr(desktop.tree,'annotated_screenshot',annotated_screenshot)
+    return calls
+
+def test_unchanged_screen_reuses_the_encoded_screenshot(desktop,monkeypatch):
+    calls=count_annotations(desktop,monkeypatch)
+    first=desktop.get_state(use_vision=True,as_bytes=True).get_screenshot()
+    second=desktop.get_state(use_vision=True,as_bytes=True).get_screenshot()
+    assert first and second==first
+    assert len(calls)==1
+
+def test_changed_elements_annotate_again(desktop,monkeypatch):
+    calls=count_annotations(desktop,monkeypatch)
+    tree_state=desktop.get_state(use_vision=True,as_bytes=True).tree_state
+    fewer=TreeState(interactive_nodes=tree_state.interactive_nodes.to_nodes()[1:])
+    encoding,_=desktop.encode_annotated_screenshot(fewer,visual_diff=False)
+    assert encoding.result()
+    assert len(calls)==2
@@ -0,0 +1,52 @@
+from src.desktop.encoding import ScreenshotEncoder, SCREENSHOT_FORMATS
+from PIL import Image, features
+from io import BytesIO
+import base64
+import pytest
+
+@pytest.fixture
+def screenshot(desktop):
+    desktop.get_state()
+    return desktop.get_screenshot(scale=0.5)
+
+def decode(data:bytes)->Image.Image:
+    image=Image.open(BytesIO(data))
+    image.load()
+    return image
+
+@pytest.mark.parametrize('format',SCREENSHOT_FORMATS)
+def test_encoded_screenshot_decodes_to_its_size(screenshot,format):
+    if format=='webp' and not features.check('webp'):
+        pytest.skip('Pillow is built without WebP')
+    encoder=ScreenshotEncoder(format=format)
+    image=decode(encoder.encode(screenshot))
+    assert image.format==encoder.image_format.upper()
+    assert image.size==screenshot.size
+    if format=='png':
+        assert image.convert('RGB').tobytes()==screenshot.convert('RGB').tobytes()
+
+def test_background_encoding_matches_synchronous(screenshot):
+    encoder=ScreenshotEncoder()
+    expected=encoder.encode(screenshot)
+    future=encoder.submit(screenshot)
+    encoder.wait()
+    assert future.done() and encoder.pending is future
+    assert future.result()==expected
+    assert base64.b64decode(encoder.encode_base64(screenshot))==expected
+    regions=[(0,0,64,64),(100,50,300,120)]
+    encoded=encoder.submit_regions(screenshot,regions).result()
+    assert [decode(data).size for data in encoded]==[(right-left,bottom-top) for left,top,right,bottom in regions]
+    encoder.close()
+
+def test_close_stops_the_thread(screenshot):
+    encoder=ScreenshotEncoder()
+    future=encoder.submit(screenshot)
+    encoder.close()
+    assert future.done() and encoder.executor is None
+    # A later encoding starts a new thread
+    assert encoder.submit(screenshot).result()==future.result()
+    encoder.close()
+
+def test_unknown_format(screenshot):
+    with pytest.raises(ValueError,match='Unknown screenshot format'):
+        ScreenshotEncoder(format='bmp').encode(screenshot)
@@ -0,0 +1,54 @@
+from src.tree.formats import get_window
+from src.tree.views import xpath_of
+import json
+import re
+import pytest
+
+@pytest.fixture
+def tree_state(desktop):
+    tree_state=desktop.get_state().tree_state
+    assert len(tree_state.interactive_nodes)>0 and len(tree_state.scrollable_nodes)>0
+    return tree_state
+
+def test_json_matches_table(tree_state):
+    elements=json.loads(tree_state.to_json())
+    table=tree_state.interactive_elements_to_string('table').split('\n')
+    # A header and a separator line above the rows
+    assert len(elements['interactive'])==len(table)-2==len(tree_state.interactive_nodes)
+    assert len(elements['informative'])==len(tree_state.informative_nodes)
+    assert len(elements['scrollable'])==len(tree_state.scrollable_nodes)
+    for element,node in zip(elements['interactive'],tree_state.interactive_nodes):
+        assert (element['name'],element['control_type'],element['x'],element['y'])==(node.name,node.control_type,node.center.x,node.center.y)
+    assert [element['label'] for element in elements['scrollable']]==list(range(len(tree_state.interactive_nodes),len(tree_state.interactive_nodes)+len(tree_state.scrollable_nodes)))
+
+def test_compact_has_a_line_per_element(tree_state):
+    lines=tree_state.interactive_elements_to_string('compact').split('\n')
+    assert lines[0].split('\t')[0]=='Label'
+    assert len(lines)-1==len(tree_state.interactive_nodes)
+    for label,(line,node) in enumerate(zip(lines[1:],tree_state.interactive_nodes)):
+        assert line.split('\t')[:4]==[str(label),node.app_name,node.control_type,node.name]
+
+def test_outline_nests_by_app_and_window(tree_state):
+    nodes=tree_state.interactive_nodes
+    lines=tree_state.interactive_elements_to_string('outline').split('\n')
+    app=window=None
+    seen=[]
+    for line in lines:
+        if not line.startswith(' '):
+            app,window=line,None
+        elif not line.startswith('    '):
+            window=line.strip()
+        else:
+            label=int(re.match(r'    \[(\d+)\] ',line).group(1))
+            node=nodes[label]
+            assert node.app_name==app
+            assert (window=='main window')==(get_window(xpath_of(node)) is None)
+            seen.append(label)
+    assert sorted(seen)==list(range(len(nodes)))
+    # The synthetic desktop has a dialog
+    assert any(line.strip().startswith('dialog ') for line in lines)
+
+def test_unknown_format(tree_state):
+    for to_string in (tree_state.interactive_elements_to_string,tree_state.informative_elements_to_string,tree_state.scrollable_elements_to_string):
+        with pytest.raises(ValueError,match='Unknown format'):
+            to_string('xml')
@@ -0,0 +1,54 @@
+from src.backend.views import SyntheticConfig
+from fastmcp.utilities.types import Image
+import importlib
+import asyncio
+import pytest
+
+# Many apps, so the app lists take a good share of the output
+MANY_APPS=SyntheticConfig(apps=12,browser_apps=1,breadth=3,depth=3,dom_breadth=2,dom_depth=2,dialogs=1)
+
+@pytest.fixture
+def run_state_tool(desktop,monkeypatch):
+    monkeypatch.setenv('DARBOT_BACKEND','synthetic')
+    main=importlib.import_module('main')
+    monkeypatch.setattr(main,'desktop',desktop)
+    tool=getattr(main.state_tool,'fn',main.state_tool)
+    return lambda **arguments:asyncio.run(tool(**arguments))
+
+@pytest.fixture
+def state_tool(run_state_tool):
+    def state_tool(**arguments)->str:
+        # The text of the result, which is a plain string on errors
+        result=run_state_tool(**arguments)
+        return result[0] if isinstance(result,list) else result
+    return state_tool
+
+@pytest.mark.parametrize('config',[MANY_APPS])
+@pytest.mark.parametrize('format',['table','compact','json','outline'])
+def test_max_bytes_bounds_the_whole_output(state_tool,format):
+    full=len(state_tool(format=format).encode())
+    # The smallest output lists no elements at all
+    floor=len(state_tool(format=format,max_elements=0).encode())
+    for max_bytes in range(floor,full+1,max(1,(full-floor)//4)):
+        assert len(state_tool(format=format,max_bytes=max_bytes).encode())<=max_bytes
+
+def test_first_delta_is_a_full_state(state_tool):
+    full=state_tool(delta=True)
+    assert full.startswith('State: ')
+    assert 'List of Interactive Elements' in full and 'Changed Interactive Elements' not in full
+    fingerprint=full.split('\n')[0].removeprefix('State: ')
+    unchanged=state_tool(delta=True)
+    assert unchanged.split('\n')[0]==f'State: {fingerprint} (changes since {fingerprint}, none)'
+    assert 'No changes to interactive elements' in unchanged
+
+def test_unknown_format(state_tool):
+    assert state_tool(format='xml')=="Unknown format 'xml'. Use table, compact, json or outline."
+
+def test_unchanged_screen_sends_no_screenshot(run_state_tool):
+    first=run_state_tool(use_vision=True)
+    assert isinstance(first[1],Image)
+    assert run_state_tool(use_vision=True)[1:]==['No visual change since the previous screenshot.']
+    # Unless the whole screenshot is asked for
+    full=run_state_tool(use_vision=True,full_frame=True)
+    assert len(full)==2 and isinstance(full[1],Image)
+    assert full[1].data==first[1].data
@@ -0,0 +1,74 @@
+from src.backend.views import Rect
+from src.tree.occlusion import Region
+import random
+import pytest
+
+def pixels(region:Region)->set[tuple[int,int]]:
+    return {(x,y) for left,top,right,bottom in region.rects for x in range(left,right) for y in range(top,bottom)}
+
+def box_pixels(box:Rect)->set[tuple[int,int]]:
+    return {(x,y) for x in range(box.left,box.right) for y in range(box.top,box.bottom)}
+
+def assert_disjoint(region:Region):
+    assert sum((right-left)*(bottom-top) for left,top,right,bottom in region.rects)==len(pixels(region))
+
+WINDOW=Rect(left=10,top=10,right=50,bottom=40)
+
+@pytest.mark.parametrize('cut,area',[
+    (Rect(left=60,top=0,right=80,bottom=20),40*30),  # disjoint
+    (Rect(left=50,top=10,right=70,bottom=40),40*30),  # touching the right edge
+    (Rect(left=0,top=40,right=60,bottom=50),40*30),  # touching the bottom edge
+    (Rect(left=0,top=0,right=60,bottom=50),0),  # containing the window
+    (Rect(left=10,top=10,right=50,bottom=40),0),  # the window itself
+    (Rect(left=40,top=30,right=60,bottom=50),40*30-10*10),  # over a corner
+    (Rect(left=0,top=20,right=60,bottom=30),40*20),  # across the middle
+    (Rect(left=20,top=20,right=30,bottom=30),40*30-10*10),  # inside, leaving a hole
+])
+def test_subtract(cut,area):
+    region=Region.from_box(WINDOW).subtract(cut)
+    assert region.area()==area
+    assert pixels(region)==box_pixels(WINDOW)-box_pixels(cut)
+    assert_disjoint(region)
+    assert region.is_empty()==(area==0)
+
+def test_subtract_matches_pixel_sets():
+    rng=random.Random(0)
+    def random_rect()->Rect:
+        left,top=rng.randint(0,40),rng.randint(0,40)
+        return Rect(left=left,top=top,right=left+rng.randint(0,30),bottom=top+rng.randint(0,30))
+    for _ in range(200):
+        window=random_rect()
+        region=Region.from_box(window)
+        expected=box_pixels(window)
+        for _ in range(3):
+            cut=random_rect()
+            region=region.subtract(cut)
+            expected-=box_pixels(cut)
+        assert pixels(region)==expected
+        assert_disjoint(region)
+        box=random_rect()
+        assert region.overlap(box.left,box.top,box.right,box.bottom)==len(expected&box_pixels(box))
+
+def test_covered_elements_are_culled(desktop):
+    backend=desktop.backend
+    windows=backend.get_root_control().GetChildren()
+    foreground=backend.control_from_handle(backend.get_foreground_window())
+    # The taskbar, above every window, moved over the top half of the foreground app
+    taskbar=next(window for window in windows if window.ClassName=='Shell_TrayWnd')
+    box=foreground.BoundingRectangle
+    taskbar.MoveWindow(box.left,box.top,box.width(),box.height()//2)
+    cover=taskbar.BoundingRectangle
+    app_name=desktop.tree.get_app_name(foreground)
+    def get_elements(tree_state)->set:
+        return {(node.name,node.bounding_box.xyxy_to_string()):node for node in tree_state.interactive_nodes.to_nodes() if node.app_name==app_name}
+    desktop.tree.occlusion=False
+    every=get_elements(desktop.tree.get_state())
+    desktop.tree.occlusion=True
+    kept=get_elements(desktop.tree.get_state())
+    def visible_ratio(node)->float:
+        element=node.bounding_box
+        visible=Region.from_box(element).subtract(cover)
+        return visible.area()/((element.right-element.left)*(element.bottom-element.top))
+    expected={key for key,node in every.items() if visible_ratio(node)>=desktop.tree.min_visible_ratio}
+    assert 0<len(expected)<len(every)
+    assert set(kept)==expected
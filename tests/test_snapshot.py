@@ -0,0 +1,39 @@
+from src.backend.snapshot import record_snapshot, replay_snapshot, load_snapshot
+
+def assert_same_state(replayed,recorded):
+    assert replayed.tree_state.interactive_nodes==recorded.tree_state.interactive_nodes
+    assert replayed.tree_state.informative_nodes==recorded.tree_state.informative_nodes
+    assert replayed.tree_state.scrollable_nodes==recorded.tree_state.scrollable_nodes
+    assert replayed.tree_state.fingerprint()==recorded.tree_state.fingerprint()
+    assert [app.name for app in replayed.apps]==[app.name for app in recorded.apps]
+
+def test_replay_matches_recording(desktop,tmp_path):
+    path=str(tmp_path/'desktop.json.gz')
+    recorded=record_snapshot(desktop,path,seed=7)
+    assert len(recorded.tree_state.interactive_nodes)>0
+    replay=replay_snapshot(path)
+    replay.tree.settle_delay=0
+    assert_same_state(replay.get_state(),recorded)
+
+def test_recording_after_a_capture(desktop,tmp_path):
+    # The window cache of the earlier capture must not answer for the recording
+    path=str(tmp_path/'desktop.json.gz')
+    desktop.tree.incremental=True
+    desktop.get_state()
+    recorded=record_snapshot(desktop,path,seed=7)
+    replay=replay_snapshot(path)
+    replay.tree.settle_delay=0
+    assert_same_state(replay.get_state(),recorded)
+
+def test_replay_with_vision(desktop,tmp_path):
+    path=str(tmp_path/'snapshot.json.gz')
+    recorded=record_snapshot(desktop,path,use_vision=True,seed=7)
+    assert load_snapshot(path)['screenshot'] is not None
+    # The desktop grabs its own backend again afterwards
+    assert desktop.capture.backend is desktop.backend
+    replay=replay_snapshot(path)
+    replay.tree.settle_delay=0
+    replayed=replay.get_state(use_vision=True)
+    assert replay.backend.screenshot().tobytes()==desktop.backend.screenshot().tobytes()
+    assert replayed.screenshot.tobytes()==recorded.screenshot.tobytes()
+    assert_same_state(replayed,recorded)
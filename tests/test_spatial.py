@@ -0,0 +1,98 @@
+from src.tree.spatial import SpatialIndex
+from src.tree.views import BoundingBox, TreeElementNode, TreeState
+from math import hypot
+import random
+import pytest
+
+CELL_SIZE=64
+
+def element(left:int,top:int,right:int,bottom:int,name:str='')->TreeElementNode:
+    box=BoundingBox(left=left,top=top,right=right,bottom=bottom,width=right-left,height=bottom-top)
+    return TreeElementNode(name=name,control_type='Button',value='',shortcut='',bounding_box=box,center=box.get_center(),xpath='',app_name='App')
+
+def get_index(boxes,max_cells:int=64)->SpatialIndex:
+    return SpatialIndex(TreeState(interactive_nodes=[element(*box) for box in boxes]),cell_size=CELL_SIZE,max_cells=max_cells)
+
+def random_boxes(rng:random.Random,count:int)->list[tuple[int,int,int,int]]:
+    # Mostly small elements, a few spanning many cells, empty ones included
+    boxes=[]
+    for _ in range(count):
+        left,top=rng.randrange(0,1500),rng.randrange(0,900)
+        width,height=(rng.randrange(0,900),rng.randrange(0,600)) if rng.random()<0.1 else (rng.randrange(0,120),rng.randrange(0,60))
+        boxes.append((left,top,left+width,top+height))
+    return boxes
+
+def distance(box,x,y)->float:
+    left,top,right,bottom=box
+    return hypot(max(left-x,0,x-right+1),max(top-y,0,y-bottom+1))
+
+def test_rect_query_matches_brute_force():
+    rng=random.Random(0)
+    boxes=random_boxes(rng,300)
+    index=get_index(boxes,max_cells=16)
+    assert index.large
+    for _ in range(200):
+        left,top=rng.randrange(-100,1600),rng.randrange(-100,1000)
+        right,bottom=left+rng.randrange(1,400),top+rng.randrange(1,300)
+        visible=[entry for entry,box in enumerate(boxes) if box[2]>box[0] and box[3]>box[1]]
+        intersecting=[entry for entry in visible if boxes[entry][0]<right and left<boxes[entry][2] and boxes[entry][1]<bottom and top<boxes[entry][3]]
+        contained=[entry for entry in visible if left<=boxes[entry][0] and top<=boxes[entry][1] and boxes[entry][2]<=right and boxes[entry][3]<=bottom]
+        assert index.entries_in_rect(left,top,right,bottom)==intersecting
+        assert index.entries_in_rect(left,top,right,bottom,contained=True)==contained
+        assert [label for label,_ in index.elements_in_rect(left,top,right,bottom)]==intersecting
+
+def test_nearest_query_matches_brute_force():
+    rng=random.Random(1)
+    boxes=random_boxes(rng,300)
+    index=get_index(boxes,max_cells=16)
+    for _ in range(200):
+        x,y=rng.randrange(-300,1800),rng.randrange(-300,1200)
+        count=rng.randrange(1,6)
+        nearest=index.nearest_entries(x,y,count)
+        expected=sorted(distance(box,x,y) for box in boxes if box[2]>box[0] and box[3]>box[1])[:count]
+        assert [distance(boxes[entry],x,y) for entry in nearest]==expected
+
+@pytest.mark.parametrize('x,y,expected',[
+    (63,10,['left']),
+    (64,10,['right']),
+    (10,63,['left']),
+    (10,64,['below']),
+    (127,127,['right']),
+    (128,10,[]),
+])
+def test_boxes_ending_on_a_cell_boundary(x,y,expected):
+    # Right and bottom edges are exclusive, so a box ending at 64 stays out of the next cell
+    names=['left','right','below']
+    index=get_index([(0,0,64,64),(64,0,128,128),(0,64,64,128)])
+    assert index.cells[(0,0)]==[0] and index.cells[(1,0)]==[1] and index.cells[(0,1)]==[2]
+    assert [names[entry] for entry in index.entries_at(x,y)]==expected
+    assert (index.element_at(x,y) is None)==(not expected)
+
+def test_nearest_across_cell_boundary():
+    # The closest box lies in the next cell, nearer than the one in the cell of the point
+    index=get_index([(0,0,10,10),(64,30,70,40)])
+    assert index.nearest_entries(60,35)==[1]
+    assert index.nearest_entries(60,35,count=2)==[1,0]
+    # Fewer entries than asked for
+    assert index.nearest_entries(60,35,count=5)==[1,0]
+
+def test_empty_grid():
+    index=SpatialIndex(TreeState(),cell_size=CELL_SIZE)
+    assert len(index)==0 and index.extent is None
+    assert index.element_at(10,10) is None
+    assert index.elements_in_rect(0,0,1000,1000)==[]
+    assert index.nearest_elements(10,10,count=3)==[]
+    # Only empty boxes: counted, never hit
+    index=get_index([(10,10,10,50),(20,20,60,20)])
+    assert len(index)==2 and index.extent is None
+    assert index.entries_in_rect(0,0,100,100)==[] and index.nearest_entries(15,15)==[]
+
+def test_labels_follow_the_state(desktop):
+    state=desktop.tree.get_state()
+    index=SpatialIndex(state)
+    assert len(index)==len(state.interactive_nodes)+len(state.scrollable_nodes)
+    elements=index.elements_in_rect(0,0,desktop.tree.screen_box.right,desktop.tree.screen_box.bottom)
+    assert len(elements)>0
+    for label,node in elements:
+        expected=state.interactive_nodes[label] if label<len(state.interactive_nodes) else state.scrollable_nodes[label-len(state.interactive_nodes)]
+        assert node==expected
@@ -0,0 +1,50 @@
+from src.desktop.tiles import FrameDiff
+from PIL import Image
+
+def make_frame(size=(640,480))->Image.Image:
+    frame=Image.new('RGB',size,(200,200,200))
+    frame.paste((20,40,160),(100,100,300,200))
+    return frame
+
+def test_first_frame_is_sent_whole():
+    assert FrameDiff().update(make_frame()) is None
+
+def test_identical_frame_has_no_changes():
+    diff=FrameDiff()
+    diff.update(make_frame())
+    assert diff.update(make_frame())==[]
+
+def test_changed_tile():
+    diff=FrameDiff(tile_size=64)
+    diff.update(make_frame())
+    frame=make_frame()
+    # Inside the tile in the third column of the second row
+    frame.putpixel((140,70),(255,0,0))
+    assert diff.update(frame)==[(128,64,192,128)]
+
+def test_changed_tiles_merge_into_rectangles():
+    diff=FrameDiff(tile_size=64)
+    diff.update(make_frame())
+    frame=make_frame()
+    # Two rows of two tiles, and a tile apart; the last tile is cut by the frame edge
+    frame.paste((0,0,0),(10,10,120,120))
+    frame.paste((0,0,0),(600,450,640,480))
+    assert diff.update(frame)==[(0,0,128,128),(576,448,640,480)]
+
+def test_resized_frame_is_sent_whole():
+    diff=FrameDiff()
+    diff.update(make_frame())
+    assert diff.update(make_frame((800,600))) is None
+    # And is the frame the next one is compared with
+    assert diff.update(make_frame((800,600)))==[]
+
+def test_large_change_is_sent_whole():
+    diff=FrameDiff(max_changed_ratio=0.5)
+    diff.update(make_frame())
+    assert diff.update(Image.new('RGB',(640,480),(0,0,0))) is None
+
+def test_reset():
+    diff=FrameDiff()
+    diff.update(make_frame())
+    diff.reset()
+    assert diff.update(make_frame()) is None
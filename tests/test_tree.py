@@ -0,0 +1,162 @@
+from src.backend.synthetic import SyntheticBackend
+from src.backend.views import SyntheticConfig
+from src.desktop.service import Desktop
+from time import monotonic, sleep
+import pytest
+import sys
+
+def assert_same_tree_state(state,expected):
+    assert state.interactive_nodes==expected.interactive_nodes
+    assert state.informative_nodes==expected.informative_nodes
+    assert state.scrollable_nodes==expected.scrollable_nodes
+
+def test_prefetch_engine_matches_walker(desktop):
+    backend=desktop.backend
+    backend.reset_calls()
+    walked=desktop.tree.get_state(engine='walker')
+    walker_calls=backend.call_count
+    backend.reset_calls()
+    prefetched=desktop.tree.get_state(engine='prefetch')
+    assert len(walked.interactive_nodes)>0
+    assert_same_tree_state(prefetched,walked)
+    assert backend.call_count<walker_calls
+    # The argument applies to its capture only
+    assert desktop.tree.engine=='walker'
+
+def test_unknown_engine(desktop):
+    app=desktop.backend.get_root_control().GetChildren()[0]
+    with pytest.raises(ValueError):
+        desktop.tree.get_nodes(app,'WindowControl/WindowControl[1]',engine='bulk')
+
+def test_deadline_starts_after_settle_delay(desktop):
+    desktop.tree.settle_delay=0.3
+    # Shorter than the pauses before the walk, longer than the walk itself
+    state=desktop.get_state(deadline_ms=250)
+    assert not state.tree_state.is_partial()
+    assert len(state.tree_state.interactive_nodes)>0
+
+def get_walk_order(control,is_dom=False,order=None)->list[tuple[tuple[int,...],bool]]:
+    # Reference recursive walk: normal apps right to left, the browser DOM left to right
+    order=[] if order is None else order
+    order.append((tuple(control.GetRuntimeId()),is_dom))
+    children=control.GetChildren()
+    for child in (children if is_dom else reversed(children)):
+        get_walk_order(child,is_dom or child.ClassName=='Chrome_RenderWidgetHostHWND',order)
+    return order
+
+@pytest.mark.parametrize('config',[SyntheticConfig(apps=3,browser_apps=1,breadth=3,depth=4,dom_breadth=4,dom_depth=3)])
+def test_walk_order_matches_recursive_walk(desktop):
+    rows=[row for row in desktop.tree.get_state().interactive_nodes if row.runtime_id is not None]
+    # An app's DOM elements follow its other elements
+    position={runtime_id:(is_dom,index) for index,(runtime_id,is_dom) in enumerate(get_walk_order(desktop.backend.get_root_control()))}
+    apps=dict.fromkeys(row.app_name for row in rows)
+    assert len(apps)>1
+    for app in apps:
+        runtime_ids=[row.runtime_id for row in rows if row.app_name==app]
+        assert runtime_ids==sorted(runtime_ids,key=position.__getitem__)
+
+def test_tree_deeper_than_recursion_limit():
+    limit=sys.getrecursionlimit()
+    # One chain of containers with a button at the bottom
+    config=SyntheticConfig(apps=1,browser_apps=0,breadth=1,depth=limit+100,dialogs=0,offscreen_ratio=0,control_type_mix={'ButtonControl':1})
+    # The synthetic backend builds its tree recursively, only the walk has to do without
+    sys.setrecursionlimit(limit*4)
+    try:
+        backend=SyntheticBackend(config=config)
+    finally:
+        sys.setrecursionlimit(limit)
+    desktop=Desktop(backend=backend)
+    tree=desktop.tree
+    tree.settle_delay=0
+    tree.max_nodes=tree.max_depth=tree.max_children=None
+    state=tree.get_state()
+    assert not state.is_partial()
+    deepest=max(state.interactive_nodes,key=lambda row:row.xpath.count('/'))
+    assert deepest.control_type=='Button'
+    assert deepest.xpath.count('/')>limit
+
+# The browser page takes about a second to walk, the Taskbar a fraction of that
+SLOW_APP=SyntheticConfig(apps=2,browser_apps=1,breadth=3,depth=3,dom_breadth=6,dom_depth=5,call_latency=0.0005)
+
+@pytest.mark.parametrize('config',[SLOW_APP])
+def test_slow_app_past_deadline_is_partial(desktop):
+    tree,backend=desktop.tree,desktop.backend
+    start=monotonic()
+    state=tree.get_state(deadline_ms=300)
+    assert monotonic()-start<0.6
+    assert state.is_partial()
+    assert state.timed_out_apps==['Synthetic Page 0 - Microsoft Edge']
+    assert 'Taskbar' in {node.app_name for node in state.interactive_nodes.to_nodes()}
+    # The abandoned walk stops at its next node instead of running on in the pool
+    sleep(0.05)
+    calls=backend.call_count
+    sleep(0.2)
+    assert backend.call_count-calls<10
+    tree.close()
+    assert tree.executor is None
+    assert not tree.get_state().is_partial()
+    tree.close()
+
+def test_budgets_not_reached_match_unbudgeted_walk(desktop):
+    unbudgeted=desktop.tree.get_state()
+    desktop.tree.max_nodes,desktop.tree.max_depth,desktop.tree.max_children=10**6,10**3,10**3
+    budgeted=desktop.tree.get_state()
+    assert len(unbudgeted.interactive_nodes)>0
+    assert_same_tree_state(budgeted,unbudgeted)
+    assert budgeted.truncations==[]
+
+@pytest.mark.parametrize('budget,label',[
+    ({'max_nodes':15},'frontier nodes not visited at max_nodes'),
+    ({'max_depth':2},'children below max_depth'),
+    ({'max_children':1},'children over max_children'),
+])
+def test_budget_reached_truncates_the_walk(desktop,budget,label):
+    tree=desktop.tree
+    unbudgeted=tree.get_state()
+    tree.max_nodes=tree.max_depth=tree.max_children=None
+    for name,value in budget.items():
+        setattr(tree,name,value)
+    budgeted=tree.get_state()
+    assert len(budgeted.interactive_nodes)<len(unbudgeted.interactive_nodes)
+    assert budgeted.truncations and all(truncation.total()>0 for truncation in budgeted.truncations)
+    assert label in budgeted.truncations_to_string()
+    # The ancestry of the focused element is walked first, so the focused element stays
+    focused=desktop.backend.get_focused_control()
+    assert focused.Name in {node.name for node in budgeted.interactive_nodes.to_nodes()}
+
+def get_foreground_window(desktop):
+    backend=desktop.backend
+    window=backend.control_from_handle(backend.get_foreground_window())
+    xpath=next(xpath for xpath,handle in desktop.tree.window_handles.items() if handle==window.NativeWindowHandle)
+    return window,xpath
+
+def test_unchanged_windows_are_reused(desktop):
+    desktop.tree.incremental=True
+    desktop.backend.reset_calls()
+    walked=desktop.tree.get_state()
+    walk_calls=desktop.backend.call_count
+    assert len(desktop.tree.walked_windows)>0
+    desktop.backend.reset_calls()
+    reused=desktop.tree.get_state()
+    assert desktop.tree.walked_windows==[]
+    assert desktop.tree.cache_stats.windows_reused==len(walked.window_handles)
+    assert_same_tree_state(reused,walked)
+    # The windows are listed and fingerprinted, their subtrees are not read
+    assert desktop.backend.call_count<walk_calls/2
+
+@pytest.mark.parametrize('change',['move','resize','retitle'])
+def test_changed_window_is_walked_again(desktop,change):
+    desktop.tree.incremental=True
+    desktop.tree.get_state()
+    window,xpath=get_foreground_window(desktop)
+    box=window.BoundingRectangle
+    match change:
+        case 'move':
+            window.MoveWindow(box.left+10,box.top+10,box.width(),box.height())
+        case 'resize':
+            window.MoveWindow(box.left,box.top,box.width()-100,box.height()-100)
+        case 'retitle':
+            window._properties['Name']=f'{window.Name} (changed)'
+    desktop.tree.get_state()
+    assert desktop.tree.walked_windows==[xpath]
+    assert desktop.tree.cache_stats.windows_walked==1
@@ -0,0 +1,57 @@
+from src.backend.views import SyntheticConfig
+import json
+import pytest
+
+pytestmark=pytest.mark.parametrize('config',[SyntheticConfig(apps=2,browser_apps=0,breadth=3,depth=3)])
+
+@pytest.fixture
+def app_states(desktop):
+    states=[]
+    desktop.get_state(on_app=lambda app_name,app_state:states.append(app_state))
+    return states
+
+def test_streamed_chunks_have_no_labels(app_states):
+    for state in app_states:
+        assert 'Label' not in state.interactive_elements_to_string('table',labels=False).split('\n')[0]
+        assert state.interactive_elements_to_string('compact',labels=False).split('\n')[0].split('\t')[0]=='App Name'
+        assert not state.interactive_elements_to_string('outline',labels=False).count('[0]')
+        elements=json.loads(state.to_json(labels=False))
+        assert all('label' not in element for element in elements['interactive']+elements['scrollable'])
+
+def test_labels_by_default(app_states):
+    state=max(app_states,key=lambda state:len(state.interactive_nodes))
+    assert 'Label' in state.interactive_elements_to_string('table').split('\n')[0]
+    assert [element['label'] for element in json.loads(state.to_json())['interactive']]==list(range(len(state.interactive_nodes)))
+
+def switch_app(desktop):
+    # Bring the bottom-most app window to the front, in place of the foreground app
+    backend=desktop.backend
+    window=[child for child in backend.get_root_control().GetChildren() if child.ClassName!='Shell_TrayWnd'][-1]
+    backend.set_foreground_window(window.NativeWindowHandle)
+    return desktop.tree.get_app_name(window)
+
+def test_delta_lists_added_and_removed_elements(desktop):
+    previous=desktop.get_state().tree_state
+    app_name=switch_app(desktop)
+    current=desktop.get_state().tree_state
+    delta=current.diff(previous)
+    assert not delta.is_empty()
+    assert delta.added_interactive and delta.removed_interactive
+    assert {node.app_name for _,node in delta.added_interactive}=={app_name}
+    assert app_name not in {node.app_name for _,node in delta.removed_interactive}
+    # Labels are those of the state each element is in
+    assert all(current.interactive_nodes[label].key()==node.key() for label,node in delta.added_interactive)
+    assert all(previous.interactive_nodes[label].key()==node.key() for label,node in delta.removed_interactive)
+    # Elements of the apps in both captures are left out
+    unchanged={node.key() for node in previous.interactive_nodes}&{node.key() for node in current.interactive_nodes}
+    assert unchanged and not unchanged&{node.key() for _,node in delta.added_interactive+delta.removed_interactive}
+
+def test_delta_of_unchanged_capture_is_empty(desktop):
+    previous=desktop.get_state().tree_state
+    delta=desktop.get_state().tree_state.diff(previous)
+    assert delta.is_empty()
+    assert not (delta.added_interactive or delta.removed_interactive or delta.changed_interactive)
+    assert not (delta.added_informative or delta.removed_informative)
+    assert not (delta.added_scrollable or delta.removed_scrollable or delta.changed_scrollable)
+    assert delta.interactive_elements_to_string()=='No changes to interactive elements'
+    assert json.loads(delta.to_json())['interactive']==[]
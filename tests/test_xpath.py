@@ -0,0 +1,41 @@
+from src.desktop.service import Desktop
+from src.tree.views import xpath_of
+
+def get_labelled_xpaths(desktop:Desktop)->list[tuple[int,str,tuple]]:
+    nodes=desktop.get_state().tree_state.interactive_nodes
+    xpaths=[(label,str(xpath_of(node)),node.runtime_id) for label,node in enumerate(nodes)]
+    assert len(xpaths)>0
+    return xpaths
+
+def test_label_xpath_round_trip(desktop):
+    for label,xpath,runtime_id in get_labelled_xpaths(desktop):
+        control=desktop.get_element_handle_from_label(label)
+        assert tuple(control.GetRuntimeId())==runtime_id
+        assert desktop.get_xpath_from_element(control)==xpath
+        # The second resolution comes from the cache
+        assert desktop.get_element_from_xpath(xpath) is control
+
+def test_xpath_round_trip_without_capture(desktop):
+    xpaths=get_labelled_xpaths(desktop)
+    # Resolved from the root and climbed back up without the window handles or the RuntimeId index
+    desktop.desktop_state=None
+    desktop.xpath_cache.clear()
+    for _,xpath,runtime_id in xpaths:
+        control=desktop.get_element_from_xpath(xpath)
+        assert tuple(control.GetRuntimeId())==runtime_id
+        assert desktop.get_xpath_from_element(control)==xpath
+
+def test_stale_cache_entry_is_resolved_again(desktop):
+    _,xpath,runtime_id=get_labelled_xpaths(desktop)[0]
+    control=desktop.get_element_from_xpath(xpath)
+    desktop.xpath_cache[xpath]=(control,[-1])
+    assert tuple(desktop.get_element_from_xpath(xpath).GetRuntimeId())==runtime_id
+    assert desktop.xpath_cache[xpath][1]==list(runtime_id)
+
+def test_trie_steps_match_parsed_string(desktop):
+    tree_state=desktop.get_state().tree_state
+    steps=desktop.tree.xpath_steps
+    for node in tree_state.interactive_nodes:
+        xpath_node=node.xpath_node
+        assert str(xpath_node)==node.xpath
+        assert steps.parse(str(xpath_node))==xpath_node.steps()